@@ -1,8 +1,10 @@
 import pandas as pd
 import numpy as np
 
-# Load and analyze the kidney dataset
-k_data = pd.read_csv('predictions/ml/kidney.csv')
+from predictions.datasets import load_table
+
+# Load and analyze the kidney dataset (parsed once, then read from the dataset cache)
+k_data = load_table('kidney.csv')
 
 print("=" * 80)
 print("KIDNEY DATASET ANALYSIS")
@@ -4,11 +4,12 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from sklearn.model_selection import cross_val_score, StratifiedKFold
-from sklearn.preprocessing import RobustScaler
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import make_scorer, accuracy_score
 import os
 
+from predictions.preprocessing import KIDNEY_RENAME_MAP, Preprocessor, load_frame
+
 # Set style
 plt.style.use('default')
 sns.set_theme(style="whitegrid")
@@ -30,14 +31,8 @@ def check_kidney_overfitting():
     df = pd.read_csv(KIDNEY_CSV)
     print(f"Loaded Dataset: {df.shape}")
     
-    # 2. Rename & Select (Match Training)
-    rename_map = {
-        'Bp': 'Blood Pressure', 'Sg': 'Specific Gravity', 'Al': 'Albumin', 'Su': 'Sugar',
-        'Rbc': 'Red Blood Cell', 'Bu': 'Urea', 'Sc': 'Creatinine', 'Sod': 'Sodium',
-        'Pot': 'Pottasium', 'Hemo': 'Hemoglobin', 'Wbcc': 'White Blood Cell Count',
-        'Rbcc': 'Red Blood Cell Count', 'Htn': 'Hypertension', 'Class': 'Predicted Class'
-    }
-    df.rename(columns=rename_map, inplace=True)
+    # 2. Rename (Match Training)
+    df.rename(columns=KIDNEY_RENAME_MAP, inplace=True)
     
     # Check 1: Data Leakage via Correlation
     print("\n[CHECK 1] Feature Correlations with Target...")
@@ -57,31 +52,13 @@ def check_kidney_overfitting():
     else:
         print("Correlations look plausible (strong predictors expected, but no 1.0 proxies).")
 
-    # 3. Apply Training Preprocessing (Winsorization)
-    required_cols = ['Predicted Class', 'Creatinine', 'Pottasium', 'Hemoglobin', 
-                     'Sodium', 'Blood Pressure', 'Red Blood Cell', 'Urea', 'Albumin']
-    df = df[required_cols]
-
-    # Outlier Removal (Training Logic)
-    df = df[df['Pottasium'] <= 7]
-    df = df[df['Hemoglobin'] <= 20]
-    df = df[df['Blood Pressure'] >= 50]
-    
-    # Winsorization
-    df['Creatinine'] = df['Creatinine'].clip(0, 15)
-    df['Pottasium'] = df['Pottasium'].clip(2, 7)
-    df['Hemoglobin'] = df['Hemoglobin'].clip(4, 20)
-    df['Sodium'] = df['Sodium'].clip(100, 180)
-    df['Blood Pressure'] = df['Blood Pressure'].clip(60, 180)
-    
-    X = df.drop("Predicted Class", axis=1)
-    y = df["Predicted Class"]
+    # 3. Apply Training Preprocessing (shared pipeline: outlier rows, impute, clip, scale)
+    X, y = load_frame('kidney')
+    preprocessor = Preprocessor.for_disease('kidney').fit(X)
+    X_clean, X_scaled = preprocessor.transform(X, return_clean=True)
     
     # 4. Cross Validation (5-Fold)
     print("\n[CHECK 2] 5-Fold Cross Validation...")
-    # Use Pipeline equivalent logic
-    scaler = RobustScaler()
-    X_scaled = scaler.fit_transform(X)
     
     model = RandomForestClassifier(random_state=42)
     
@@ -100,7 +77,7 @@ def check_kidney_overfitting():
     print("\n[CHECK 3] Visualizing Separation...")
     
     # Map back for plotting
-    plot_df = X.copy()
+    plot_df = pd.DataFrame(X_clean, columns=preprocessor.features, index=X.index)
     plot_df['Condition'] = y.map({0: 'No CKD', 1: 'CKD'})
     
     # Plot top features
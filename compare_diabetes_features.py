@@ -11,6 +11,9 @@ from imblearn.over_sampling import SMOTE
 import joblib
 import os
 
+from predictions.datasets import load_split, load_table
+from predictions.preprocessing import as_preprocessor
+
 # Set style
 plt.style.use('default')
 sns.set_theme(style="whitegrid")
@@ -29,7 +32,7 @@ def compare_features():
     print("="*60)
     
     # 1. Load Data
-    df = pd.read_csv(DIABETES_CSV)
+    df = load_table("diabetes.csv")
     
     # 2. Imputation (Common)
     zero_impute_cols = ['Glucose', 'BloodPressure', 'SkinThickness', 'Insulin', 'BMI']
@@ -67,13 +70,9 @@ def compare_features():
     
     # --- SCENARIO B: SELECTED FEATURES (Use SAVED Model) ---
     print("\n[SCENARIO B] Using DEPLOYED Model (Consolidated Consistency)...")
-    selected_cols = ['Age', 'BMI', 'BloodPressure', 'Glucose']
-    
-    X_sel = df[selected_cols]
-    y_sel = df["Outcome"]
-    
-    # Split (Same seed as training script)
-    X_train_b, X_test_b, y_train_b, y_test_b = train_test_split(X_sel, y_sel, test_size=0.2, random_state=15)
+    # Split (Same seed as training script, served from the dataset cache)
+    split = load_split('diabetes', test_size=0.2, random_state=15)
+    X_train_b, X_test_b, y_train_b, y_test_b = split.frames()
     
     # Load SAVED Model and Scaler
     model_path = os.path.join(ML_PATH, "diabetes_model.pkl")
@@ -83,7 +82,7 @@ def compare_features():
     if os.path.exists(model_path) and os.path.exists(scaler_path):
         print(f"Loading model from {model_path}")
         model_b = joblib.load(model_path)
-        scaler_b = joblib.load(scaler_path)
+        scaler_b = as_preprocessor('diabetes', joblib.load(scaler_path))
         
         # Predict using Loaded Scaler
         X_test_scaled_b = scaler_b.transform(X_test_b)
@@ -92,12 +91,12 @@ def compare_features():
         print("WARNING: Saved model not found, retraining...")
         # Fallback (Should not happen in your case)
         sm = SMOTE(random_state=42)
-        X_train_res_b, y_train_res_b = sm.fit_resample(X_train_b, y_train_b)
+        X_train_res_b, y_train_res_b = sm.fit_resample(split.frame('X_train_clean'), y_train_b)
         scaler_b = RobustScaler()
         X_train_scaled_b = scaler_b.fit_transform(X_train_res_b)
         model_b = RandomForestClassifier(random_state=42)
         model_b.fit(X_train_scaled_b, y_train_res_b)
-        X_test_scaled_b = scaler_b.transform(X_test_b)
+        X_test_scaled_b = scaler_b.transform(split.frame('X_test_clean'))
         y_pred_b = model_b.predict(X_test_scaled_b)
 
     acc_b = accuracy_score(y_test_b, y_pred_b)
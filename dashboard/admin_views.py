@@ -6,6 +6,7 @@ from django.utils import timezone
 from datetime import timedelta
 from accounts.models import Patient, Doctor
 from predictions.models import Prediction
+from predictions import patient_state
 
 @login_required
 def admin_dashboard(request):
@@ -128,7 +129,7 @@ def user_management(request):
     users_data = []
     
     # Get all users (excluding superusers if you want, or include them)
-    users = User.objects.all().order_by('-date_joined')
+    users = User.objects.select_related('doctor', 'patient').order_by('-date_joined')
     
     if search_query:
         users = users.filter(
@@ -138,6 +139,9 @@ def user_management(request):
             Q(last_name__icontains=search_query)
         )
     
+    # Assessment counts and last activity from the patients' summary rows
+    states = patient_state.states(user.patient.id for user in users if hasattr(user, 'patient'))
+
     for user in users:
         u_data = {
             'id': user.id,
@@ -160,9 +164,9 @@ def user_management(request):
         elif hasattr(user, 'patient'):
             u_data['role'] = 'Patient'
             u_data['patient_id'] = user.patient.id
-            u_data['activity_main'] = f"{user.patient.predictions.count()} assessments"
-            last_pred = user.patient.predictions.first()
-            u_data['activity_sub'] = f"Last: {last_pred.created_at.strftime('%Y-%m-%d')}" if last_pred else "No activity yet"
+            state = states[user.patient.id]
+            u_data['activity_main'] = f"{state.prediction_count} assessments"
+            u_data['activity_sub'] = f"Last: {state.last_activity.strftime('%Y-%m-%d')}" if state.last_activity else "No activity yet"
             
         # Filter logic
         if role_filter == 'doctors' and u_data['role'] != 'Doctor':
@@ -1,8 +1,11 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from predictions.models import Prediction, PredictionFeature
+from predictions.explanations import ensure_explanations
+from predictions import observations, patient_state, timeseries, trends
 from recommendations.models import Recommendation
 from accounts.models import Doctor
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.utils import timezone
 from accounts.decorators import verified_patient_required
 
@@ -37,7 +40,11 @@ def doctor_dashboard(request):
     
     # Get all patients for the patient list
     from accounts.models import Patient
-    patients = Patient.objects.all().order_by('user__username')
+    patients = list(Patient.objects.select_related('user').order_by('user__username'))
+    # Latest risks and last activity from each patient's summary row
+    states = patient_state.states(p.id for p in patients)
+    for patient in patients:
+        patient.state = states[patient.id]
     
     # Get unverified patients
     unverified_patients = Patient.objects.filter(is_verified=False).order_by('user__username')
@@ -62,6 +69,7 @@ def doctor_prediction_detail(request, id):
         return render(request, "dashboard/not_doctor.html")
 
     prediction = get_object_or_404(Prediction, id=id)
+    ensure_explanations(prediction, viewed=True)
     features = PredictionFeature.objects.filter(prediction=prediction)
 
     return render(request, "dashboard/doctor_prediction_detail.html", {
@@ -80,14 +88,22 @@ def approve_prediction(request, id):
     if request.method == "POST":
         text = request.POST.get("text")
 
-        Recommendation.objects.create(
-            prediction=prediction,
-            text=text
-        )
-
         prediction.approval_status = "Approved"
         prediction.doctor = request.user.doctor
-        prediction.save()
+        with transaction.atomic():
+            # Conditional UPDATE: of two concurrent approvals only one
+            # changes the row, and only that one folds it into the trends
+            newly_approved = Prediction.objects.filter(id=prediction.id).exclude(
+                approval_status="Approved"
+            ).update(approval_status="Approved") == 1
+            Recommendation.objects.create(
+                prediction=prediction,
+                text=text
+            )
+            prediction.save()
+            patient_state.refresh(prediction.patient_id)
+            if newly_approved:
+                trends.record(prediction)
 
         return redirect("doctor_dashboard")
 
@@ -105,7 +121,15 @@ def reject_prediction(request, id):
 
     prediction.approval_status = "Rejected"
     prediction.doctor = request.user.doctor
-    prediction.save()
+    with transaction.atomic():
+        # Rejecting an approved prediction takes its values out of the trends
+        was_approved = Prediction.objects.filter(
+            id=prediction.id, approval_status="Approved"
+        ).update(approval_status="Rejected") == 1
+        prediction.save()
+        patient_state.refresh(prediction.patient_id)
+        if was_approved:
+            trends.recompute([prediction.patient_id])
 
     return redirect("doctor_dashboard")
 
@@ -120,43 +144,25 @@ def patient_dashboard(request):
     if not hasattr(request.user, "patient"):
         return render(request, "dashboard/not_patient.html")
 
-    predictions = Prediction.objects.filter(patient=request.user.patient, approval_status="Approved").order_by("-created_at")
-    
-    # Statistics
-    total_predictions = predictions.count()
-    approved_predictions = predictions.filter(approval_status="Approved")
-    
-    # Get last risk levels
-    last_diabetes_risk = "N/A"
-    last_kidney_risk = "N/A"
-    if approved_predictions.exists():
-        latest = approved_predictions.first()
-        last_diabetes_risk = latest.diabetes_risk or "N/A"
-        last_kidney_risk = latest.kidney_risk or "N/A"
-    
-    # Risk history for chart (count by risk level)
-    diabetes_low = approved_predictions.filter(diabetes_risk="Low").count()
-    diabetes_medium = approved_predictions.filter(diabetes_risk="Medium").count()
-    diabetes_high = approved_predictions.filter(diabetes_risk="High").count()
-    
-    kidney_low = approved_predictions.filter(kidney_risk="Low").count()
-    kidney_medium = approved_predictions.filter(kidney_risk="Medium").count()
-    kidney_high = approved_predictions.filter(kidney_risk="High").count()
+    # Latest approved prediction and counts from the patient's summary row
+    state = patient_state.get(request.user.patient)
+    latest = state.latest_approved
 
     return render(request, "dashboard/patient_dashboard.html", {
-        "latest_prediction": latest if approved_predictions.exists() else None,
-        "predictions": predictions,
-        "total_predictions": total_predictions,
-        "approved_count": approved_predictions.count(),
-        "pending_count": predictions.filter(approval_status="Pending").count(),
-        "last_diabetes_risk": last_diabetes_risk,
-        "last_kidney_risk": last_kidney_risk,
-        "diabetes_low": diabetes_low,
-        "diabetes_medium": diabetes_medium,
-        "diabetes_high": diabetes_high,
-        "kidney_low": kidney_low,
-        "kidney_medium": kidney_medium,
-        "kidney_high": kidney_high,
+        "latest_prediction": latest,
+        "state": state,
+        "total_predictions": state.approved_count,
+        "approved_count": state.approved_count,
+        # Patients only ever see approved predictions, as before
+        "pending_count": 0,
+        "last_diabetes_risk": state.diabetes_risk or "N/A",
+        "last_kidney_risk": state.kidney_risk or "N/A",
+        "diabetes_low": state.diabetes_low,
+        "diabetes_medium": state.diabetes_medium,
+        "diabetes_high": state.diabetes_high,
+        "kidney_low": state.kidney_low,
+        "kidney_medium": state.kidney_medium,
+        "kidney_high": state.kidney_high,
     })
 
 
@@ -177,6 +183,8 @@ def patient_prediction_detail(request, id):
             "prediction": prediction
         })
 
+    ensure_explanations(prediction, viewed=True)
+
     return render(request, "dashboard/patient_prediction_detail.html", {
         "prediction": prediction,
         "features": features,
@@ -227,6 +235,10 @@ def patient_history(request):
         "chart_dates": dates,
         "chart_diabetes": chart_diabetes,
         "chart_kidney": chart_kidney,
+        # Full history, loaded by the trend chart from predictions.views.patient_series
+        "trend_series": timeseries.PROBABILITIES.items(),
+        "trend_labs": observations.FEATURES.items(),
+        "trend_buckets": timeseries.BUCKETS,
     })
 
 
@@ -236,8 +248,7 @@ def patient_recommendations(request):
     if not hasattr(request.user, "patient"):
         return render(request, "dashboard/not_patient.html")
 
-    predictions = Prediction.objects.filter(patient=request.user.patient, approval_status="Approved").order_by("-created_at")
-    latest = predictions.first() if predictions.exists() else None
+    latest = patient_state.get(request.user.patient).latest_approved
 
     return render(request, "dashboard/patient_recommendations.html", {
         "latest_prediction": latest
@@ -249,10 +260,10 @@ def patient_latest_report(request):
     if not hasattr(request.user, "patient"):
         return render(request, "dashboard/not_patient.html")
 
-    predictions = Prediction.objects.filter(patient=request.user.patient, approval_status="Approved").order_by("-created_at")
+    latest_id = patient_state.get(request.user.patient).latest_approved_id
     
-    if predictions.exists():
-        return redirect("patient_prediction_detail", id=predictions.first().id)
+    if latest_id:
+        return redirect("patient_prediction_detail", id=latest_id)
     
     # If no report exists, stay on dashboard or show a message
     return redirect("patient_dashboard")
@@ -73,11 +73,11 @@ def test_explainability_refactor():
 
     print("\n--- Testing Global Feature Importance ---")
     # Diabetes Global FI
-    d_fi = generate_global_feature_importance(diabetes_model, d_feat_names, 'diabetes', background_data=diabetes_bg_scaled)
+    d_fi = generate_global_feature_importance('diabetes', d_feat_names)
     print(f"Diabetes Global FI: {d_fi}")
     
-    # Kidney Global FI (Now supported via SHAP)
-    k_fi = generate_global_feature_importance(kidney_model, k_feat_names, 'kidney', background_data=kidney_bg)
+    # Kidney Global FI (precomputed at training time)
+    k_fi = generate_global_feature_importance('kidney', k_feat_names)
     print(f"Kidney Global FI: {k_fi}")
     
     print("\n--- Testing Patient SHAP ---")
@@ -3,13 +3,14 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import RobustScaler
 from sklearn.metrics import confusion_matrix, classification_report, roc_curve, auc, accuracy_score
 from imblearn.over_sampling import SMOTE
 import joblib
 import os
 
+from predictions.datasets import load_split
+from predictions.preprocessing import as_preprocessor
+
 # Set style
 plt.style.use('default')  # Use default to avoid errors if seaborn styles not available
 sns.set_theme(style="whitegrid")
@@ -32,30 +33,16 @@ def evaluate_diabetes():
     print("Evaluating Diabetes Model (Replicating Training Logic)")
     print("="*50)
     
-    # 1. Load Data
-    df = pd.read_csv(DIABETES_CSV)
-    
-    # 2. Imputation (Same as train_diabetes_model.py)
-    zero_impute_cols = ['Glucose', 'BloodPressure', 'SkinThickness', 'Insulin', 'BMI']
-    for col in zero_impute_cols:
-        if col in df.columns:
-            median_val = df[df[col] != 0][col].median()
-            df[col] = df[col].replace(0, median_val)
-
-    # 3. Select Features
-    df = df[['Age', 'BMI', 'BloodPressure', 'Glucose', 'Outcome']]
-    X = df.drop("Outcome", axis=1)
-    y = df["Outcome"]
-
-    # 4. Split (Match Training Random State)
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=15)
+    # 1-4. Load, Select Features and Split (cached, matches training random state;
+    # imputation happens in the shared transform)
+    X_train, X_test, y_train, y_test = load_split('diabetes', test_size=0.2, random_state=15).frames()
     
     # 5. Load Model (The deployed model)
     model_path = os.path.join(ML_PATH, "diabetes_model.pkl")
     scaler_path = os.path.join(ML_PATH, "diab_scaler.pkl")
     
     model = joblib.load(model_path)
-    scaler = joblib.load(scaler_path)
+    scaler = as_preprocessor('diabetes', joblib.load(scaler_path))
     
     # 6. Predict
     X_test_scaled = scaler.transform(X_test)
@@ -103,46 +90,16 @@ def evaluate_kidney():
     print("Evaluating Kidney Model (Replicating Training Logic)")
     print("="*50)
     
-    # 1. Load Data
-    df = pd.read_csv(KIDNEY_CSV)
-    
-    # 2. Rename & Select (Same as train_kidney_model.py)
-    rename_map = {
-        'Bp': 'Blood Pressure', 'Sg': 'Specific Gravity', 'Al': 'Albumin', 'Su': 'Sugar',
-        'Rbc': 'Red Blood Cell', 'Bu': 'Urea', 'Sc': 'Creatinine', 'Sod': 'Sodium',
-        'Pot': 'Pottasium', 'Hemo': 'Hemoglobin', 'Wbcc': 'White Blood Cell Count',
-        'Rbcc': 'Red Blood Cell Count', 'Htn': 'Hypertension', 'Class': 'Predicted Class'
-    }
-    df.rename(columns=rename_map, inplace=True)
-    
-    required_cols = ['Predicted Class', 'Creatinine', 'Pottasium', 'Hemoglobin', 
-                     'Sodium', 'Blood Pressure', 'Red Blood Cell', 'Urea', 'Albumin']
-    df = df[required_cols]
-    
-    # 3. Cleaning (Same outliers logic)
-    df = df[df['Pottasium'] <= 7]
-    df = df[df['Hemoglobin'] <= 20]
-    df = df[df['Blood Pressure'] >= 50]
-    
-    # Winsorization (Critical to match training distribution)
-    df['Creatinine'] = df['Creatinine'].clip(0, 15)
-    df['Pottasium'] = df['Pottasium'].clip(2, 7)
-    df['Hemoglobin'] = df['Hemoglobin'].clip(4, 20)
-    df['Sodium'] = df['Sodium'].clip(100, 180)
-    df['Blood Pressure'] = df['Blood Pressure'].clip(60, 180)
-    
-    X = df.drop("Predicted Class", axis=1)
-    y = df["Predicted Class"]
-    
-    # 4. Split (Match Training Random State)
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=15)
+    # 1-4. Load, Rename, drop outlier rows and Split (cached, matches training random state;
+    # winsorization happens in the shared transform)
+    X_train, X_test, y_train, y_test = load_split('kidney', test_size=0.2, random_state=15).frames()
     
     # 5. Load Model
     model_path = os.path.join(ML_PATH, "kidney_model.pkl")
     scaler_path = os.path.join(ML_PATH, "kid_scaler.pkl")
     
     model = joblib.load(model_path)
-    scaler = joblib.load(scaler_path)
+    scaler = as_preprocessor('kidney', joblib.load(scaler_path))
     
     # 6. Predict
     X_test_scaled = scaler.transform(X_test)
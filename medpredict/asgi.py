@@ -14,3 +14,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "medpredict.settings")
 
 application = get_asgi_application()
+
+from django.conf import settings
+
+if getattr(settings, "MODEL_WARMUP", False):
+    # With a pre-forking server (gunicorn --preload) this runs once in the
+    # master and workers share the loaded pages copy-on-write
+    from predictions.registry import preload
+
+    preload()
@@ -17,9 +17,11 @@ import sys
 # FORCE USER SITE-PACKAGES TO FRONT
 # This fixes the issue where Anaconda system packages (incompatible with NumPy 2.0)
 # are loaded instead of the updated user packages scikit-learn 1.6+
-user_site = os.path.expanduser(r"~\AppData\Roaming\Python\Python312\site-packages")
-if os.path.exists(user_site) and user_site not in sys.path:
-    sys.path.insert(0, user_site)
+# Windows only: elsewhere the extra sys.path entry just slows every import.
+if sys.platform == "win32":
+    user_site = os.path.expanduser(r"~\AppData\Roaming\Python\Python312\site-packages")
+    if os.path.exists(user_site) and user_site not in sys.path:
+        sys.path.insert(0, user_site)
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -150,3 +152,24 @@ LOGIN_URL = 'role_selection'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 
+# Explainability
+# When per-prediction SHAP explanations are built: "eager", "lazy" or "queued"
+EXPLANATION_MODE = "lazy"
+BACKGROUND_WORKERS = 2
+
+# Load models, SHAP backgrounds and shap/matplotlib when the WSGI/ASGI app
+# starts instead of on first use (see predictions.registry.preload)
+MODEL_WARMUP = False
+
+# Kernel SHAP (models without a tree/linear explainer) runs in a process pool
+EXPLAIN_POOL_WORKERS = 2
+EXPLAIN_KERNEL_NSAMPLES = 200
+EXPLAIN_KERNEL_DEADLINE = 2.0  # seconds before falling back to an approximation
+
+# Score live predictions with a candidate in the registry shadow slot
+# (ml/shadow/, see predictions.shadow) on the background pool
+SHADOW_SCORING = True
+
+# Rendered recommendation fragments (see recommendations.rendering) are
+# cached under a digest of their data and template for this long
+RECOMMENDATION_CACHE_SECONDS = 60 * 60 * 24
@@ -0,0 +1,9 @@
+"""
+Disease predictions: the Django app and the model pipeline behind it.
+
+The pipeline modules -- preprocessing, bundle, importance, datasets,
+training, streaming, benchmark, distillation, evaluation, scoring and
+units -- import nothing from Django, so the standalone training scripts
+and spawned worker processes can use them without configured settings.
+Keep Django imports out of them.
+"""
@@ -1,5 +1,49 @@
 from django.contrib import admin
-from .models import Prediction, PredictionFeature
+from .models import Prediction, PredictionFeature, PredictionScore, RescoreCheckpoint, ShadowScore
+from .shadow import comparison
+from . import patient_state, trends
 
-admin.site.register(Prediction)
 admin.site.register(PredictionFeature)
+admin.site.register(PredictionScore)
+admin.site.register(RescoreCheckpoint)
+
+
+@admin.register(Prediction)
+class PredictionAdmin(admin.ModelAdmin):
+    list_display = (
+        "id", "patient", "diabetes_risk", "kidney_risk", "egfr", "ckd_stage", "approval_status", "created_at",
+    )
+    list_filter = ("ckd_stage", "approval_status", "diabetes_risk", "kidney_risk")
+
+    # Edits and deletions here change the patients' summary rows and risk
+    # trends too (status, probabilities and dates are all editable)
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        patient_state.refresh(obj.patient_id)
+        trends.recompute([obj.patient_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        patient_state.refresh(obj.patient_id)
+        trends.recompute([obj.patient_id])
+
+    def delete_queryset(self, request, queryset):
+        patient_ids = set(queryset.values_list("patient_id", flat=True))
+        super().delete_queryset(request, queryset)
+        patient_state.save(patient_state.compute(patient_ids))
+        trends.recompute(patient_ids)
+
+
+@admin.register(ShadowScore)
+class ShadowScoreAdmin(admin.ModelAdmin):
+    """Shadow scores, with the agreement/drift/latency report above the list"""
+    list_display = (
+        "prediction", "model_name", "shadow_version", "production_probability",
+        "shadow_probability", "production_ms", "shadow_ms", "scored_at",
+    )
+    list_filter = ("model_name", "shadow_version")
+    change_list_template = "admin/predictions/shadowscore/change_list.html"
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {**(extra_context or {}), "shadow_report": comparison()}
+        return super().changelist_view(request, extra_context=extra_context)
@@ -0,0 +1,208 @@
+"""
+Serving-cost benchmarks for candidate models.
+
+Model selection used to look at accuracy only, but an ``SVC(probability=True)``
+or a KNN over the whole training set costs far more per request than a
+logistic regression. ``benchmark_model`` measures what a candidate would
+cost in production, exactly as it would be served (through the model bundle
+when the kind can be bundled, else the pickle):
+
+* single-row p50/p99 latency of preprocess + ``predict_proba``;
+* batch throughput in rows per second;
+* artifact size and the memory allocated when loading it;
+* artifact load time (bundle, or joblib pickle);
+* time to explain one prediction with the explainer the views would pick.
+
+``pareto_frontier`` keeps the candidates no other candidate beats on both
+score and latency, and ``choose`` picks the best-scoring one within a
+latency budget. Results are written next to the bundle as
+``<disease>_benchmark.json``.
+"""
+import io
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+from .bundle import UnsupportedModel, load_bundle, write_bundle
+
+ML_DIR = Path(__file__).resolve().parent / "ml"
+
+SINGLE_ROW_RUNS = 300
+BATCH_ROWS = 20_000
+# Coalition budget of the kernel SHAP fallback (explain_pool.DEFAULT_NSAMPLES)
+KERNEL_NSAMPLES = 200
+
+
+def benchmark_path(disease, ml_dir=ML_DIR):
+    return Path(ml_dir) / f"{disease}_benchmark.json"
+
+
+def _best_of(fn, repeat=3):
+    """Fastest of ``repeat`` timed calls, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _served_model(disease, model, preprocessor, tmp_dir):
+    """
+    The object the registry would serve for ``model`` and its load time.
+
+    Returns:
+        tuple: (model, artifact kind, artifact bytes, load seconds,
+            bytes allocated by one load)
+    """
+    path = Path(tmp_dir) / f"{disease}_bundle.npz"
+    try:
+        write_bundle(path, disease, model, preprocessor, preprocessor.features)
+        artifact, size = "bundle", path.stat().st_size
+
+        def load():
+            return load_bundle(path).model
+    except UnsupportedModel:
+        import joblib
+
+        buffer = io.BytesIO()
+        joblib.dump(model, buffer)
+        data = buffer.getvalue()
+        artifact, size = "pickle", len(data)
+
+        def load():
+            return joblib.load(io.BytesIO(data))
+
+    seconds = _best_of(load)
+    # Memory-mapped bundle arrays stay file-backed and barely register here
+    tracemalloc.start()
+    served = load()
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return served, artifact, size, seconds, allocated
+
+
+def _shap_cost(model, background, row, nsamples=KERNEL_NSAMPLES):
+    """
+    Seconds to explain one row, trying explainers in the views' order.
+
+    Returns:
+        tuple: (method, seconds)
+    """
+    import shap
+
+    attempts = [
+        ("tree", lambda: shap.TreeExplainer(
+            model.shap_model() if hasattr(model, 'shap_model') else model
+        ).shap_values(row)),
+        ("linear", lambda: shap.LinearExplainer(model, background).shap_values(row)),
+        ("kernel", lambda: shap.KernelExplainer(model.predict_proba, background).shap_values(
+            row, nsamples=nsamples, silent=True
+        )),
+    ]
+    for method, explain in attempts:
+        try:
+            started = time.perf_counter()
+            explain()
+            return method, time.perf_counter() - started
+        except Exception:
+            continue
+    return None, None
+
+
+def benchmark_model(disease, model, preprocessor, X_raw, background=None,
+                    runs=SINGLE_ROW_RUNS, batch_rows=BATCH_ROWS, shap=True):
+    """
+    Measure the serving cost of one fitted candidate.
+
+    Args:
+        disease: Model name used for the temporary bundle
+        model, preprocessor: Fitted candidate and its Preprocessor
+        X_raw: Raw feature rows (DataFrame or array in feature order) to
+            replay as requests
+        background: Scaled SHAP background rows (default: 50 rows of X_raw)
+
+    Returns:
+        dict: p50_ms, p99_ms, throughput_rps, artifact, artifact_bytes,
+            memory_bytes, load_ms, shap_method, shap_ms
+    """
+    X_raw = preprocessor._as_array(X_raw)
+    X_scaled = preprocessor.transform(X_raw)
+    if background is None:
+        background = X_scaled[:50]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        served, artifact, artifact_bytes, load, allocated = _served_model(
+            disease, model, preprocessor, tmp_dir
+        )
+
+        # Single requests: one raw row through the full serving path
+        latencies = np.empty(runs)
+        for i in range(runs):
+            row = X_raw[i % len(X_raw)][None, :]
+            started = time.perf_counter()
+            served.predict_proba(preprocessor.transform(row))
+            latencies[i] = time.perf_counter() - started
+
+        batch = np.resize(X_raw, (batch_rows, X_raw.shape[1]))
+        batch_seconds = _best_of(lambda: served.predict_proba(preprocessor.transform(batch)))
+
+        shap_method, shap_seconds = _shap_cost(served, background, X_scaled[:1]) if shap else (None, None)
+
+    return {
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'throughput_rps': float(batch_rows / batch_seconds),
+        'artifact': artifact,
+        'artifact_bytes': int(artifact_bytes),
+        'memory_bytes': int(allocated),
+        'load_ms': float(load * 1000),
+        'shap_method': shap_method,
+        'shap_ms': float(shap_seconds * 1000) if shap_seconds is not None else None,
+    }
+
+
+def pareto_frontier(results, score='score', cost='p99_ms'):
+    """
+    Names of the candidates not dominated on (higher ``score``, lower ``cost``).
+
+    Args:
+        results: {name: dict with ``score`` and ``cost`` keys}
+
+    Returns:
+        list: frontier names, cheapest first
+    """
+    frontier = []
+    best_score = -float('inf')
+    for name, row in sorted(results.items(), key=lambda item: (item[1][cost], -item[1][score])):
+        if row[score] > best_score:
+            frontier.append(name)
+            best_score = row[score]
+    return frontier
+
+
+def choose(results, budget_ms, score='score', cost='p99_ms'):
+    """Best-scoring candidate whose ``cost`` is within ``budget_ms`` (None if none is)."""
+    within = {name: row for name, row in results.items() if row[cost] <= budget_ms}
+    if not within:
+        return None
+    return max(within, key=lambda name: within[name][score])
+
+
+def write_results(disease, results, frontier, selected, budget_ms=None, ml_dir=ML_DIR):
+    """Write the benchmark table next to the model bundle."""
+    path = benchmark_path(disease, ml_dir)
+    path.write_text(json.dumps({
+        'disease': disease,
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'latency_budget_ms': budget_ms,
+        'selected': selected,
+        'frontier': frontier,
+        'candidates': results,
+    }, indent=2))
+    print(f"   [OK] Benchmark saved: {path}")
+    return path
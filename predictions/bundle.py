@@ -0,0 +1,460 @@
+"""
+Versioned single-file model bundles.
+
+A bundle replaces the ``<model>.pkl`` + ``<scaler>.pkl`` pair with one
+uncompressed ``.npz`` file holding:
+
+* ``manifest`` -- JSON (as uint8 bytes): feature schema, preprocessing
+  (see predictions.preprocessing), model kind and parameters, training
+  metrics, decision threshold, training data hash, global importance and
+  the bundle version;
+* ``scaler__*`` -- scaler centre/scale vectors;
+* ``model__*`` -- model parameters; tree ensembles are flattened into
+  one set of node arrays with per-tree offsets;
+* ``background`` -- scaled SHAP background sample.
+
+No pickle is involved. Members are stored uncompressed, so ``load_bundle``
+memory-maps every array straight out of the file instead of copying it.
+"""
+import hashlib
+import json
+import os
+import struct
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+from .preprocessing import Preprocessor
+
+ML_DIR = Path(__file__).resolve().parent / "ml"
+
+BUNDLE_FORMAT = 1
+
+
+class UnsupportedModel(ValueError):
+    """The estimator has no array representation; keep serving the pickle."""
+
+
+def bundle_path(model_name, ml_dir=ML_DIR):
+    return Path(ml_dir) / f"{model_name}_bundle.npz"
+
+
+# (path, mtime, size) -> hash, so checking a bundle against its pickle on
+# every importance lookup does not reread the pickle
+_hashes = {}
+
+
+def file_hash(path):
+    """Short sha256 of a file's content (training data, pickles)."""
+    stat = os.stat(path)
+    key = (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                digest.update(chunk)
+        _hashes[key] = digest.hexdigest()[:16]
+    return _hashes[key]
+
+
+# --- Inference objects --------------------------------------------------------
+
+class BundleScaler:
+    """``(X - center) / scale`` with the fitted scaler's parameters."""
+
+    def __init__(self, center, scale, feature_names):
+        self.center_ = center
+        self.scale_ = scale
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.n_features_in_ = len(feature_names)
+
+    def transform(self, X):
+        if hasattr(X, 'columns'):
+            X = X[list(self.feature_names_in_)]
+        X = np.asarray(X, dtype=np.float64)
+        return (X - self.center_) / self.scale_
+
+
+class ForestModel:
+    """
+    Vectorized predict_proba over flattened decision trees.
+
+    Node arrays are global across trees; ``left == -1`` marks a leaf and
+    ``value`` holds normalized class probabilities per node.
+    """
+
+    def __init__(self, arrays, params):
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.value = arrays['value']
+        self.node_weight = arrays['node_weight']
+        self.tree_offsets = arrays['tree_offsets']
+        self.classes_ = arrays['classes']
+        self.feature_importances_ = arrays['feature_importances']
+        self.max_depth = params['max_depth']
+        self.n_features_in_ = params['n_features']
+
+    @property
+    def n_trees(self):
+        return len(self.tree_offsets) - 1
+
+    def predict_proba(self, X):
+        # sklearn compares float32 inputs against the split thresholds
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.tree_offsets[:-1], (len(X), self.n_trees)).copy()
+
+        for _ in range(self.max_depth):
+            left = self.left[nodes]
+            internal = left != -1
+            if not internal.any():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(internal, np.where(go_left, left, self.right[nodes]), nodes)
+
+        return self.value[nodes].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def shap_model(self):
+        """Tree dictionary accepted by ``shap.TreeExplainer``."""
+        trees = []
+        scaling = 1.0 / self.n_trees
+        for start, end in zip(self.tree_offsets[:-1], self.tree_offsets[1:]):
+            left = np.asarray(self.left[start:end])
+            right = np.asarray(self.right[start:end])
+            local_left = np.where(left == -1, -1, left - start)
+            trees.append({
+                'children_left': local_left,
+                'children_right': np.where(right == -1, -1, right - start),
+                'children_default': local_left.copy(),
+                'features': np.asarray(self.feature[start:end]),
+                'thresholds': np.asarray(self.threshold[start:end]),
+                'values': np.asarray(self.value[start:end]) * scaling,
+                'node_sample_weight': np.asarray(self.node_weight[start:end], dtype=np.float64),
+            })
+        return {
+            'trees': trees,
+            'input_dtype': np.float32,
+            'internal_dtype': np.float64,
+            'tree_output': "probability",
+        }
+
+
+class LogisticModel:
+    """Binary logistic regression from its coefficients."""
+
+    def __init__(self, arrays, params):
+        self.coef_ = arrays['coef']
+        self.intercept_ = arrays['intercept']
+        self.classes_ = arrays['classes']
+        self.n_features_in_ = params['n_features']
+
+    def decision_function(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef_[0] + self.intercept_[0]
+
+    def predict_proba(self, X):
+        p = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X):
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
+
+
+class GaussianNBModel:
+    """Gaussian naive Bayes from its per-class means, variances and priors."""
+
+    def __init__(self, arrays, params):
+        self.theta_ = arrays['theta']
+        self.var_ = arrays['var']
+        self.class_prior_ = arrays['class_prior']
+        self.classes_ = arrays['classes']
+        self.n_features_in_ = params['n_features']
+
+    def _joint_log_likelihood(self, X):
+        X = np.asarray(X, dtype=np.float64)[:, None, :]
+        log_gauss = -0.5 * (np.log(2.0 * np.pi * self.var_) + (X - self.theta_) ** 2 / self.var_)
+        return np.log(self.class_prior_) + log_gauss.sum(axis=2)
+
+    def predict_proba(self, X):
+        jll = self._joint_log_likelihood(X)
+        jll -= jll.max(axis=1, keepdims=True)
+        p = np.exp(jll)
+        return p / p.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self._joint_log_likelihood(X), axis=1)]
+
+
+MODEL_KINDS = {
+    'forest': ForestModel,
+    'logistic': LogisticModel,
+    'gaussian_nb': GaussianNBModel,
+}
+
+
+# --- Conversion from fitted sklearn objects -----------------------------------
+
+def _scaler_arrays(scaler, n_features):
+    center = getattr(scaler, 'center_', None)
+    if center is None:
+        center = getattr(scaler, 'mean_', None)
+    scale = getattr(scaler, 'scale_', None)
+    if center is None:
+        center = np.zeros(n_features)
+    if scale is None:
+        scale = np.ones(n_features)
+    return {
+        'scaler__center': np.asarray(center, dtype=np.float64),
+        'scaler__scale': np.asarray(scale, dtype=np.float64),
+    }
+
+
+def _flatten_trees(estimators):
+    arrays = {k: [] for k in ('left', 'right', 'feature', 'threshold', 'value', 'node_weight')}
+    offsets = [0]
+    max_depth = 0
+    for est in estimators:
+        tree = est.tree_
+        start = offsets[-1]
+        left = tree.children_left.astype(np.int64)
+        right = tree.children_right.astype(np.int64)
+        arrays['left'].append(np.where(left == -1, -1, left + start))
+        arrays['right'].append(np.where(right == -1, -1, right + start))
+        arrays['feature'].append(tree.feature.astype(np.int64))
+        # Thresholds stay float64: rounding them to float32 can flip splits at data points
+        arrays['threshold'].append(tree.threshold.astype(np.float64))
+        value = tree.value[:, 0, :].astype(np.float64)
+        arrays['value'].append(value / value.sum(axis=1, keepdims=True))
+        arrays['node_weight'].append(tree.weighted_n_node_samples.astype(np.float64))
+        offsets.append(start + tree.node_count)
+        max_depth = max(max_depth, tree.max_depth)
+
+    flat = {f"model__{k}": np.concatenate(v) for k, v in arrays.items()}
+    flat['model__tree_offsets'] = np.asarray(offsets, dtype=np.int64)
+    return flat, max_depth + 1
+
+
+def model_arrays(model):
+    """
+    Array representation of a fitted estimator.
+
+    Returns:
+        tuple: (kind, params dict, arrays dict)
+
+    Raises:
+        UnsupportedModel: for estimators such as SVC or KNN
+    """
+    cls = type(model).__name__
+    n_features = int(model.n_features_in_)
+    classes = np.asarray(model.classes_)
+
+    if cls in ("RandomForestClassifier", "ExtraTreesClassifier", "DecisionTreeClassifier"):
+        estimators = model.estimators_ if hasattr(model, 'estimators_') else [model]
+        arrays, depth = _flatten_trees(estimators)
+        arrays['model__classes'] = classes
+        arrays['model__feature_importances'] = np.asarray(model.feature_importances_, dtype=np.float64)
+        return 'forest', {'estimator': cls, 'max_depth': depth, 'n_features': n_features}, arrays
+
+    logistic_sgd = cls == "SGDClassifier" and getattr(model, 'loss', None) == "log_loss"
+    if (cls == "LogisticRegression" or logistic_sgd) and len(classes) == 2:
+        arrays = {
+            'model__coef': np.asarray(model.coef_, dtype=np.float64),
+            'model__intercept': np.asarray(model.intercept_, dtype=np.float64),
+            'model__classes': classes,
+        }
+        return 'logistic', {'estimator': cls, 'n_features': n_features}, arrays
+
+    if cls == "GaussianNB":
+        arrays = {
+            'model__theta': np.asarray(model.theta_, dtype=np.float64),
+            'model__var': np.asarray(model.var_, dtype=np.float64),
+            'model__class_prior': np.asarray(model.class_prior_, dtype=np.float64),
+            'model__classes': classes,
+        }
+        return 'gaussian_nb', {'estimator': cls, 'n_features': n_features}, arrays
+
+    raise UnsupportedModel(f"No bundle representation for {cls}")
+
+
+def _version(model_name, manifest, arrays):
+    digest = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode())
+    for name in sorted(arrays):
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return f"{model_name}-{digest.hexdigest()[:12]}"
+
+
+def write_bundle(path, model_name, model, scaler, feature_names, metrics=None,
+                 background=None, importance=None, importance_method=None,
+                 training_data_hash=None, source_model_hash=None, threshold=0.5,
+                 extra=None):
+    """
+    Write a bundle for a fitted model/scaler pair.
+
+    Args:
+        path: Destination ``.npz`` file
+        model_name: 'diabetes' or 'kidney'
+        model: Fitted classifier (see ``model_arrays`` for supported types)
+        scaler: Fitted Preprocessor, or a RobustScaler/StandardScaler
+        feature_names: Input column order
+        metrics: Training/evaluation metrics dict
+        background: Scaled SHAP background rows
+        importance: Global importance vector (predictions.importance)
+        training_data_hash: Hash of the source CSV
+        source_model_hash: Hash of the pickle this bundle mirrors, if any
+        threshold: Probability threshold for the positive label
+        extra: Additional JSON-serializable manifest entries
+
+    Returns:
+        str: Bundle version
+    """
+    kind, params, arrays = model_arrays(model)
+    arrays.update(_scaler_arrays(scaler, len(feature_names)))
+    if background is not None:
+        arrays['background'] = np.ascontiguousarray(background, dtype=np.float64)
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'model_name': model_name,
+        'features': list(feature_names),
+        'preprocessing': scaler.to_dict() if hasattr(scaler, 'to_dict') else None,
+        'model_kind': kind,
+        'model_params': params,
+        'threshold': threshold,
+        'metrics': metrics or {},
+        'training_data_hash': training_data_hash,
+        'source_model_hash': source_model_hash,
+        'importance': [float(v) for v in importance] if importance is not None else None,
+        'importance_method': importance_method,
+    }
+    manifest.update(extra or {})
+    manifest['version'] = _version(model_name, manifest, arrays)
+
+    arrays['manifest'] = np.frombuffer(json.dumps(manifest, indent=2).encode(), dtype=np.uint8)
+
+    path = Path(path)
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.tmp.npz")
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+    return manifest['version']
+
+
+def build_bundle(model_name, model, scaler, feature_names, background=None, metrics=None,
+                 model_path=None, training_data_path=None, ml_dir=ML_DIR, extra=None):
+    """
+    Training/conversion entry point: write ``<model_name>_bundle.npz`` next
+    to the pickles it mirrors, with the stored global importance.
+
+    Returns:
+        str or None: Bundle version, or None if the model cannot be bundled
+    """
+    from .importance import MODEL_FILES, load_global_importance
+
+    if model_path is None:
+        model_path = Path(ml_dir) / MODEL_FILES[model_name]
+    importance = load_global_importance(model_name, ml_dir) or {}
+    path = bundle_path(model_name, ml_dir)
+
+    try:
+        version = write_bundle(
+            path, model_name, model, scaler, feature_names,
+            metrics=metrics,
+            background=background,
+            importance=importance.get('importance'),
+            importance_method=importance.get('method'),
+            training_data_hash=file_hash(training_data_path) if training_data_path else None,
+            source_model_hash=file_hash(model_path),
+            extra=extra,
+        )
+    except UnsupportedModel as e:
+        print(f"   [WARN] {e}; the pickle stays in service")
+        return None
+    print(f"   [OK] Model bundle saved: {path} ({version})")
+    return version
+
+
+# --- Loading ------------------------------------------------------------------
+
+def memmap_npz(path):
+    """Memory-map every ``.npy`` member of an uncompressed ``.npz`` file."""
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as fh:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: member {info.filename} is compressed")
+
+            # Local file header: 30 fixed bytes, then name and extra field
+            fh.seek(info.header_offset)
+            name_len, extra_len = struct.unpack("<HH", fh.read(30)[26:30])
+            fh.seek(info.header_offset + 30 + name_len + extra_len)
+
+            version = np.lib.format.read_magic(fh)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(fh)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(fh)
+            if dtype.hasobject:
+                raise ValueError(f"{path}: member {info.filename} holds Python objects")
+
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(
+                    path, dtype=dtype, mode='r', shape=shape, offset=fh.tell(),
+                    order='F' if fortran else 'C',
+                )
+    return arrays
+
+
+class Bundle:
+    """
+    A loaded bundle: ``manifest``, ``model``, ``scaler`` and ``background``.
+
+    ``scaler`` is the bundled Preprocessor; bundles written before
+    preprocessing was stored get the disease defaults around their scaler.
+    """
+
+    def __init__(self, manifest, arrays):
+        self.manifest = manifest
+        self.arrays = arrays
+        self.version = manifest['version']
+        self.features = manifest['features']
+
+        model_arrays_ = {k[len("model__"):]: v for k, v in arrays.items() if k.startswith("model__")}
+        self.model = MODEL_KINDS[manifest['model_kind']](model_arrays_, manifest['model_params'])
+        if manifest.get('preprocessing'):
+            self.scaler = Preprocessor.from_dict(manifest['preprocessing'])
+        else:
+            scaler = BundleScaler(arrays['scaler__center'], arrays['scaler__scale'], self.features)
+            self.scaler = Preprocessor.from_scaler(manifest['model_name'], scaler)
+        self.background = arrays.get('background')
+
+
+def is_current(manifest, model_path):
+    """
+    A bundle mirrors a pickle when it was converted from (or trained
+    alongside) it. If the pickle was replaced since, the bundle is stale.
+    """
+    source = manifest.get('source_model_hash')
+    model_path = Path(model_path)
+    return source is None or not model_path.exists() or file_hash(model_path) == source
+
+
+def read_manifest(path):
+    arrays = memmap_npz(path)
+    return json.loads(bytes(arrays['manifest']).decode())
+
+
+def load_bundle(path):
+    """Load a bundle with all arrays memory-mapped read-only."""
+    arrays = memmap_npz(path)
+    manifest = json.loads(bytes(arrays.pop('manifest')).decode())
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f"{path}: unsupported bundle format {manifest.get('format')}")
+    return Bundle(manifest, arrays)
@@ -0,0 +1,183 @@
+"""
+Cached training datasets in a columnar, memory-mappable format.
+
+Parsing the CSVs and re-running renames, filters and imputation in every
+offline script is slow once the datasets grow. Two cache levels live in
+``ml/cache`` as uncompressed ``.npz`` files (one ``.npy`` member per column or
+array), opened with predictions.bundle.memmap_npz so nothing is copied until
+it is used:
+
+* ``load_table(csv)`` -- the raw CSV, one array per column, keyed by the
+  CSV content hash;
+* ``load_split(disease)`` -- the filtered, fixed-seed train/test split with
+  raw and cleaned (imputed/clipped) feature arrays and the Preprocessor
+  fitted on the training rows, keyed additionally by the preprocessing
+  version and the split parameters.
+
+Both are rebuilt automatically when the source file or the preprocessing
+changes.
+"""
+import json
+import os
+from pathlib import Path
+
+from .bundle import file_hash, memmap_npz
+from .lazy import lazy_import
+from .preprocessing import SPECS, Preprocessor, load_frame, spec_version
+
+np = lazy_import("numpy")
+
+ML_DIR = Path(__file__).resolve().parent / "ml"
+
+
+def cache_dir(ml_dir=ML_DIR):
+    path = Path(ml_dir) / "cache"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _write_npz(path, arrays):
+    """
+    Write arrays to ``path`` atomically, only once the file reads back.
+
+    A cache file that cannot be memory-mapped would otherwise sit under its
+    content-hash name and fail every later load.
+    """
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.tmp.npz")
+    try:
+        np.savez(tmp, **arrays)
+        memmap_npz(tmp)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    os.replace(tmp, path)
+
+
+def _column_array(series):
+    """
+    A CSV column as a memory-mappable array.
+
+    Text columns become fixed-width unicode with "" for missing values
+    (object arrays would be pickled into the file); ``load_table`` turns ""
+    back into NaN, as read_csv reads empty fields.
+    """
+    values = series.to_numpy()
+    if values.dtype.hasobject:
+        values = np.where(series.isna().to_numpy(), "", values.astype(str)).astype(str)
+    return values
+
+
+def _encode_json(data):
+    return np.frombuffer(json.dumps(data).encode(), dtype=np.uint8)
+
+
+def _decode_json(array):
+    return json.loads(bytes(array).decode())
+
+
+def load_table(csv_name, ml_dir=ML_DIR):
+    """
+    The CSV ``csv_name`` as a DataFrame, parsed once per file version.
+
+    Returns:
+        pandas.DataFrame with the original column names and order
+    """
+    import pandas as pd
+
+    source = Path(ml_dir) / csv_name
+    path = cache_dir(ml_dir) / f"{source.stem}_table_{file_hash(source)}.npz"
+
+    if not path.exists():
+        df = pd.read_csv(source)
+        arrays = {f"col{i}": _column_array(df[column]) for i, column in enumerate(df.columns)}
+        arrays['columns'] = _encode_json(list(df.columns))
+        _write_npz(path, arrays)
+
+    arrays = memmap_npz(path)
+    columns = _decode_json(arrays['columns'])
+    data = {}
+    for i, column in enumerate(columns):
+        values = np.asarray(arrays[f"col{i}"])
+        if values.dtype.kind == 'U':
+            text, values = values, values.astype(object)
+            values[text == ""] = np.nan
+        data[column] = values
+    return pd.DataFrame(data)
+
+
+class DatasetSplit:
+    """
+    Memory-mapped train/test split of one disease dataset.
+
+    Attributes:
+        X_train, X_test: Raw feature rows (renamed, filtered, model order)
+        X_train_clean, X_test_clean: After imputation and clipping
+        y_train, y_test: Integer labels
+        preprocessor: Preprocessor fitted on the training rows
+        features: Column names of the X arrays
+    """
+
+    def __init__(self, arrays, path):
+        self.path = path
+        meta = _decode_json(arrays['meta'])
+        self.features = meta['features']
+        self.key = meta['key']
+        self.preprocessor = Preprocessor.from_dict(meta['preprocessor'])
+        for name in ('X_train', 'X_test', 'X_train_clean', 'X_test_clean', 'y_train', 'y_test'):
+            setattr(self, name, arrays[name])
+
+    def frame(self, name):
+        """One of the X arrays as a DataFrame with feature column names."""
+        import pandas as pd
+
+        return pd.DataFrame(np.asarray(getattr(self, name)), columns=self.features)
+
+    def frames(self):
+        """(X_train, X_test, y_train, y_test) as pandas, like train_test_split."""
+        import pandas as pd
+
+        return (
+            self.frame('X_train'), self.frame('X_test'),
+            pd.Series(np.asarray(self.y_train)), pd.Series(np.asarray(self.y_test)),
+        )
+
+
+def load_split(disease, test_size=0.2, random_state=15, stratify=False, ml_dir=ML_DIR):
+    """
+    Cached fixed-seed train/test split for ``disease``.
+
+    The defaults reproduce the split the train_* scripts have always used.
+
+    Returns:
+        DatasetSplit
+    """
+    spec = SPECS[disease]
+    source = Path(ml_dir) / spec['csv']
+    split_key = f"t{test_size:g}-r{random_state}-{'s' if stratify else 'u'}"
+    key = f"{disease}_{file_hash(source)}_{spec_version(disease)}_{split_key}"
+    path = cache_dir(ml_dir) / f"{key}.npz"
+
+    if not path.exists():
+        from sklearn.model_selection import train_test_split
+
+        X, y = load_frame(disease, ml_dir)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=test_size, random_state=random_state,
+            stratify=y if stratify else None,
+        )
+        preprocessor = Preprocessor.for_disease(disease).fit(X_train)
+        _write_npz(path, {
+            'X_train': X_train.to_numpy(dtype=np.float64),
+            'X_test': X_test.to_numpy(dtype=np.float64),
+            'X_train_clean': preprocessor.clean(X_train),
+            'X_test_clean': preprocessor.clean(X_test),
+            'y_train': y_train.to_numpy(dtype=np.int64),
+            'y_test': y_test.to_numpy(dtype=np.int64),
+            'meta': _encode_json({
+                'key': key,
+                'features': list(X.columns),
+                'preprocessor': preprocessor.to_dict(),
+            }),
+        })
+
+    return DatasetSplit(memmap_npz(path), path)
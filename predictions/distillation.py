@@ -0,0 +1,180 @@
+"""
+Distil a trained model (the teacher) into a compact serving model.
+
+A large forest or kernel model is expensive to load, explain and run per
+request. The student is fitted to reproduce the teacher's probabilities
+rather than the original labels:
+
+1. The training rows are augmented with synthetic rows (real rows jittered
+   in scaled space, plus rows whose features are resampled independently
+   from the training marginals), so the student also sees the teacher's
+   behaviour between and around the real data.
+2. Every row is labelled with the teacher's ``predict_proba``. Soft targets
+   are learned by any classifier that accepts sample weights: each row is
+   presented once as class 1 with weight p and once as class 0 with weight
+   1 - p, which is exactly cross-entropy against the teacher's probability.
+3. Fidelity is measured on the hold-out rows and on fresh synthetic rows:
+   label agreement and mean absolute probability error, plus hold-out
+   accuracy/ROC AUC against the true labels and the serving latency (see
+   predictions.benchmark).
+
+The tree and linear students are bundleable, so they load and explain as
+fast as the bundle format allows.
+"""
+from pathlib import Path
+
+import numpy as np
+
+ML_DIR = Path(__file__).resolve().parent / "ml"
+
+# Synthetic rows per real training row
+AUGMENT_FACTOR = 5
+# Jitter as a fraction of each feature's (robust-scaled) spread
+JITTER = 0.3
+
+# A student replaces the teacher only if it is at least this faithful
+MIN_AGREEMENT = 0.97
+MAX_PROBA_MAE = 0.05
+# ... and serves at most this fraction of the teacher's p99 latency and
+# artifact size; a student that is not clearly cheaper buys nothing
+MAX_COST_RATIO = 0.8
+
+
+def teacher_path(disease, ml_dir=ML_DIR):
+    """Where the teacher is kept for audit when a student is deployed."""
+    return Path(ml_dir) / f"{disease}_teacher.pkl"
+
+
+def students(random_state=42):
+    """Compact candidate students, smallest first."""
+    from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.tree import DecisionTreeClassifier
+
+    return {
+        "Logistic Regression": LogisticRegression(C=10.0, max_iter=2000),
+        "Decision Tree (depth 6)": DecisionTreeClassifier(
+            max_depth=6, min_samples_leaf=5, random_state=random_state
+        ),
+        "Small Forest (15 x depth 6)": RandomForestClassifier(
+            n_estimators=15, max_depth=6, min_samples_leaf=3, random_state=random_state
+        ),
+        "Shallow Boosted Trees": HistGradientBoostingClassifier(
+            max_depth=3, max_iter=60, learning_rate=0.2, random_state=random_state
+        ),
+    }
+
+
+def augment(X_scaled, factor=AUGMENT_FACTOR, jitter=JITTER, random_state=42):
+    """
+    Synthetic rows around and between the real (scaled) rows.
+
+    Half are jittered copies of real rows, half mix each feature from a
+    different random row; all stay inside the observed per-feature range.
+    """
+    rng = np.random.default_rng(random_state)
+    X_scaled = np.asarray(X_scaled, dtype=np.float64)
+    n, d = X_scaled.shape
+    n_new = n * factor
+    low, high = X_scaled.min(axis=0), X_scaled.max(axis=0)
+    spread = X_scaled.std(axis=0) + 1e-12
+
+    jittered = X_scaled[rng.integers(0, n, n_new // 2)]
+    jittered = jittered + rng.normal(size=jittered.shape) * spread * jitter
+    mixed = X_scaled[rng.integers(0, n, (n_new - n_new // 2, d)), np.arange(d)]
+    return np.clip(np.vstack([jittered, mixed]), low, high)
+
+
+def fit_student(student, X, soft_targets):
+    """Fit a clone of ``student`` to teacher probabilities via weighted duplicates."""
+    from sklearn.base import clone
+
+    n = len(X)
+    model = clone(student)
+    model.fit(
+        np.vstack([X, X]),
+        np.concatenate([np.ones(n, dtype=int), np.zeros(n, dtype=int)]),
+        sample_weight=np.concatenate([soft_targets, 1.0 - soft_targets]) + 1e-9,
+    )
+    return model
+
+
+def fidelity(teacher_proba, student_proba):
+    return {
+        'agreement': float(np.mean((teacher_proba >= 0.5) == (student_proba >= 0.5))),
+        'proba_mae': float(np.mean(np.abs(teacher_proba - student_proba))),
+    }
+
+
+def cheaper(student, teacher, max_ratio=MAX_COST_RATIO):
+    """Whether benchmark figures ``student`` beat ``teacher``'s latency and size by the margin."""
+    return (
+        student['p99_ms'] <= max_ratio * teacher['p99_ms']
+        and student['artifact_bytes'] <= max_ratio * teacher['artifact_bytes']
+    )
+
+
+def distill(disease, teacher, preprocessor, X_train, X_test, y_test, random_state=42,
+            min_agreement=MIN_AGREEMENT, max_mae=MAX_PROBA_MAE, max_cost_ratio=MAX_COST_RATIO, log=print):
+    """
+    Fit every student to ``teacher`` and pick the one to deploy.
+
+    Args:
+        X_train, X_test: Raw training / hold-out rows
+        y_test: Hold-out labels (for accuracy and ROC AUC only)
+
+    Returns:
+        dict: teacher (its hold-out and latency figures), students ({name:
+            fidelity, accuracy, roc_auc and benchmark figures}), selected
+            (name, or None when no student is both faithful enough and
+            cheaper than the teacher) and models
+            ({name: fitted student})
+    """
+    from sklearn.metrics import accuracy_score, roc_auc_score
+
+    from .benchmark import benchmark_model
+
+    X_train_scaled = preprocessor.transform(X_train)
+    X_test_scaled = preprocessor.transform(X_test)
+    X_fit = np.vstack([X_train_scaled, augment(X_train_scaled, random_state=random_state)])
+    X_probe = augment(X_test_scaled, factor=2, random_state=random_state + 1)
+
+    def teacher_proba(X):
+        return teacher.predict_proba(X)[:, 1]
+
+    def summary(model):
+        proba = model.predict_proba(X_test_scaled)[:, 1]
+        return {
+            'accuracy': float(accuracy_score(y_test, (proba >= 0.5).astype(int))),
+            'roc_auc': float(roc_auc_score(y_test, proba)),
+            **benchmark_model(disease, model, preprocessor, X_test, shap=False),
+        }
+
+    report = {'teacher': summary(teacher), 'students': {}, 'models': {}}
+    targets, test_targets, probe_targets = (
+        teacher_proba(X_fit), teacher_proba(X_test_scaled), teacher_proba(X_probe)
+    )
+    log(f"   distilling on {len(X_fit)} rows ({len(X_train_scaled)} real + synthetic)")
+
+    for name, student in students(random_state).items():
+        model = fit_student(student, X_fit, targets)
+        holdout = fidelity(test_targets, model.predict_proba(X_test_scaled)[:, 1])
+        probe = fidelity(probe_targets, model.predict_proba(X_probe)[:, 1])
+        report['students'][name] = {
+            **holdout,
+            'synthetic_agreement': probe['agreement'],
+            'synthetic_proba_mae': probe['proba_mae'],
+            **summary(model),
+        }
+        report['models'][name] = model
+        log(f"   {name}: agreement {holdout['agreement']:.3f}, "
+            f"proba MAE {holdout['proba_mae']:.4f}, p99 {report['students'][name]['p99_ms']:.3f} ms")
+
+    eligible = {
+        name: row for name, row in report['students'].items()
+        if row['agreement'] >= min_agreement and row['proba_mae'] <= max_mae
+        and cheaper(row, report['teacher'], max_cost_ratio)
+    }
+    # Among faithful students that beat the teacher, deploy the cheapest to serve
+    report['selected'] = min(eligible, key=lambda name: eligible[name]['p99_ms']) if eligible else None
+    return report
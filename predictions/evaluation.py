@@ -0,0 +1,195 @@
+"""
+Batch evaluation of the disease models on external test sheets.
+
+``run_test_predictions.py`` scores ``test_dataset.xlsx``, whose values come
+in mixed units and free-text formats. Everything here works on whole
+columns: unit conversion (predictions.units), blood-pressure parsing, RBC
+mapping and the clinical ground-truth rules are pandas/numpy expressions,
+and each model is called once with every complete row. Rows are scaled
+as create_prediction scales a request (predictions.preprocessing, with
+out-of-range values and zeros clipped to the plausible ranges); the old
+``iterrows`` loop scaled the raw values, so rows with values outside those
+ranges can score differently from it. Rows that used to raise (e.g. a
+non-numeric blood pressure) are now reported as "Missing Data" instead of
+"Error".
+"""
+import numpy as np
+import pandas as pd
+
+from .preprocessing import as_preprocessor
+from .units import AUTO, normalize
+
+# Units of the test sheets: glucose and creatinine come in mixed units and
+# are detected per value; hemoglobin is always g/dL and urea mmol/L
+SHEET_UNITS = {
+    'glucose': AUTO,
+    'creatinine': AUTO,
+    'hemoglobin': "g/dL",
+    'urea': "mmol/L",
+}
+
+DIABETES_LABELS = ("Negative", "Positive")
+KIDNEY_LABELS = ("No CKD", "CKD")
+UNKNOWN = "Unknown"
+MISSING = "Missing Data"
+
+
+def _column(df, name):
+    """``df[name]``, or an all-NaN column if the sheet does not have it."""
+    if name in df.columns:
+        return df[name]
+    return pd.Series(np.nan, index=df.index)
+
+
+def _numeric(values):
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+
+
+def parse_bp(values):
+    """Diastolic pressure from "120/80" strings or plain numbers (NaN if unreadable)."""
+    text = pd.Series(values).astype("string").str.strip()
+    diastolic = text.str.split("/").str[1].where(text.str.contains("/", regex=False), text)
+    return _numeric(diastolic)
+
+
+def map_rbc(values):
+    """Red blood cells as 1.0 (normal) / 0.0 (abnormal); blanks count as normal."""
+    values = pd.Series(values)
+    text = values.astype("string").str.strip().str.lower()
+    rbc = pd.to_numeric(values, errors='coerce')
+    rbc = rbc.mask(text.isin(["abnormal", "0"]), 0.0)
+    return rbc.fillna(1.0).to_numpy(dtype=np.float64)
+
+
+def _lab(df, column, analyte, units):
+    return normalize(analyte, _numeric(_column(df, column)), units.get(analyte)).value
+
+
+def prepare_diabetes(df, units=None):
+    """
+    Diabetes model inputs in model order, converted to training units.
+
+    Args:
+        units: {analyte: declared unit or "auto"} overriding ``SHEET_UNITS``
+    """
+    units = {**SHEET_UNITS, **(units or {})}
+    glucose = _lab(df, 'Glucose', 'glucose', units)
+    return pd.DataFrame({
+        'Age': _numeric(_column(df, 'Age')),
+        'BMI': _numeric(_column(df, 'BMI')),
+        'BloodPressure': parse_bp(_column(df, 'Blood Pressure')),
+        'Glucose': glucose,
+    }, index=df.index)
+
+
+def prepare_kidney(df, units=None):
+    """Kidney model inputs in model order, converted to training units; see ``prepare_diabetes``."""
+    units = {**SHEET_UNITS, **(units or {})}
+    return pd.DataFrame({
+        'Creatinine': _lab(df, 'Creatnine', 'creatinine', units),
+        'Pottasium': _lab(df, 'Potassium', 'potassium', units),
+        'Hemoglobin': _lab(df, 'Hemoglobin', 'hemoglobin', units),
+        'Sodium': _lab(df, 'Sodium', 'sodium', units),
+        'Blood Pressure': parse_bp(_column(df, 'Blood Pressure')),
+        'Red Blood Cell': map_rbc(_column(df, 'Red blood Cell')),
+        'Urea': _lab(df, 'Urea', 'urea', units),
+        'Albumin': _numeric(_column(df, 'Albumin')),
+    }, index=df.index)
+
+
+def diabetes_labels(X):
+    """
+    Assumed ground truth from glucose: random glucose >= 140 mg/dL is
+    treated as positive (conservative prediabetes threshold).
+    """
+    glucose = X['Glucose'].to_numpy()
+    return np.select(
+        [np.isnan(glucose), glucose >= 140], [UNKNOWN, DIABETES_LABELS[1]], DIABETES_LABELS[0]
+    ).astype(object)
+
+
+def kidney_labels(X):
+    """
+    Assumed CKD ground truth from a composite score: creatinine > 1.3 mg/dL
+    counts 2, urea > 45 mg/dL and hemoglobin < 12 g/dL count 1 each;
+    a score of 2 or more is CKD.
+    """
+    creatinine = X['Creatinine'].to_numpy()
+    score = (
+        2 * (creatinine > 1.3)
+        + (X['Urea'].to_numpy() > 45)
+        + (X['Hemoglobin'].to_numpy() < 12)
+    )
+    return np.select(
+        [np.isnan(creatinine), score >= 2], [UNKNOWN, KIDNEY_LABELS[1]], KIDNEY_LABELS[0]
+    ).astype(object)
+
+
+def summarize(truth, predicted, labels):
+    """
+    Accuracy, F1 and confusion matrix over rows with a known label and a
+    model prediction.
+
+    Returns:
+        dict: rows, accuracy, f1, confusion (rows = truth, cols = predicted,
+            in ``labels`` order) and the sklearn classification report
+    """
+    from sklearn.metrics import accuracy_score, classification_report, confusion_matrix, f1_score
+
+    valid = np.isin(truth, labels) & np.isin(predicted, labels)
+    truth, predicted = truth[valid], predicted[valid]
+    if not len(truth):
+        return {'rows': 0}
+    return {
+        'rows': int(len(truth)),
+        'accuracy': float(accuracy_score(truth, predicted)),
+        'f1': float(f1_score(truth, predicted, pos_label=labels[1], average='binary')),
+        'confusion': confusion_matrix(truth, predicted, labels=list(labels)),
+        'report': classification_report(truth, predicted, zero_division=0),
+    }
+
+
+def _evaluate(X, truth, labels, predict):
+    complete = ~X.isna().any(axis=1).to_numpy()
+    predicted = np.full(len(X), MISSING, dtype=object)
+    if complete.any():
+        positive = predict(X[complete])
+        predicted[complete] = np.where(positive, labels[1], labels[0])
+    return {
+        'features': X,
+        'truth': truth,
+        'predicted': predicted,
+        'metrics': summarize(truth, predicted, labels),
+    }
+
+
+def evaluate_diabetes(df, model, scaler, units=None):
+    """
+    Score every row of ``df`` with the diabetes model in one call.
+
+    ``units`` declares the sheet's lab units (see ``prepare_diabetes``).
+    ``scaler`` is a Preprocessor or a legacy fitted scaler (wrapped with
+    ``as_preprocessor``); either way values are clipped to the plausible
+    ranges before scaling, exactly as the prediction form's inputs are,
+    rather than scaled raw as the old per-row loop did.
+
+    Returns:
+        dict: features, truth and predicted label arrays (aligned with
+            ``df``) and the metrics from ``summarize``
+    """
+    X = prepare_diabetes(df, units)
+    scaler = as_preprocessor('diabetes', scaler)
+    return _evaluate(
+        X, diabetes_labels(X), DIABETES_LABELS,
+        lambda rows: model.predict(scaler.transform(rows, zero_as_missing=False)).astype(int) == 1,
+    )
+
+
+def evaluate_kidney(df, model, scaler, threshold=0.5, units=None):
+    """Score every row of ``df`` with the kidney model; see ``evaluate_diabetes``."""
+    X = prepare_kidney(df, units)
+    scaler = as_preprocessor('kidney', scaler)
+    return _evaluate(
+        X, kidney_labels(X), KIDNEY_LABELS,
+        lambda rows: model.predict_proba(scaler.transform(rows, zero_as_missing=False))[:, 1] >= threshold,
+    )
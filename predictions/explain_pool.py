@@ -0,0 +1,169 @@
+"""
+Process pool for model-agnostic (Kernel SHAP) explanations.
+
+Kernel SHAP is only needed for models without a tree or linear explainer
+(e.g. an RBF ``SVC``). It is CPU bound and can take seconds, so it runs in a
+dedicated process pool with a bounded ``nsamples`` budget and a per-request
+deadline instead of holding the GIL in the request thread. When the deadline
+is hit the caller gets a cheap occlusion approximation instead.
+
+Settings (all optional):
+    EXPLAIN_POOL_WORKERS: Number of worker processes (default 2)
+    EXPLAIN_KERNEL_NSAMPLES: Kernel SHAP coalition budget per row (default 200)
+    EXPLAIN_KERNEL_DEADLINE: Seconds to wait for the pool (default 2.0)
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from django.conf import settings
+
+from . import metrics
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+DEFAULT_WORKERS = 2
+DEFAULT_NSAMPLES = 200
+DEFAULT_DEADLINE = 2.0
+
+_pool = None
+_pool_lock = threading.Lock()
+_inflight = 0
+
+
+def _workers():
+    return getattr(settings, 'EXPLAIN_POOL_WORKERS', DEFAULT_WORKERS)
+
+
+def _init_worker():
+    # Pay the shap import once per worker rather than inside the first task
+    import shap  # noqa: F401
+
+
+def get_pool():
+    """Create the explanation pool on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn avoids forking a threaded web worker
+            ctx = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(
+                max_workers=_workers(), mp_context=ctx, initializer=_init_worker
+            )
+        return _pool
+
+
+def shutdown_pool(wait=False):
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait, cancel_futures=True)
+            _pool = None
+
+
+def _kernel_shap_task(model, masker_data, X_scaled, nsamples, submitted_at):
+    """Runs inside a pool worker."""
+    started_at = time.time()
+    import shap
+
+    fn = model.predict_proba if hasattr(model, 'predict_proba') else model.predict
+    explainer = shap.KernelExplainer(fn, masker_data)
+    shap_values = explainer.shap_values(X_scaled, nsamples=nsamples, silent=True)
+    return shap_values, started_at - submitted_at
+
+
+def occlusion_values(model, masker_data, X_scaled):
+    """
+    Cheap attribution used when Kernel SHAP misses its deadline.
+
+    Each feature's contribution is the change in the positive-class output
+    when that feature is replaced by its background mean. Costs one batched
+    model call of ``n_features + 1`` rows.
+    """
+    X = np.asarray(X_scaled, dtype=np.float64)[:1]
+    baseline = np.asarray(masker_data, dtype=np.float64).mean(axis=0)
+    n_features = X.shape[1]
+
+    batch = np.repeat(X, n_features + 1, axis=0)
+    batch[np.arange(1, n_features + 1), np.arange(n_features)] = baseline
+
+    if hasattr(model, 'predict_proba'):
+        out = model.predict_proba(batch)[:, 1]
+    else:
+        out = np.asarray(model.predict(batch), dtype=np.float64)
+    return (out[0] - out[1:]).reshape(1, -1)
+
+
+def _on_done(future, submitted_at):
+    global _inflight
+    with _pool_lock:
+        _inflight -= 1
+        inflight = _inflight
+    _record_utilization(inflight)
+    if not future.cancelled() and future.exception() is None:
+        _, queue_wait = future.result()
+        metrics.observe('explain_pool.queue_wait', queue_wait)
+    metrics.observe('explain_pool.task_time', time.time() - submitted_at)
+
+
+def _record_utilization(inflight):
+    workers = _workers()
+    metrics.gauge('explain_pool.inflight', inflight)
+    metrics.gauge('explain_pool.utilization', min(inflight, workers) / workers)
+    metrics.gauge('explain_pool.queue_depth', max(0, inflight - workers))
+
+
+def kernel_shap(model, masker_data, X_scaled, nsamples=None, deadline=None):
+    """
+    Kernel SHAP values for ``X_scaled`` computed in the explanation pool.
+
+    Args:
+        model: Fitted estimator
+        masker_data: Scaled background rows
+        X_scaled: Scaled input rows to explain
+        nsamples: Coalition budget (defaults to EXPLAIN_KERNEL_NSAMPLES)
+        deadline: Seconds to wait (defaults to EXPLAIN_KERNEL_DEADLINE)
+
+    Returns:
+        tuple: (shap_values, method) where method is 'kernel' or
+        'occlusion' if the deadline was hit or the pool failed
+    """
+    global _inflight
+    if nsamples is None:
+        nsamples = getattr(settings, 'EXPLAIN_KERNEL_NSAMPLES', DEFAULT_NSAMPLES)
+    if deadline is None:
+        deadline = getattr(settings, 'EXPLAIN_KERNEL_DEADLINE', DEFAULT_DEADLINE)
+
+    submitted_at = time.time()
+    try:
+        future = get_pool().submit(
+            _kernel_shap_task, model, np.asarray(masker_data), np.asarray(X_scaled),
+            nsamples, submitted_at
+        )
+    except Exception as e:
+        print(f"Explanation pool unavailable: {e}")
+        metrics.incr('explain_pool.errors')
+        return occlusion_values(model, masker_data, X_scaled), 'occlusion'
+
+    with _pool_lock:
+        _inflight += 1
+        inflight = _inflight
+    _record_utilization(inflight)
+    metrics.incr('explain_pool.submitted')
+    future.add_done_callback(lambda f: _on_done(f, submitted_at))
+
+    try:
+        shap_values, _ = future.result(timeout=deadline)
+        metrics.incr('explain_pool.completed')
+        return shap_values, 'kernel'
+    except FutureTimeout:
+        # Drop the task if it has not started yet; a running task finishes in the background
+        future.cancel()
+        metrics.incr('explain_pool.deadline_exceeded')
+    except Exception as e:
+        print(f"Kernel SHAP failed in pool: {e}")
+        metrics.incr('explain_pool.errors')
+
+    return occlusion_values(model, masker_data, X_scaled), 'occlusion'
@@ -1,129 +1,75 @@
 import os
-import matplotlib
-matplotlib.use('Agg')  # Force Agg backend before importing pyplot
-import matplotlib.pyplot as plt
-import shap
-import numpy as np
-import joblib
 from pathlib import Path
 from django.conf import settings
 
-# Ensure output directory exists
+from .explain_pool import kernel_shap
+from .importance import load_global_importance
+from .lazy import lazy_import, use_agg_backend
+
+# Heavy modules load on first use; Agg is forced before pyplot is imported
+np = lazy_import("numpy")
+plt = lazy_import("matplotlib.pyplot", before=use_agg_backend)
+shap = lazy_import("shap")
+
 EXPLAIN_DIR = Path(settings.MEDIA_ROOT) / "explain"
-EXPLAIN_DIR.mkdir(parents=True, exist_ok=True)
 
-def generate_global_feature_importance(model, feature_names, model_name, background_data=None):
+
+def explain_dir():
+    """Output directory for explanation images, created on first use."""
+    EXPLAIN_DIR.mkdir(parents=True, exist_ok=True)
+    return EXPLAIN_DIR
+
+
+def generate_global_feature_importance(model_name, feature_names=None):
     """
-    Generate and save global feature importance plot for the model.
-    This is generated ONCE and reused.
-    
+    Render the global feature importance plot for the deployed model.
+
+    Importance values are computed at training time and stored with the model
+    artifact (see predictions.importance). The image name carries the model
+    hash, so a retrained model gets a fresh plot instead of the old one.
+    No SHAP computation happens here.
+
     Args:
-        model: Trained model object
-        feature_names: List of feature names
         model_name: 'diabetes' or 'kidney'
-        background_data: Optional DataFrame or numpy array for SHAP background (required for SVM)
-        
+        feature_names: Optional display names overriding the stored ones
+
     Returns:
-        str: Relative path to the saved image
+        str: Relative path to the saved image, or None if no importance
+        artifact matches the deployed model
     """
-    filename = f"global_{model_name}_fi.png"
-    filepath = EXPLAIN_DIR / filename
-    
-    # If file exists, return existing path (reuse)
-    # Check if file exists and ensure it's not empty/corrupt (basic check)
+    payload = load_global_importance(model_name)
+    if payload is None:
+        print(f"Warning: No global importance artifact for current {model_name} model")
+        return None
+
+    filename = f"global_{model_name}_fi_{payload['model_hash']}.png"
+    filepath = explain_dir() / filename
+
+    # Reuse the plot rendered for this model version
     if filepath.exists() and filepath.stat().st_size > 0:
         return f"explain/{filename}"
-    
+
     try:
-        importance = None
-        
-        # 1. Try native feature importance (Trees)
-        try:
-            if hasattr(model, 'feature_importances_'):
-                importance = model.feature_importances_
-        except Exception:
-            pass
-            
-        if importance is None:
-            # 2. Try coefficients (Linear)
-            try:
-                # Safe check for coef_ which might raise errors on some SVM configurations
-                if hasattr(model, 'coef_'):
-                    if model.coef_.ndim > 1:
-                        importance = np.abs(model.coef_[0])
-                    else:
-                        importance = np.abs(model.coef_)
-            except Exception:
-                pass
-                
-        # 3. Fallback: SHAP-based Global Importance (SVM / RBF)
-        if importance is None and background_data is not None:
-            print(f"Calculating SHAP-based Global FI for {model_name}...")
-            # Use summarized background data to speed up KernelExplainer
-            # K-means summary of 10-20 samples is usually sufficient for global trend
-            try:
-                # Ensure numpy array
-                X_bg = np.asarray(background_data, dtype=np.float64)
-                
-                # Summarize usually helpful for large datasets, but if passed small sample, use directly
-                # To avoid potential ambiguity errors with shap.kmeans objects, we'll use a direct subsample
-                if len(X_bg) > 10:
-                    # Random sample or just first 10
-                    # Using first 10 for deterministic behavior if not shuffled, or simple logic
-                    X_summary = X_bg[:10]
-                else:
-                    X_summary = X_bg
-                
-                # Setup Explainer
-                # For SVM, we need a generic explainer (Kernel) working on the predict function
-                # Note: model.predict might return classes or probabilities. KernelExplainer usually likes predict_proba for better granularity,
-                # but for importance, predict is often okay if discrete. Ideally probability.
-                fn = model.predict_proba if hasattr(model, 'predict_proba') else model.predict
-                
-                explainer = shap.KernelExplainer(fn, X_summary)
-                
-                # Calculate SHAP values for a representative sample (e.g., the summary itself or a subset of background)
-                # Ideally we want the average magnitude over the dataset
-                shap_values = explainer.shap_values(X_summary)
-                
-                # Handle SHAP output shape
-                if isinstance(shap_values, list):
-                    shap_values = shap_values[1] # Positive class
-                
-                # Compute global importance: mean absolute value per feature
-                importance = np.mean(np.abs(shap_values), axis=0)
-                
-            except Exception as e:
-                print(f"SHAP Global FI calculation failed for {model_name}: {e}")
-                import traceback
-                traceback.print_exc()
-                return None
-        
-        if importance is None:
-            print(f"Warning: Could not extract global importance for {model_name}")
-            return None
+        importance = np.asarray(payload['importance'], dtype=np.float64)
+        names = feature_names or payload['features']
 
-        # Ensure 1D
-        if hasattr(importance, 'flatten'):
-            importance = importance.flatten()
-        
         # Sort and plot
         fig = plt.figure(figsize=(10, 6))
-        
+
         indices = np.argsort(importance)[::-1][:10]  # Top 10
-        valid_indices = [i for i in indices if i < len(feature_names)]
-        
-        plt.barh([feature_names[i] for i in valid_indices], importance[valid_indices], color='#2563eb')
+        valid_indices = [i for i in indices if i < len(names)]
+
+        plt.barh([names[i] for i in valid_indices], importance[valid_indices], color='#2563eb')
         plt.xlabel("Relative Importance (SHAP impact if applicable)", fontsize=12, fontweight='bold')
         plt.title(f"{model_name.capitalize()} - Global Feature Importance", fontsize=14, fontweight='bold')
         plt.gca().invert_yaxis()
         plt.tight_layout()
-        
+
         fig.savefig(filepath, dpi=100, bbox_inches='tight')
         plt.close(fig)
-        
+
         return f"explain/{filename}"
-        
+
     except Exception as e:
         print(f"Error generating global FI for {model_name}: {e}")
         return None
@@ -171,7 +117,7 @@ def generate_patient_shap(model, scaler, input_data, feature_names, prediction_i
     Generate SHAP force/waterfall plot and clinical explanation.
     """
     filename = f"shap_{model_name}_{prediction_id}.png"
-    filepath = EXPLAIN_DIR / filename
+    filepath = explain_dir() / filename
     
     explanation_text = "Analysis not available."
     
@@ -196,9 +142,11 @@ def generate_patient_shap(model, scaler, input_data, feature_names, prediction_i
             masker_data = background_data
 
         # Select Explainer
+        method = 'shap'
         try:
-            # Tree-based
-            explainer = shap.TreeExplainer(model)
+            # Tree-based (bundled forests hand SHAP their flattened trees)
+            tree_model = model.shap_model() if hasattr(model, 'shap_model') else model
+            explainer = shap.TreeExplainer(tree_model)
             shap_values = explainer.shap_values(X_scaled)
         except:
             try:
@@ -209,12 +157,12 @@ def generate_patient_shap(model, scaler, input_data, feature_names, prediction_i
                 shap_values = explainer.shap_values(X_scaled)
             except:
                 try:
-                    # Fallback (Kernel)
-                    explainer = shap.KernelExplainer(model.predict, masker_data)
-                    shap_values = explainer.shap_values(X_scaled)
+                    # Fallback (Kernel) - runs in the explanation pool under a deadline
+                    explainer = None
+                    shap_values, method = kernel_shap(model, masker_data, X_scaled)
                 except Exception as e:
                     print(f"SHAP Explainer failed for {model_name}: {e}")
-                    return None, explanation_text
+                    return None, explanation_text, {}
 
         # Handle SHAP output shape
         vals = shap_values
@@ -226,7 +174,7 @@ def generate_patient_shap(model, scaler, input_data, feature_names, prediction_i
         elif shap_values.ndim == 2:
             vals = shap_values[0]
             
-        base_value = explainer.expected_value
+        base_value = explainer.expected_value if explainer is not None else None
         if isinstance(base_value, list) or isinstance(base_value, np.ndarray):
              if len(base_value) > 1:
                  base_value = base_value[1]
@@ -276,6 +224,8 @@ def generate_patient_shap(model, scaler, input_data, feature_names, prediction_i
         
         condition = "diabetes" if model_name == 'diabetes' else "kidney disease"
         explanation_text = generate_clinical_explanation(top_positive, top_negative, condition, risk_level)
+        if method == 'occlusion':
+            explanation_text += " (Approximate attribution; full SHAP analysis exceeded the time budget.)"
             
         return f"explain/{filename}", explanation_text, {'top_positive': [n for n,v in top_positive], 'top_negative': [n for n,v in top_negative]}
 
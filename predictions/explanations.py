@@ -0,0 +1,196 @@
+"""
+Per-prediction SHAP explanations, computed eagerly, lazily or in the background.
+
+``EXPLANATION_MODE`` selects when explanations are built:
+
+    eager   -- while the prediction is created (previous behaviour)
+    lazy    -- the first time a detail/review page needs them (default)
+    queued  -- on the background pool right after the prediction is saved
+
+Whatever the mode, ``ensure_explanations`` is the single entry point. It
+claims the work with a compare-and-set on ``explanation_status`` so that
+concurrent first viewers never compute the same explanation twice, and the
+result is memoized on the Prediction row.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+from .preprocessing import SPECS
+from .registry import get_background
+from .models import Prediction, PredictionFeature
+
+EAGER = "eager"
+LAZY = "lazy"
+QUEUED = "queued"
+
+DIABETES_FEATURES = SPECS['diabetes']['features']
+KIDNEY_FEATURES = SPECS['kidney']['features']
+
+# A claim older than this is assumed to belong to a crashed worker
+STALE_AFTER = timedelta(minutes=5)
+
+# How long a concurrent viewer waits for another request's computation
+WAIT_TIMEOUT = 5.0
+WAIT_INTERVAL = 0.25
+
+SKIP_RISKS = ["Insufficient Data", "Error"]
+
+
+def explanation_mode():
+    return getattr(settings, 'EXPLANATION_MODE', LAZY)
+
+
+def _stored_inputs(prediction, prefix, feature_names):
+    """Rebuild a model input vector from the saved PredictionFeature rows."""
+    values = {}
+    for feature in PredictionFeature.objects.filter(
+        prediction=prediction, feature_name__startswith=f"{prefix}_"
+    ):
+        values[feature.feature_name[len(prefix) + 1:]] = feature.feature_value
+
+    try:
+        return [float(values[name]) for name in feature_names]
+    except (KeyError, ValueError):
+        return None
+
+
+def compute_explanations(prediction):
+    """
+    Build SHAP plots and clinical explanations for ``prediction`` and save them.
+
+    The explanation text is appended to whatever summary the recommendation
+    engine already stored (e.g. "Risk: High.").
+    """
+    from .explainability import generate_patient_shap, generate_global_feature_importance
+    from .utils import load_models
+
+    started = time.perf_counter()
+    diabetes_model, diabetes_scaler, kidney_model, kidney_scaler = load_models()
+
+    jobs = [
+        ('diabetes', 'Diabetes', DIABETES_FEATURES, prediction.diabetes_risk,
+         diabetes_model, diabetes_scaler),
+        ('kidney', 'Kidney', KIDNEY_FEATURES, prediction.kidney_risk,
+         kidney_model, kidney_scaler),
+    ]
+    for model_name, prefix, feature_names, risk, model, scaler in jobs:
+        if not risk or risk in SKIP_RISKS:
+            continue
+        inputs = _stored_inputs(prediction, prefix, feature_names)
+        if inputs is None:
+            continue
+
+        try:
+            shap_path, explanation, _ = generate_patient_shap(
+                model, scaler, inputs, feature_names, prediction.id, model_name,
+                risk_level=risk, background_data=get_background(model_name)
+            )
+            summary = getattr(prediction, f"{model_name}_explanation") or ""
+            setattr(prediction, f"{model_name}_shap_image", shap_path)
+            setattr(prediction, f"{model_name}_fi_image",
+                    generate_global_feature_importance(model_name, feature_names))
+            setattr(prediction, f"{model_name}_explanation", f"{summary} {explanation}".strip())
+        except Exception as e:
+            print(f"Error {prefix} Explainability: {e}")
+
+    prediction.explanation_status = "Ready"
+    prediction.save(update_fields=[
+        'diabetes_shap_image', 'diabetes_fi_image', 'diabetes_explanation',
+        'kidney_shap_image', 'kidney_fi_image', 'kidney_explanation',
+        'explanation_status',
+    ])
+    metrics.incr('explanations.computed')
+    metrics.observe('explanations.compute_time', time.perf_counter() - started)
+
+
+def _claim(prediction_id):
+    """Compare-and-set Pending (or a stale Running claim) -> Running."""
+    now = timezone.now()
+    claimed = Prediction.objects.filter(id=prediction_id, explanation_status="Pending").update(
+        explanation_status="Running", explanation_started_at=now
+    )
+    if not claimed:
+        claimed = Prediction.objects.filter(
+            id=prediction_id, explanation_status="Running",
+            explanation_started_at__lt=now - STALE_AFTER,
+        ).update(explanation_started_at=now)
+    return bool(claimed)
+
+
+def ensure_explanations(prediction, viewed=False, wait=True):
+    """
+    Make sure ``prediction`` has its explanations, computing them at most once.
+
+    Args:
+        prediction: Prediction instance; refreshed in place when another
+            request or the background pool produced the result
+        viewed: Record that a user opened the explanation
+        wait: Block briefly while another request is computing
+
+    Returns:
+        Prediction: the same instance, up to date
+    """
+    if viewed and prediction.explanation_viewed_at is None:
+        now = timezone.now()
+        if Prediction.objects.filter(id=prediction.id, explanation_viewed_at__isnull=True).update(
+            explanation_viewed_at=now
+        ):
+            metrics.incr('explanations.viewed')
+        prediction.explanation_viewed_at = now
+
+    if prediction.explanation_status in ("Ready", "Failed"):
+        return prediction
+
+    if _claim(prediction.id):
+        prediction.refresh_from_db()
+        try:
+            compute_explanations(prediction)
+        except Exception as e:
+            print(f"Explanation generation failed for prediction {prediction.id}: {e}")
+            Prediction.objects.filter(id=prediction.id).update(explanation_status="Failed")
+            prediction.explanation_status = "Failed"
+            metrics.incr('explanations.failed')
+        return prediction
+
+    # Someone else holds the claim; give them a moment before rendering
+    metrics.incr('explanations.concurrent_waits')
+    deadline = time.monotonic() + (WAIT_TIMEOUT if wait else 0)
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        status = Prediction.objects.values_list('explanation_status', flat=True).get(id=prediction.id)
+        if status in ("Ready", "Failed"):
+            break
+    prediction.refresh_from_db()
+    return prediction
+
+
+def _ensure_by_id(prediction_id):
+    ensure_explanations(Prediction.objects.get(id=prediction_id), wait=False)
+
+
+def schedule_explanations(prediction):
+    """Apply EXPLANATION_MODE to a freshly created prediction."""
+    mode = explanation_mode()
+    if mode == EAGER:
+        ensure_explanations(prediction)
+    elif mode == QUEUED:
+        from .tasks import submit_on_commit
+        submit_on_commit(_ensure_by_id, prediction.id)
+
+
+def explanation_view_stats():
+    """How many generated explanations were ever opened by a user."""
+    qs = Prediction.objects.all()
+    total = qs.count()
+    ready = qs.filter(explanation_status="Ready").count()
+    viewed = qs.filter(explanation_viewed_at__isnull=False).count()
+    return {
+        'predictions': total,
+        'explanations_ready': ready,
+        'explanations_viewed': viewed,
+        'viewed_fraction': round(viewed / total, 4) if total else None,
+    }
@@ -0,0 +1,188 @@
+"""
+Global feature importance computed at training time.
+
+The importance vector is stored in the model bundle manifest, or next to
+the model pickle as ``<model_name>_global_fi.json`` keyed by the hash of
+the model file, so a retrained model never serves a stale importance chart.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+from .bundle import bundle_path, file_hash, is_current, read_manifest
+
+ML_DIR = Path(__file__).resolve().parent / "ml"
+
+MODEL_FILES = {
+    'diabetes': "diabetes_model.pkl",
+    'kidney': "kidney_model.pkl",
+}
+
+
+def model_hash(model_path):
+    """Return a short, stable content hash for a model artifact on disk."""
+    return file_hash(model_path)
+
+
+def importance_path(model_name, ml_dir=ML_DIR):
+    return Path(ml_dir) / f"{model_name}_global_fi.json"
+
+
+def stratified_sample(X, y, n_samples, random_state=42):
+    """
+    Draw a class-stratified sample of at most ``n_samples`` rows.
+
+    Falls back to a plain random sample when a class is too small to stratify.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    if len(X) <= n_samples:
+        return X
+
+    from sklearn.model_selection import train_test_split
+
+    try:
+        X_sample, _ = train_test_split(
+            X, train_size=n_samples, stratify=np.asarray(y), random_state=random_state
+        )
+    except ValueError:
+        rng = np.random.default_rng(random_state)
+        X_sample = X[rng.choice(len(X), size=n_samples, replace=False)]
+    return X_sample
+
+
+def _native_importance(model):
+    """Tree importances or absolute linear coefficients, if the model has them."""
+    try:
+        if hasattr(model, 'feature_importances_'):
+            return np.asarray(model.feature_importances_, dtype=np.float64), "native"
+    except Exception:
+        pass
+    try:
+        # coef_ raises on non-linear SVC kernels
+        if hasattr(model, 'coef_'):
+            coef = np.asarray(model.coef_, dtype=np.float64)
+            return np.abs(coef[0] if coef.ndim > 1 else coef), "coef"
+    except Exception:
+        pass
+    return None, None
+
+
+def _kernel_shap_chunk(model, background, X_chunk, nsamples):
+    import shap
+
+    fn = model.predict_proba if hasattr(model, 'predict_proba') else model.predict
+    explainer = shap.KernelExplainer(fn, background)
+    values = explainer.shap_values(X_chunk, nsamples=nsamples, silent=True)
+
+    if isinstance(values, list):
+        values = values[1]
+    elif values.ndim == 3:
+        values = values[:, :, 1]
+    return np.abs(values).sum(axis=0)
+
+
+def compute_global_importance(model, X, y, background_size=20, sample_size=200,
+                              nsamples="auto", n_jobs=-1, random_state=42):
+    """
+    Compute a global importance vector for ``model``.
+
+    Tree and linear models use their native importances. Any other model
+    (e.g. an RBF ``SVC``) falls back to mean |SHAP| from Kernel SHAP over a
+    stratified sample of the (scaled) training data, explained in parallel
+    chunks with joblib.
+
+    Args:
+        model: Fitted estimator
+        X: Scaled training features
+        y: Training labels, used for stratification
+        background_size: Rows in the Kernel SHAP background set
+        sample_size: Rows explained to estimate the global mean
+        nsamples: Kernel SHAP coalition budget per explained row
+        n_jobs: joblib worker count for the explained chunks
+
+    Returns:
+        tuple: (importance ndarray, method name)
+    """
+    importance, method = _native_importance(model)
+    if importance is not None:
+        return importance.flatten(), method
+
+    from joblib import Parallel, delayed, effective_n_jobs
+
+    background = stratified_sample(X, y, background_size, random_state=random_state)
+    X_sample = stratified_sample(X, y, sample_size, random_state=random_state + 1)
+
+    n_chunks = max(1, min(effective_n_jobs(n_jobs), len(X_sample)))
+    chunks = np.array_split(X_sample, n_chunks)
+
+    totals = Parallel(n_jobs=n_jobs)(
+        delayed(_kernel_shap_chunk)(model, background, chunk, nsamples) for chunk in chunks
+    )
+    importance = np.sum(totals, axis=0) / len(X_sample)
+    return np.asarray(importance, dtype=np.float64).flatten(), "kernel_shap"
+
+
+def save_global_importance(model_name, model_path, feature_names, importance, method,
+                           ml_dir=ML_DIR):
+    """Write the importance artifact for ``model_path`` and return its path."""
+    payload = {
+        'model_name': model_name,
+        'model_hash': model_hash(model_path),
+        'method': method,
+        'features': list(feature_names),
+        'importance': [float(v) for v in importance],
+    }
+    path = importance_path(model_name, ml_dir)
+    with open(path, "w") as fh:
+        json.dump(payload, fh, indent=2)
+    return path
+
+
+def build_global_importance(model_name, model, X, y, feature_names, model_path=None,
+                            ml_dir=ML_DIR, **kwargs):
+    """Training-time entry point: compute and store global importance."""
+    if model_path is None:
+        model_path = Path(ml_dir) / MODEL_FILES[model_name]
+    importance, method = compute_global_importance(model, X, y, **kwargs)
+    path = save_global_importance(model_name, model_path, feature_names, importance, method, ml_dir)
+    print(f"   [OK] Global importance ({method}) saved: {path}")
+    return path
+
+
+def load_global_importance(model_name, ml_dir=ML_DIR):
+    """
+    Load the stored importance for the currently deployed model.
+
+    A current model bundle carries its own importance in the manifest and
+    is keyed by the bundle version. Otherwise the JSON artifact is used.
+
+    Returns None when the artifact is missing or was computed for a different
+    model file than the one on disk.
+    """
+    path = importance_path(model_name, ml_dir)
+    model_path = Path(ml_dir) / MODEL_FILES[model_name]
+
+    bundle_file = bundle_path(model_name, ml_dir)
+    if bundle_file.exists():
+        manifest = read_manifest(bundle_file)
+        if is_current(manifest, model_path) and manifest.get('importance') is not None:
+            return {
+                'model_name': model_name,
+                'model_hash': manifest['version'],
+                'method': manifest.get('importance_method'),
+                'features': manifest['features'],
+                'importance': manifest['importance'],
+            }
+    if not path.exists() or not model_path.exists():
+        return None
+
+    try:
+        with open(path) as fh:
+            payload = json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+    if payload.get('model_hash') != model_hash(model_path):
+        return None
+    return payload
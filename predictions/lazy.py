@@ -0,0 +1,61 @@
+"""
+Deferred imports for heavy scientific modules.
+
+``numpy``, ``joblib``, ``matplotlib`` and ``shap`` (which pulls in numba)
+add seconds to worker boot, ``manage.py`` commands and test runs that never
+score or explain anything. Modules bind them through ``lazy_import`` and the
+real import happens on first attribute access.
+"""
+import importlib
+import threading
+
+
+class LazyModule:
+    """Proxy that imports the named module the first time it is used."""
+
+    def __init__(self, name, before=None):
+        self._name = name
+        self._before = before
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    if self._before is not None:
+                        self._before()
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name, before=None):
+    """
+    Return a proxy for module ``name``.
+
+    Args:
+        name: Dotted module path
+        before: Optional callable run once right before the import
+            (e.g. selecting the matplotlib backend)
+    """
+    return LazyModule(name, before=before)
+
+
+def ensure_loaded(*modules):
+    """Import lazily bound modules now (used by the optional warm-up)."""
+    for module in modules:
+        if isinstance(module, LazyModule):
+            module._load()
+
+
+def use_agg_backend():
+    """Force the non-interactive backend before pyplot is imported."""
+    import matplotlib
+    matplotlib.use('Agg')
@@ -0,0 +1,65 @@
+"""
+Fill the lab-observation table from stored predictions. Examples:
+
+    python manage.py backfill_observations
+    python manage.py backfill_observations --batch-size 5000
+
+Predictions are read in id order in batches with their saved features
+prefetched and their observations (see predictions.observations) inserted
+with one ``bulk_create`` per batch. Observations that already exist are
+kept, so the command can be rerun or interrupted at any point.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+
+from predictions import observations
+from predictions.models import LabObservation, Prediction, PredictionFeature
+
+# Rows per INSERT statement
+WRITE_CHUNK = 1000
+
+
+class Command(BaseCommand):
+    help = "Create LabObservation rows for stored predictions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000,
+                            help="Predictions per batch (default 2000)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        seen = written = 0
+        features = Prefetch(
+            "features",
+            queryset=PredictionFeature.objects.filter(feature_name__in=list(observations.LABS))
+            .only("prediction_id", "feature_name", "feature_value"),
+        )
+        queryset = (
+            Prediction.objects.only("id", "patient_id", "created_at", "egfr")
+            .prefetch_related(features)
+            .order_by("id")
+        )
+        last_id = 0
+        while True:
+            predictions = list(queryset.filter(id__gt=last_id)[:options["batch_size"]])
+            if not predictions:
+                break
+            last_id = predictions[-1].id
+            rows = []
+            for prediction in predictions:
+                saved = {f.feature_name: f.feature_value for f in prediction.features.all()}
+                rows.extend(observations.observations_for(prediction, saved))
+            with transaction.atomic():
+                LabObservation.objects.bulk_create(rows, batch_size=WRITE_CHUNK, ignore_conflicts=True)
+            seen += len(predictions)
+            written += len(rows)
+            self.stdout.write(f"   up to #{last_id}: {seen} predictions, {written} observations")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{seen} predictions in {time.perf_counter() - started:.1f}s: "
+            f"{written} observations written or already present; "
+            f"{LabObservation.objects.count()} in the table"
+        ))
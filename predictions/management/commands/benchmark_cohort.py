@@ -0,0 +1,166 @@
+"""
+Time cohort searches over a synthetic lab-observation table. Example:
+
+    python manage.py benchmark_cohort --observations 10000000
+
+Synthetic patients and observations (every lab at each visit, values drawn
+around typical ranges, seeded) are inserted into the real tables inside a
+transaction that is rolled back at the end, so the database is left as it
+was. The foreign keys to users and predictions point nowhere; they are
+deferred constraints and never checked because nothing is committed.
+
+Each query runs through ``predictions.observations.cohort`` and, as the
+baseline, as the Python scan it replaces (read every reading of the
+queried labs, keep each patient's latest, filter). Both must find the same
+patients. The synthetic predictions do not exist, so the queries pass
+``approved=False``. The SQL plan is printed so index use can be checked.
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from accounts.models import Patient
+from predictions import observations
+from predictions.lazy import lazy_import
+from predictions.models import LabObservation
+
+np = lazy_import("numpy")
+
+# Synthetic ids start here so they cannot collide with real rows
+ID_OFFSET = 10 ** 9
+INSERT_CHUNK = 100_000
+
+# Feature -> (mean, standard deviation, lower bound) of the synthetic values
+DISTRIBUTIONS = {
+    'glucose': (130, 45, 40),
+    'bmi': (28, 6, 14),
+    'bp_diastolic': (80, 12, 40),
+    'creatinine': (1.4, 1.2, 0.3),
+    'egfr': (70, 30, 3),
+    'potassium': (4.5, 0.6, 2.5),
+    'sodium': (139, 4, 120),
+    'hemoglobin': (13, 2, 6),
+    'urea': (35, 25, 5),
+    'albumin': (0.8, 1.2, 0),
+}
+
+QUERIES = [
+    "creatinine > 2.0 and glucose > 180",
+    "egfr < 30",
+    "potassium >= 5.5 and sodium < 135 and bmi > 35",
+]
+
+
+def best_of(repeat, func):
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def python_scan(conditions):
+    """The pre-index way: every reading of the queried labs, filtered in Python."""
+    features = {c.feature for c in conditions}
+    latest = {}
+    rows = (
+        LabObservation.objects.filter(feature__in=features)
+        .values_list("patient_id", "feature", "value", "observed_at", "id")
+        .iterator(chunk_size=20_000)
+    )
+    for patient_id, feature, value, observed_at, pk in rows:
+        key = (patient_id, feature)
+        current = latest.get(key)
+        if current is None or (observed_at, pk) > current[0]:
+            latest[key] = ((observed_at, pk), value)
+    compare = {'>': float.__gt__, '>=': float.__ge__, '<': float.__lt__, '<=': float.__le__, '=': float.__eq__}
+    matches = None
+    for condition in conditions:
+        found = {
+            patient_id for (patient_id, feature), (_, value) in latest.items()
+            if feature == condition.feature and compare[condition.op](value, condition.value)
+        }
+        matches = found if matches is None else matches & found
+    return matches
+
+
+class Command(BaseCommand):
+    help = "Benchmark indexed cohort queries against a Python scan on synthetic observations"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--observations", type=int, default=1_000_000,
+                            help="Synthetic observations to insert (default 1000000)")
+        parser.add_argument("--visits", type=int, default=10, help="Visits per synthetic patient (default 10)")
+        parser.add_argument("--repeat", type=int, default=3, help="Best of this many runs (default 3)")
+        parser.add_argument("--no-baseline", action="store_true", help="Skip the Python scan")
+
+    def handle(self, *args, **options):
+        per_patient = options["visits"] * len(DISTRIBUTIONS)
+        n_patients = max(1, options["observations"] // per_patient)
+        if LabObservation.objects.filter(patient_id__gte=ID_OFFSET).exists():
+            raise CommandError("Synthetic rows already present; is another benchmark running?")
+
+        with transaction.atomic():
+            self.populate(n_patients, options["visits"])
+            for query in QUERIES:
+                self.run_query(query, options)
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("Rolled back; the database is unchanged"))
+
+    def populate(self, n_patients, visits):
+        started = time.perf_counter()
+        rng = np.random.default_rng(0)
+        Patient.objects.bulk_create(
+            [Patient(id=ID_OFFSET + i, user_id=ID_OFFSET + i, gender="Female") for i in range(n_patients)],
+            batch_size=5000,
+        )
+
+        # One visit per (patient, visit number), a few weeks apart
+        patient_ids = np.repeat(np.arange(n_patients) + ID_OFFSET, visits)
+        n_visits = len(patient_ids)
+        prediction_ids = np.arange(n_visits) + ID_OFFSET
+        now = time.time()
+        visit_number = np.tile(np.arange(visits), n_patients)
+        seconds = now - (visits - visit_number) * 86400 * 30 + rng.integers(0, 86400 * 20, n_visits)
+        adapt = connection.ops.adapt_datetimefield_value
+        observed = [adapt(datetime.fromtimestamp(s, tz=dt_timezone.utc)) for s in seconds.tolist()]
+
+        table = LabObservation._meta.db_table
+        sql = (f"INSERT INTO {table} (patient_id, prediction_id, feature, value, observed_at) "
+               f"VALUES (%s, %s, %s, %s, %s)")
+        written = 0
+        with connection.cursor() as cursor:
+            for feature, (mean, std, low) in DISTRIBUTIONS.items():
+                values = np.round(np.maximum(rng.normal(mean, std, n_visits), low), 2)
+                rows = zip(patient_ids.tolist(), prediction_ids.tolist(), [feature] * n_visits,
+                           values.tolist(), observed)
+                while True:
+                    chunk = [row for _, row in zip(range(INSERT_CHUNK), rows)]
+                    if not chunk:
+                        break
+                    cursor.executemany(sql, chunk)
+                    written += len(chunk)
+            cursor.execute("ANALYZE")
+        self.stdout.write(
+            f"Inserted {written} observations for {n_patients} patients "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+    def run_query(self, query, options):
+        conditions = observations.parse(query)
+        patients = observations.cohort(conditions, approved=False).filter(id__gte=ID_OFFSET)
+        sql_seconds, found = best_of(options["repeat"], lambda: set(patients.values_list("id", flat=True)))
+        self.stdout.write(f"\n{query}: {len(found)} patients")
+        self.stdout.write(f"   indexed SQL   {sql_seconds * 1000:>10.1f} ms")
+        if not options["no_baseline"]:
+            scan_seconds, scanned = best_of(1, lambda: python_scan(conditions))
+            scanned = {pk for pk in scanned if pk >= ID_OFFSET}
+            if scanned != found:
+                raise CommandError(f"Results differ: {len(scanned)} by scan, {len(found)} by SQL")
+            self.stdout.write(
+                f"   Python scan   {scan_seconds * 1000:>10.1f} ms ({scan_seconds / sql_seconds:.0f}x slower)"
+            )
+        self.stdout.write("   plan: " + patients.values("id").explain().replace("\n", "\n         "))
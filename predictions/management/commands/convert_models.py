@@ -0,0 +1,87 @@
+"""
+Convert the deployed ``.pkl`` model/scaler pairs into model bundles.
+
+Each converted bundle is checked against the pickle it came from (identical
+predict_proba on the training CSV) before it is kept, and load times are
+reported for both formats. Models with no array representation (SVC, KNN)
+are left on the pickle. Example:
+
+    python manage.py convert_models
+    python manage.py convert_models kidney
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from predictions import registry
+from predictions.bundle import bundle_path, build_bundle, load_bundle
+from predictions.preprocessing import SPECS, Preprocessor, load_frame
+
+
+def _timed(fn, repeat=5):
+    """Best wall time of ``repeat`` calls, in milliseconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = "Convert the pickled models into versioned, memory-mappable bundles"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models", nargs="*",
+            help=f"Models to convert: {', '.join(registry.MODEL_FILES)} (default: all)",
+        )
+
+    def handle(self, *args, **options):
+        import joblib
+        import numpy as np
+
+        names = options["models"] or list(registry.MODEL_FILES)
+        for model_name in names:
+            if model_name not in registry.MODEL_FILES:
+                raise CommandError(f"Unknown model {model_name!r}")
+            model_path = registry.ml_dir() / registry.MODEL_FILES[model_name]
+            scaler_path = registry.ml_dir() / registry.SCALER_FILES[model_name]
+            if not model_path.exists() or not scaler_path.exists():
+                raise CommandError(f"Missing pickles for {model_name}")
+
+            self.stdout.write(f"{model_name}:")
+            model = joblib.load(model_path)
+            scaler = joblib.load(scaler_path)
+            X_raw, _ = load_frame(model_name, registry.ml_dir())
+            if not isinstance(scaler, Preprocessor):
+                # Older scalers: keep their centre/scale, learn the imputation medians
+                scaler = Preprocessor.from_scaler(model_name, scaler).fit_impute(X_raw)
+            features = list(scaler.feature_names_in_)
+
+            version = build_bundle(
+                model_name, model, scaler, features,
+                background=registry._build_background(model_name, scaler),
+                model_path=model_path,
+                training_data_path=registry.ml_dir() / SPECS[model_name]['csv'],
+                ml_dir=registry.ml_dir(),
+                extra={'converted_from': model_path.name},
+            )
+            if version is None:
+                continue
+
+            path = bundle_path(model_name, registry.ml_dir())
+            bundle = load_bundle(path)
+            X = scaler.transform(X_raw)
+            diff = np.abs(bundle.model.predict_proba(X) - model.predict_proba(X)).max()
+            if diff > 1e-9:
+                path.unlink()
+                raise CommandError(f"{model_name}: bundle disagrees with the pickle (max diff {diff:.3g})")
+
+            pickle_ms = _timed(lambda: (joblib.load(model_path), joblib.load(scaler_path)))
+            bundle_ms = _timed(lambda: load_bundle(path))
+            self.stdout.write(
+                f"   joblib.load {pickle_ms:.1f} ms, bundle {bundle_ms:.1f} ms "
+                f"({pickle_ms / bundle_ms:.0f}x faster)"
+            )
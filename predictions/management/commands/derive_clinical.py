@@ -0,0 +1,133 @@
+"""
+Derive clinical metrics for every stored prediction in one pass. Examples:
+
+    python manage.py derive_clinical
+    python manage.py derive_clinical --dry-run --batch-size 20000
+
+Predictions are read in id order in batches with their saved features
+prefetched, and each batch is derived with NumPy over whole arrays (see
+recommendations.clinical): eGFR and CKD stage, which are written back to
+``Prediction.egfr`` / ``Prediction.ckd_stage`` where they changed, and the
+BMI category, blood pressure stage and glucose band, which are counted for
+the cohort summary printed at the end. New predictions get their eGFR from
+``create_prediction``; run this once after upgrading, and after changing
+the eGFR derivation.
+"""
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+
+from predictions.lazy import lazy_import
+from predictions.models import Prediction, PredictionFeature
+from recommendations import batch, clinical
+
+np = lazy_import("numpy")
+
+# Rows per bulk_update statement
+WRITE_CHUNK = 500
+
+# Saved features read per prediction: {array name: (feature names, first found wins)}
+INPUTS = {
+    'creatinine': ("Kidney_Creatinine",),
+    'age': ("Diabetes_Age",),
+    'bmi': ("Diabetes_BMI",),
+    'diastolic': ("Diabetes_BloodPressure", "Kidney_Blood Pressure"),
+    'glucose': ("Diabetes_Glucose",),
+}
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def cohort_arrays(predictions):
+    """
+    Input arrays of a batch of predictions, NaN where a value was not saved.
+
+    The age falls back to the patient's, then 50, as in the engine.
+    """
+    columns = {name: [] for name in INPUTS}
+    genders = []
+    for prediction in predictions:
+        saved = {f.feature_name: f.feature_value for f in prediction.features.all()}
+        for name, feature_names in INPUTS.items():
+            value = next((saved[f] for f in feature_names if f in saved), None)
+            if name == 'age' and value is None:
+                value = prediction.patient.age or 50
+            columns[name].append(_float(value))
+        genders.append(prediction.patient.gender)
+    arrays = {name: np.asarray(values, dtype=float) for name, values in columns.items()}
+    arrays['gender'] = np.asarray(genders, dtype=object)
+    return arrays
+
+
+class Command(BaseCommand):
+    help = "Compute eGFR/CKD stage (stored) and other derived metrics for all predictions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000,
+                            help="Predictions per batch (default 5000)")
+        parser.add_argument("--dry-run", action="store_true", help="Report without saving")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        seen = changed = 0
+        counts = {name: Counter() for name in ("ckd_stage", "bmi_category", "bp_stage", "glucose_band")}
+
+        for predictions in self.batches(options["batch_size"]):
+            arrays = cohort_arrays(predictions)
+            egfr, stage = batch.egfr_fields(arrays['creatinine'], arrays['age'], arrays['gender'])
+            derived = {
+                'ckd_stage': stage,
+                'bmi_category': clinical.bmi_category(arrays['bmi']),
+                'bp_stage': clinical.bp_stage(arrays['diastolic']),
+                'glucose_band': clinical.glucose_band(arrays['glucose']),
+            }
+            for name, values in derived.items():
+                counts[name].update(values.tolist())
+
+            updates = []
+            for prediction, value, stage_value in zip(predictions, egfr.tolist(), stage.tolist()):
+                value = None if np.isnan(value) else value
+                if (prediction.egfr, prediction.ckd_stage) != (value, stage_value):
+                    prediction.egfr, prediction.ckd_stage = value, stage_value
+                    updates.append(prediction)
+            seen += len(predictions)
+            changed += len(updates)
+            if updates and not options["dry_run"]:
+                with transaction.atomic():
+                    Prediction.objects.bulk_update(updates, ["egfr", "ckd_stage"], batch_size=WRITE_CHUNK)
+
+        elapsed = time.perf_counter() - started
+        for name, counter in counts.items():
+            summary = ", ".join(f"{band or 'n/a'} {count}" for band, count in sorted(counter.items()))
+            self.stdout.write(f"   {name:<13} {summary}")
+        verb = "would change" if options["dry_run"] else "updated"
+        self.stdout.write(self.style.SUCCESS(
+            f"{seen} predictions in {elapsed:.1f}s: eGFR {verb} for {changed}"
+        ))
+
+    def batches(self, batch_size):
+        """Yield lists of predictions in id order (keyset pagination)."""
+        features = Prefetch(
+            "features", queryset=PredictionFeature.objects.only("prediction_id", "feature_name", "feature_value")
+        )
+        queryset = (
+            Prediction.objects.select_related("patient")
+            .only("id", "egfr", "ckd_stage", "patient__age", "patient__gender")
+            .prefetch_related(features)
+            .order_by("id")
+        )
+        last_id = 0
+        while True:
+            predictions = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not predictions:
+                return
+            last_id = predictions[-1].id
+            yield predictions
@@ -0,0 +1,102 @@
+"""
+Per-process memory report for WSGI/ASGI workers (Linux only).
+
+Reads /proc/<pid>/smaps_rollup and shows, for every process, the memory it
+owns alone (unique / USS), the memory it shares with other processes (e.g.
+model pages inherited from a preloading master) and its proportional share
+(PSS). Example:
+
+    python manage.py memory_report --master <gunicorn master pid>
+"""
+import os
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Swap")
+
+
+def read_rollup(pid):
+    """Return the smaps_rollup counters (in kB) for ``pid``."""
+    path = Path(f"/proc/{pid}/smaps_rollup")
+    values = dict.fromkeys(FIELDS, 0)
+    with open(path) as fh:
+        for line in fh:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].rstrip(":") in values:
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return values
+
+
+def children_of(pid):
+    """Direct child PIDs of ``pid`` (the worker processes of a master)."""
+    children = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        try:
+            children.extend(int(c) for c in (task / "children").read_text().split())
+        except OSError:
+            continue
+    return children
+
+
+def process_name(pid):
+    try:
+        return Path(f"/proc/{pid}/cmdline").read_text().replace("\0", " ").strip()[:60]
+    except OSError:
+        return "?"
+
+
+class Command(BaseCommand):
+    help = "Show unique and shared RSS per worker process"
+
+    def add_arguments(self, parser):
+        parser.add_argument("pids", nargs="*", type=int, help="Process ids to report")
+        parser.add_argument("--master", type=int, help="Report this process and all its children")
+        parser.add_argument(
+            "--preload", action="store_true",
+            help="Preload the model registry in this process and report on it",
+        )
+
+    def handle(self, *args, **options):
+        if not Path("/proc/self/smaps_rollup").exists():
+            raise CommandError("memory_report needs /proc/<pid>/smaps_rollup (Linux 4.14+)")
+
+        pids = list(options["pids"])
+        if options["master"]:
+            pids = [options["master"]] + children_of(options["master"]) + pids
+        if options["preload"]:
+            from predictions.registry import preload
+            preload()
+            pids.append(os.getpid())
+        if not pids:
+            raise CommandError("Give one or more PIDs, --master PID or --preload")
+
+        header = f"{'PID':>8} {'RSS MB':>9} {'PSS MB':>9} {'Unique MB':>10} {'Shared MB':>10}  Command"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+
+        totals = dict.fromkeys(("Rss", "Pss", "unique"), 0)
+        for pid in pids:
+            try:
+                r = read_rollup(pid)
+            except OSError as e:
+                self.stderr.write(f"{pid:>8} unreadable: {e}")
+                continue
+            unique = r["Private_Clean"] + r["Private_Dirty"]
+            shared = r["Shared_Clean"] + r["Shared_Dirty"]
+            totals["Rss"] += r["Rss"]
+            totals["Pss"] += r["Pss"]
+            totals["unique"] += unique
+            self.stdout.write(
+                f"{pid:>8} {r['Rss'] / 1024:>9.1f} {r['Pss'] / 1024:>9.1f} "
+                f"{unique / 1024:>10.1f} {shared / 1024:>10.1f}  {process_name(pid)}"
+            )
+
+        self.stdout.write("-" * len(header))
+        self.stdout.write(
+            f"{'total':>8} {totals['Rss'] / 1024:>9.1f} {totals['Pss'] / 1024:>9.1f} "
+            f"{totals['unique'] / 1024:>10.1f}"
+        )
+        self.stdout.write(
+            "PSS total is the real footprint; RSS total double-counts shared pages."
+        )
@@ -0,0 +1,50 @@
+"""
+Recompute every patient's summary row. Examples:
+
+    python manage.py rebuild_patient_state
+    python manage.py rebuild_patient_state --batch-size 5000
+
+Patients are read in id order in batches; each batch is computed with a
+fixed number of aggregate queries (see predictions.patient_state) and
+written with one upsert. Views keep the rows current on every write, so
+this is needed once after upgrading and after bulk changes to predictions
+made outside the views (``derive_clinical``, ``backfill_observations``,
+imports). Rows of patients with no view traffic are otherwise created on
+first read.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import Patient
+from predictions import patient_state
+from predictions.models import PatientState
+
+
+class Command(BaseCommand):
+    help = "Recompute PatientState rows from the predictions table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000,
+                            help="Patients per batch (default 2000)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        seen = 0
+        queryset = Patient.objects.order_by("id").values_list("id", flat=True)
+        last_id = 0
+        while True:
+            patient_ids = list(queryset.filter(id__gt=last_id)[:options["batch_size"]])
+            if not patient_ids:
+                break
+            last_id = patient_ids[-1]
+            with transaction.atomic():
+                patient_state.save(patient_state.compute(patient_ids))
+            seen += len(patient_ids)
+            self.stdout.write(f"   up to #{last_id}: {seen} patients")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{seen} patients in {time.perf_counter() - started:.1f}s; "
+            f"{PatientState.objects.count()} state rows"
+        ))
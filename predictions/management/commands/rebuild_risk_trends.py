@@ -0,0 +1,84 @@
+"""
+Recompute every patient's risk trends from the approved history. Examples:
+
+    python manage.py rebuild_risk_trends
+    python manage.py rebuild_risk_trends --dry-run
+
+Approved predictions are streamed once, ordered by patient and creation
+time, with only the fields the statistics need; each patient's values are
+folded with predictions.trends.fold as they arrive, so memory holds one
+patient's trends and one write chunk, whatever the size of the history.
+Rows are replaced in chunks, and trends of patients left with no approved
+predictions are removed. Run after upgrading, or after predictions were
+changed outside the review pages and the admin, which keep trends current.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from predictions import trends
+from predictions.models import Prediction, RiskTrend
+
+# Trends per write
+WRITE_CHUNK = 1000
+# Rows per fetch from the database cursor
+READ_CHUNK = 5000
+
+
+class Command(BaseCommand):
+    help = "Rebuild RiskTrend rows from approved predictions in one streaming pass"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Compute without saving")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        fields = list(trends.DISEASES.values())
+        rows = (
+            Prediction.objects.filter(approval_status="Approved")
+            .order_by("patient_id", "created_at", "id")
+            .values_list("patient_id", "created_at", *fields)
+            .iterator(chunk_size=READ_CHUNK)
+        )
+
+        seen = written = 0
+        current_patient, current, pending = None, {}, []
+        for patient_id, created_at, *values in rows:
+            if patient_id != current_patient:
+                pending.extend(current.values())
+                current_patient, current = patient_id, {}
+                if len(pending) >= WRITE_CHUNK:
+                    written += self.write(pending, options["dry_run"])
+                    pending = []
+            for disease, value in zip(trends.DISEASES, values):
+                if value is None:
+                    continue
+                if disease not in current:
+                    current[disease] = RiskTrend(patient_id=patient_id, disease=disease)
+                trends.fold(current[disease], value, created_at)
+            seen += 1
+        pending.extend(current.values())
+        written += self.write(pending, options["dry_run"])
+
+        if not options["dry_run"]:
+            stale = RiskTrend.objects.exclude(
+                patient_id__in=Prediction.objects.filter(approval_status="Approved").values("patient_id")
+            ).delete()[0]
+        else:
+            stale = 0
+        verb = "would write" if options["dry_run"] else "wrote"
+        self.stdout.write(self.style.SUCCESS(
+            f"{seen} approved predictions in {time.perf_counter() - started:.1f}s: "
+            f"{verb} {written} trends, removed {stale} stale"
+        ))
+
+    def write(self, batch, dry_run):
+        """Insert or overwrite a chunk of trends."""
+        if batch and not dry_run:
+            with transaction.atomic():
+                RiskTrend.objects.bulk_create(
+                    batch, update_conflicts=True, unique_fields=["patient", "disease"],
+                    update_fields=[*trends.STATS, "updated_at"],
+                )
+        return len(batch)
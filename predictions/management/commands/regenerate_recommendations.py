@@ -0,0 +1,221 @@
+"""
+Regenerate stored recommendation data with the current engine. Examples:
+
+    python manage.py regenerate_recommendations --dry-run
+    python manage.py regenerate_recommendations --stale
+    python manage.py regenerate_recommendations --since 2025-01-01 --kidney-risk High
+    python manage.py regenerate_recommendations --model-version kidney-3b893506641a --jobs 4
+    python manage.py regenerate_recommendations --include-reviewed --discard-edits
+
+Predictions are read in id order in batches, with their patient joined
+(``select_related``) and their saved features prefetched, so reading a
+batch costs two queries however large it is. Recommendation data is built
+from plain rows (see recommendations.batch), optionally in a process pool,
+and the changed rows are written back with ``bulk_update`` in one
+transaction per batch. Writing the data clears ``recommendation_text``, so
+stored legacy HTML gives way to the rendered data. A related
+Recommendation row, if any, is updated to the rendered HTML.
+
+Only a change in the engine's decisions needs a run: wording and layout
+live in recommendations.rendering and its template, which apply to stored
+data without a backfill. Stored data records the rule-set version it was
+built with, and ``--stale`` selects the predictions built under another
+one (or never built as data).
+
+Predictions a doctor has already reviewed are skipped unless
+``--include-reviewed`` is given. Even then, reviewed predictions with a
+stored ``recommendation_text`` (the text the doctor edited and approved)
+are kept unless ``--discard-edits`` is also given. ``--dry-run`` writes
+nothing and prints a unified diff of the first changed predictions
+instead.
+"""
+import difflib
+import json
+import time
+from collections import deque
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Prefetch, Q
+
+from predictions.models import Prediction, PredictionFeature
+from recommendations import batch
+from recommendations.engine import RULES_VERSION
+from recommendations.models import Recommendation
+from recommendations.rendering import render_recommendation
+
+# Rows per bulk_update statement
+WRITE_CHUNK = 500
+
+
+def _dump(data):
+    """Recommendation data as diffable lines: one per section and per metric."""
+    if data is None:
+        return ""
+    rows = data.get('sections', []) + data.get('metrics', [])
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r} (expected YYYY-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = "Regenerate Prediction.recommendation_data in batches with the current engine"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", type=_date, help="Only predictions created on or after this date")
+        parser.add_argument("--until", type=_date, help="Only predictions created on or before this date")
+        parser.add_argument("--diabetes-risk", help="Only predictions with this diabetes risk level")
+        parser.add_argument("--kidney-risk", help="Only predictions with this kidney risk level")
+        parser.add_argument("--model-version",
+                            help="Only predictions scored with this diabetes or kidney model version")
+        parser.add_argument("--stale", action="store_true",
+                            help="Only predictions not built with the current rule-set version")
+        parser.add_argument("--include-reviewed", action="store_true",
+                            help="Also overwrite recommendations of predictions a doctor has reviewed")
+        parser.add_argument("--discard-edits", action="store_true",
+                            help="With --include-reviewed, also replace text doctors edited and approved")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Predictions per batch (default 1000)")
+        parser.add_argument("--jobs", type=int, default=1,
+                            help="Build batches in a pool of this many processes (default 1: in process)")
+        parser.add_argument("--dry-run", action="store_true", help="Report the changes without saving them")
+        parser.add_argument("--show", type=int, default=3,
+                            help="Changed predictions to print as a diff in --dry-run mode (default 3)")
+
+    def handle(self, *args, **options):
+        if options["discard_edits"] and not options["include_reviewed"]:
+            raise CommandError("--discard-edits only applies with --include-reviewed")
+        queryset = self.filtered(options)
+        started = time.perf_counter()
+        totals = {'seen': 0, 'changed': 0, 'skipped': 0, 'shown': 0}
+
+        if options["jobs"] > 1:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            pool = ProcessPoolExecutor(
+                max_workers=options["jobs"], mp_context=multiprocessing.get_context("spawn")
+            )
+            # Results are written in submission order with a bounded number
+            # of batches in flight
+            pending = deque()
+            with pool:
+                for stored, rows in self.batches(queryset, options["batch_size"]):
+                    pending.append((stored, pool.submit(batch.build, rows)))
+                    if len(pending) >= 2 * options["jobs"]:
+                        stored, future = pending.popleft()
+                        self.write_batch(stored, future.result(), totals, options)
+                while pending:
+                    stored, future = pending.popleft()
+                    self.write_batch(stored, future.result(), totals, options)
+        else:
+            for stored, rows in self.batches(queryset, options["batch_size"]):
+                self.write_batch(stored, batch.build(rows), totals, options)
+
+        elapsed = time.perf_counter() - started
+        verb = "would change" if options["dry_run"] else "updated"
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['seen']} predictions in {elapsed:.1f}s "
+            f"({totals['seen'] / elapsed if elapsed else 0:.0f}/s): {verb} {totals['changed']}, "
+            f"skipped {totals['skipped']} (no saved inputs or engine error)"
+        ))
+
+    def filtered(self, options):
+        queryset = Prediction.objects.all()
+        if options["since"]:
+            queryset = queryset.filter(created_at__date__gte=options["since"])
+        if options["until"]:
+            queryset = queryset.filter(created_at__date__lte=options["until"])
+        if options["diabetes_risk"]:
+            queryset = queryset.filter(diabetes_risk=options["diabetes_risk"])
+        if options["kidney_risk"]:
+            queryset = queryset.filter(kidney_risk=options["kidney_risk"])
+        if options["model_version"]:
+            version = options["model_version"]
+            queryset = queryset.filter(Q(diabetes_model_version=version) | Q(kidney_model_version=version))
+        if options["stale"]:
+            queryset = queryset.exclude(recommendation_data__rules=RULES_VERSION)
+        if not options["include_reviewed"]:
+            queryset = queryset.filter(reviewed_at__isnull=True)
+        elif not options["discard_edits"]:
+            # A reviewed prediction's stored text is what the doctor approved
+            queryset = queryset.filter(
+                Q(reviewed_at__isnull=True) | Q(recommendation_text__isnull=True) | Q(recommendation_text="")
+            )
+        return queryset
+
+    def batches(self, queryset, batch_size):
+        """
+        Yield ({id: (stored data, stored text)}, build rows) per batch, in id order.
+
+        Keyset pagination on the primary key keeps every batch query cheap
+        however far into the table it is.
+        """
+        features = Prefetch(
+            "features", queryset=PredictionFeature.objects.only("prediction_id", "feature_name", "feature_value")
+        )
+        queryset = (
+            queryset.select_related("patient")
+            .only("id", "diabetes_risk", "kidney_risk", "recommendation_data", "recommendation_text",
+                  "patient__age", "patient__gender")
+            .prefetch_related(features)
+            .order_by("id")
+        )
+        last_id = 0
+        while True:
+            predictions = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not predictions:
+                return
+            last_id = predictions[-1].id
+            stored = {p.id: (p.recommendation_data, p.recommendation_text) for p in predictions}
+            rows = [
+                (p.id, p.diabetes_risk, p.kidney_risk, p.patient.age, p.patient.gender,
+                 {f.feature_name: f.feature_value for f in p.features.all()})
+                for p in predictions
+            ]
+            yield stored, rows
+
+    def write_batch(self, stored, built, totals, options):
+        totals['seen'] += len(built)
+        changed = {}
+        for prediction_id, data in built:
+            stored_data, stored_text = stored[prediction_id]
+            if data is None:
+                totals['skipped'] += 1
+            elif data != stored_data or stored_text:
+                changed[prediction_id] = data
+        totals['changed'] += len(changed)
+
+        if options["dry_run"]:
+            for prediction_id, data in changed.items():
+                if totals['shown'] >= options["show"]:
+                    break
+                totals['shown'] += 1
+                stored_data, stored_text = stored[prediction_id]
+                before = stored_text if stored_text else _dump(stored_data)
+                self.stdout.write("".join(difflib.unified_diff(
+                    before.splitlines(keepends=True),
+                    _dump(data).splitlines(keepends=True),
+                    fromfile=f"prediction {prediction_id} (stored)",
+                    tofile=f"prediction {prediction_id} (regenerated)",
+                )))
+            return
+
+        if not changed:
+            return
+        with transaction.atomic():
+            Prediction.objects.bulk_update(
+                [Prediction(id=pk, recommendation_data=data, recommendation_text=None) for pk, data in changed.items()],
+                ["recommendation_data", "recommendation_text"], batch_size=WRITE_CHUNK,
+            )
+            recommendations = list(Recommendation.objects.filter(prediction_id__in=changed).only("id", "prediction_id"))
+            for recommendation in recommendations:
+                recommendation.text = render_recommendation(changed[recommendation.prediction_id])
+            Recommendation.objects.bulk_update(recommendations, ["text"], batch_size=WRITE_CHUNK)
+        self.stdout.write(f"   up to #{max(stored)}: {totals['seen']} seen, {totals['changed']} updated")
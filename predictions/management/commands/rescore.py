@@ -0,0 +1,187 @@
+"""
+Re-score stored predictions with the deployed model versions. Examples:
+
+    python manage.py rescore
+    python manage.py rescore kidney --batch-size 50000 --jobs 4
+    python manage.py rescore diabetes --restart
+
+Stored features are streamed in prediction-id order with
+``.iterator(chunk_size=...)``, assembled into feature matrices and scored in
+vectorized batches (optionally in a process pool). Results go to
+PredictionScore, one row per (prediction, model version), written as bulk
+upserts; the original Prediction rows are not touched.
+Progress is checkpointed after every batch in RescoreCheckpoint, so an
+interrupted run resumes where it stopped.
+"""
+import time
+from collections import deque
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from predictions import registry, scoring
+from predictions.models import Prediction, PredictionFeature, PredictionScore, RescoreCheckpoint
+
+# Predictions per write query (bounded IN lists and bulk statements)
+WRITE_CHUNK = 500
+
+
+class Command(BaseCommand):
+    help = "Backfill PredictionScore for the stored predictions with the deployed model versions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models", nargs="*",
+            help=f"Models to re-score: {', '.join(registry.MODEL_FILES)} (default: all)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000,
+                            help="Rows fetched per database round trip (default 5000)")
+        parser.add_argument("--batch-size", type=int, default=20000,
+                            help="Predictions scored per vectorized batch (default 20000)")
+        parser.add_argument("--jobs", type=int, default=1,
+                            help="Score batches in a pool of this many processes (default 1: in process)")
+        parser.add_argument("--restart", action="store_true",
+                            help="Ignore the checkpoint and re-score from the first prediction")
+
+    def handle(self, *args, **options):
+        names = options["models"] or list(registry.MODEL_FILES)
+        unknown = sorted(set(names) - set(registry.MODEL_FILES))
+        if unknown:
+            raise CommandError(f"Unknown model(s): {', '.join(unknown)}")
+
+        dmodel, dpre, kmodel, kpre = registry.get_models()
+        loaded = {'diabetes': (dmodel, dpre), 'kidney': (kmodel, kpre)}
+        versions = registry.get_model_versions()
+        for name in names:
+            self.rescore(name, *loaded[name], versions[name], options)
+
+    def batches(self, name, features, after_id, options):
+        """Yield (prediction ids, X) batches of complete feature rows, in id order."""
+        rows = (
+            PredictionFeature.objects
+            .filter(feature_name__startswith=scoring.FEATURE_PREFIXES[name], prediction_id__gt=after_id)
+            .order_by("prediction_id")
+            .values_list("prediction_id", "feature_name", "feature_value")
+            .iterator(chunk_size=options["chunk_size"])
+        )
+        ids, feature_names, values = [], [], []
+        n_predictions, last_id = 0, None
+        for prediction_id, feature_name, value in rows:
+            if prediction_id != last_id:
+                # Flush on a prediction boundary so no row is split
+                if n_predictions >= options["batch_size"]:
+                    yield scoring.assemble(name, features, ids, feature_names, values), last_id
+                    ids, feature_names, values, n_predictions = [], [], [], 0
+                n_predictions += 1
+                last_id = prediction_id
+            ids.append(prediction_id)
+            feature_names.append(feature_name)
+            values.append(value)
+        if ids:
+            yield scoring.assemble(name, features, ids, feature_names, values), last_id
+
+    def rescore(self, name, model, preprocessor, version, options):
+        checkpoint, _ = RescoreCheckpoint.objects.get_or_create(model_name=name, model_version=version)
+        if options["restart"]:
+            checkpoint.last_prediction_id = checkpoint.scored = 0
+            checkpoint.finished_at = None
+            checkpoint.save()
+        elif checkpoint.finished_at:
+            self.stdout.write(f"{name}: {version} already scored {checkpoint.scored} predictions "
+                              f"(use --restart to score again)")
+            return
+
+        self.stdout.write(f"Re-scoring {name} with {version} from prediction #{checkpoint.last_prediction_id}")
+        batches = self.batches(name, preprocessor.features, checkpoint.last_prediction_id, options)
+        started = time.perf_counter()
+        totals = {'scored': 0, 'changed': 0, 'delta': 0.0}
+
+        if options["jobs"] > 1:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            pool = ProcessPoolExecutor(
+                max_workers=options["jobs"], mp_context=multiprocessing.get_context("spawn"),
+                initializer=scoring.init_worker, initargs=(name, model, preprocessor),
+            )
+            # Results are written in submission order, so the checkpoint
+            # never skips an unwritten batch
+            pending = deque()
+            with pool:
+                for (ids, X), last_id in batches:
+                    pending.append((ids, last_id, pool.submit(scoring.score_in_worker, X)))
+                    if len(pending) >= 2 * options["jobs"]:
+                        ids, last_id, future = pending.popleft()
+                        self.write_batch(name, version, checkpoint, ids, last_id, future.result(), totals, started)
+                while pending:
+                    ids, last_id, future = pending.popleft()
+                    self.write_batch(name, version, checkpoint, ids, last_id, future.result(), totals, started)
+        else:
+            for (ids, X), last_id in batches:
+                scores = scoring.score_rows(name, model, preprocessor, X)
+                self.write_batch(name, version, checkpoint, ids, last_id, scores, totals, started)
+
+        checkpoint.finished_at = timezone.now()
+        checkpoint.save(update_fields=["finished_at", "updated_at"])
+
+        elapsed = time.perf_counter() - started
+        scored = totals['scored']
+        self.stdout.write(self.style.SUCCESS(
+            f"{name}: scored {scored} predictions with {version} in {elapsed:.1f}s "
+            f"({scored / elapsed if elapsed else 0:.0f}/s)"
+        ))
+        if scored:
+            self.stdout.write(
+                f"   risk level changed for {totals['changed']} ({totals['changed'] / scored:.1%}), "
+                f"mean |probability change| {totals['delta'] / scored:.2f} points vs. the stored scores"
+            )
+
+    def write_batch(self, name, version, checkpoint, ids, last_id, scores, totals, started):
+        """Upsert one batch of scores and advance the checkpoint atomically."""
+        ids = [int(i) for i in ids]
+        with transaction.atomic():
+            # Keep every IN (...) list within the database's parameter limit
+            for offset in range(0, len(ids), WRITE_CHUNK):
+                chunk = slice(offset, offset + WRITE_CHUNK)
+                self.upsert(name, version, ids[chunk], *(column[chunk] for column in scores), totals)
+
+            checkpoint.last_prediction_id = last_id
+            checkpoint.scored += len(ids)
+            checkpoint.save(update_fields=["last_prediction_id", "scored", "updated_at"])
+
+        totals['scored'] += len(ids)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"   up to #{last_id}: {totals['scored']} scored, "
+            f"{totals['scored'] / elapsed if elapsed else 0:.0f} predictions/s"
+        )
+
+    def upsert(self, name, version, ids, probability, label, risk, totals):
+        now = timezone.now()
+        stored = {
+            pk: (p, r) for pk, p, r in
+            Prediction.objects.filter(id__in=ids).values_list("id", f"{name}_probability", f"{name}_risk")
+        }
+        rows = []
+        for i, prediction_id in enumerate(ids):
+            row = PredictionScore(
+                prediction_id=prediction_id, model_name=name, model_version=version,
+                probability=float(probability[i]), label=int(label[i]), risk=risk[i], scored_at=now,
+            )
+            rows.append(row)
+
+            # How far the new score moved from the one stored on the prediction
+            old_probability, old_risk = stored.get(prediction_id, (None, None))
+            if old_probability is not None:
+                totals['delta'] += abs(row.probability - old_probability)
+            totals['changed'] += old_risk != row.risk
+
+        # One INSERT ... ON CONFLICT DO UPDATE per chunk: re-running a version
+        # overwrites its rows instead of duplicating them
+        PredictionScore.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["prediction", "model_name", "model_version"],
+            update_fields=["probability", "label", "risk", "scored_at"],
+        )
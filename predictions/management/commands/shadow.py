@@ -0,0 +1,77 @@
+"""
+Inspect, promote or discard shadow-slot candidates. Examples:
+
+    python manage.py shadow
+    python manage.py shadow kidney
+    python manage.py shadow kidney --promote
+    python manage.py shadow kidney --clear
+
+Without an action, prints what the slot holds and how each candidate
+compared with the deployed model on live predictions (see
+predictions.shadow). ``--promote`` moves the candidate's artifacts over the
+deployed ones; ``--clear`` deletes them. Recorded ShadowScore rows are kept
+either way.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from predictions import registry, shadow
+
+
+class Command(BaseCommand):
+    help = "Report on shadow-mode candidates and promote or discard them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models", nargs="*",
+            help=f"Models: {', '.join(registry.MODEL_FILES)} (default: all)",
+        )
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument("--promote", action="store_true",
+                            help="Replace the deployed model with the shadow candidate")
+        action.add_argument("--clear", action="store_true", help="Delete the shadow candidate")
+
+    def handle(self, *args, **options):
+        names = options["models"] or list(registry.MODEL_FILES)
+        unknown = sorted(set(names) - set(registry.MODEL_FILES))
+        if unknown:
+            raise CommandError(f"Unknown model(s): {', '.join(unknown)}")
+        if (options["promote"] or options["clear"]) and not options["models"]:
+            raise CommandError("Name the model(s) to promote or clear")
+
+        for name in names:
+            if options["promote"]:
+                try:
+                    version = shadow.promote(name)
+                except ValueError as e:
+                    raise CommandError(str(e))
+                self.stdout.write(self.style.SUCCESS(f"{name}: promoted {version}"))
+            elif options["clear"]:
+                removed = shadow.clear(name)
+                self.stdout.write(f"{name}: removed {', '.join(removed) or 'nothing'}")
+            else:
+                self.report(name)
+
+    def report(self, name):
+        deployed = registry.get_model_versions()[name]
+        candidate = registry.get_shadow(name)
+        self.stdout.write(f"{name}: serving {deployed}, shadow slot "
+                          f"{candidate[2] if candidate else 'empty'}")
+
+        for row in shadow.comparison(name):
+            self.stdout.write(
+                f"   {row['shadow_version']} vs {row['production_version'] or '-'}: "
+                f"{row['predictions']} predictions, label agreement {row['label_agreement']:.1%}, "
+                f"risk agreement {row['risk_agreement']:.1%}"
+            )
+            self.stdout.write(
+                f"      probability drift mean {row['mean_drift']:+.2f}, "
+                f"mean |drift| {row['mean_abs_drift']:.2f}, max |drift| {row['max_abs_drift']:.2f} points"
+            )
+            for q in (50, 99):
+                production = row[f'production_p{q}_ms']
+                if production is None:
+                    continue
+                self.stdout.write(
+                    f"      p{q} latency {production:.3f} ms -> {row[f'shadow_p{q}_ms']:.3f} ms "
+                    f"({row[f'p{q}_delta_ms']:+.3f})"
+                )
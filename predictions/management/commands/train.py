@@ -0,0 +1,168 @@
+"""
+Train, select and publish a disease model. Examples:
+
+    python manage.py train diabetes
+    python manage.py train kidney --halving --jobs 16
+    python manage.py train diabetes --grid --folds 10 --scoring roc_auc --dry-run
+    python manage.py train kidney --stream --source /data/kidney_full.csv --chunksize 200000
+    python manage.py train diabetes --benchmark --latency-budget 2
+    python manage.py train kidney --distill
+    python manage.py train kidney --shadow
+
+Candidates and cross-validation folds are fitted in parallel (see
+predictions.training). ``--stream`` trains out of core instead: the CSV is
+read in chunks and only ``partial_fit`` models are considered (see
+predictions.streaming). ``--benchmark`` also measures every candidate's
+serving latency, throughput, footprint, load and SHAP cost and prints the
+accuracy-versus-latency Pareto frontier; ``--latency-budget`` deploys the
+best candidate within a p99 budget. ``--distill`` fits compact students to
+the winner's probabilities and deploys the cheapest faithful one that is
+clearly cheaper than the teacher, keeping the teacher as
+ml/<disease>_teacher.pkl (see predictions.distillation). The winner is
+saved as pickles, global importance and a model bundle, which the registry
+picks up on the next request.
+``--shadow`` saves them to the registry's shadow slot instead: the deployed
+model keeps serving while the candidate scores live predictions alongside
+it (see predictions.shadow and ``manage.py shadow``).
+"""
+from django.core.management.base import BaseCommand
+
+from predictions import registry, streaming, training
+
+
+class Command(BaseCommand):
+    help = "Train the candidate models for a disease with parallel cross-validation"
+
+    def add_arguments(self, parser):
+        parser.add_argument("disease", choices=list(training.DISEASES))
+        parser.add_argument("--folds", type=int, default=5, help="Stratified k-fold splits (default 5)")
+        parser.add_argument("--jobs", type=int, default=-1, help="Parallel workers (default: all cores)")
+        parser.add_argument("--scoring", default="accuracy", help="sklearn scorer used for selection")
+        parser.add_argument("--grid", action="store_true", help="Evaluate every candidate's full grid")
+        parser.add_argument("--halving", action="store_true", help="Search the grids by successive halving")
+        parser.add_argument("--factor", type=int, default=3, help="Successive-halving elimination factor")
+        parser.add_argument("--no-smote", action="store_true", help="Disable minority oversampling")
+        parser.add_argument("--dry-run", action="store_true", help="Report only, do not save the model")
+        parser.add_argument("--benchmark", action="store_true",
+                            help="Measure each candidate's serving cost and save it next to the bundle")
+        parser.add_argument("--latency-budget", type=float, metavar="MS",
+                            help="Deploy the best candidate with p99 single-row latency within MS")
+        parser.add_argument("--distill", action="store_true",
+                            help="Deploy a compact student distilled from the selected model")
+        parser.add_argument("--shadow", action="store_true",
+                            help="Publish to the shadow slot instead of replacing the deployed model")
+        parser.add_argument("--stream", action="store_true", help="Train out of core on CSV chunks")
+        parser.add_argument("--source", help="CSV to stream (default: the disease CSV in the model directory)")
+        parser.add_argument("--chunksize", type=int, default=streaming.DEFAULT_CHUNKSIZE,
+                            help="Rows per chunk in --stream mode")
+        parser.add_argument("--epochs", type=int, default=3, help="Passes over the data in --stream mode")
+
+    def handle(self, *args, **options):
+        from joblib import effective_n_jobs
+
+        disease = options["disease"]
+        publish_dir = None
+        if options["shadow"]:
+            publish_dir = registry.shadow_dir()
+            publish_dir.mkdir(exist_ok=True)
+        if options["stream"]:
+            self.stdout.write(f"Streaming {disease} in chunks of {options['chunksize']} rows")
+            result = streaming.train_streaming(
+                disease,
+                source=options["source"],
+                chunksize=options["chunksize"],
+                epochs=options["epochs"],
+                ml_dir=registry.ml_dir(),
+                save=not options["dry_run"],
+                log=self.stdout.write,
+                publish_dir=publish_dir,
+            )
+            self.report(result, options, "Leaderboard (hold-out ROC AUC):")
+            return
+
+        smote = training.DISEASES[disease]['smote'] and not options["no_smote"]
+        if smote:
+            try:
+                import imblearn  # noqa: F401
+            except ImportError:
+                self.stderr.write("imbalanced-learn is not installed; training without SMOTE")
+                smote = False
+
+        self.stdout.write(
+            f"Training {disease} on {effective_n_jobs(options['jobs'])} worker(s), "
+            f"{options['folds']}-fold CV"
+        )
+        result = training.train(
+            disease,
+            ml_dir=registry.ml_dir(),
+            save=not options["dry_run"],
+            log=self.stdout.write,
+            search_grids=options["grid"],
+            halving=options["halving"],
+            folds=options["folds"],
+            scoring=options["scoring"],
+            smote=smote,
+            n_jobs=options["jobs"],
+            factor=options["factor"],
+            benchmark=options["benchmark"],
+            latency_budget_ms=options["latency_budget"],
+            distill=options["distill"],
+            publish_dir=publish_dir,
+        )
+        if result['benchmarks']:
+            self.report_benchmarks(result['benchmarks'], result['frontier'])
+        if result['distillation']:
+            self.report_distillation(result['distillation'])
+        self.report(result, options, "Leaderboard (cross-validated):")
+
+    def report_benchmarks(self, benchmarks, frontier):
+        self.stdout.write("\nServing cost (* = on the score/latency Pareto frontier):")
+        self.stdout.write(
+            f"   {'':1} {'candidate':<24} {'CV':>7} {'p50 ms':>8} {'p99 ms':>8} {'rows/s':>10} "
+            f"{'KB':>8} {'load ms':>8} {'SHAP ms':>9}"
+        )
+        for name, row in sorted(benchmarks.items(), key=lambda item: item[1]['p99_ms']):
+            shap_ms = f"{row['shap_ms']:.1f}" if row['shap_ms'] is not None else "-"
+            self.stdout.write(
+                f"   {'*' if name in frontier else ' '} {name:<24} {row['score']:>7.4f} "
+                f"{row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f} {row['throughput_rps']:>10.0f} "
+                f"{row['artifact_bytes'] / 1024:>8.0f} {row['load_ms']:>8.2f} {shap_ms:>9}"
+            )
+
+    def report_distillation(self, report):
+        teacher = report['teacher']
+        self.stdout.write("\nDistillation (fidelity on the hold-out split):")
+        self.stdout.write(
+            f"   {'':1} {'student':<28} {'agree':>6} {'MAE':>7} {'AUC':>7} {'p99 ms':>8} {'KB':>8}"
+        )
+        self.stdout.write(
+            f"     {'(teacher)':<28} {'':>6} {'':>7} {teacher['roc_auc']:>7.4f} "
+            f"{teacher['p99_ms']:>8.3f} {teacher['artifact_bytes'] / 1024:>8.0f}"
+        )
+        for name, row in report['students'].items():
+            self.stdout.write(
+                f"   {'*' if name == report['selected'] else ' '} {name:<28} {row['agreement']:>6.3f} "
+                f"{row['proba_mae']:>7.4f} {row['roc_auc']:>7.4f} {row['p99_ms']:>8.3f} "
+                f"{row['artifact_bytes'] / 1024:>8.0f}"
+            )
+
+    def report(self, result, options, title):
+        self.stdout.write(f"\n{title}")
+        for name, params, score, rows in result['best']['leaderboard'][:10]:
+            self.stdout.write(f"   {score:.4f}  {name} {params} ({rows} rows)")
+
+        metrics = result['metrics']
+        self.stdout.write(
+            f"\nSelected {metrics['model']}: hold-out accuracy {metrics['accuracy']:.4f}, "
+            f"ROC AUC {metrics['roc_auc']:.4f}"
+        )
+        self.stdout.write(
+            f"Search {result['search_seconds']:.1f}s, total {result['total_seconds']:.1f}s"
+        )
+        if options["dry_run"]:
+            self.stdout.write("Dry run: nothing saved")
+        elif result['version']:
+            slot = " to the shadow slot" if options["shadow"] else ""
+            self.stdout.write(self.style.SUCCESS(f"Published bundle {result['version']}{slot}"))
+        else:
+            self.stdout.write(self.style.WARNING("Saved pickles only (model kind cannot be bundled)"))
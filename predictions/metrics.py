@@ -0,0 +1,69 @@
+"""
+Lightweight in-process metrics for the prediction pipeline.
+
+Counters, gauges and timings are kept per process (each WSGI worker has its
+own set); ``snapshot()`` returns a plain dict suitable for logging or a JSON
+status view.
+"""
+import threading
+from collections import defaultdict, deque
+
+# Keep the most recent observations only so memory stays bounded
+TIMING_WINDOW = 1000
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_gauges = {}
+_timings = defaultdict(lambda: deque(maxlen=TIMING_WINDOW))
+
+
+def incr(name, value=1):
+    """Increase a monotonically growing counter."""
+    with _lock:
+        _counters[name] += value
+
+
+def gauge(name, value):
+    """Record the current value of a gauge."""
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, seconds):
+    """Record one timing observation in seconds."""
+    with _lock:
+        _timings[name].append(float(seconds))
+
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals:
+        return None
+    idx = min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))
+    return sorted_vals[idx]
+
+
+def snapshot():
+    """Return counters, gauges and timing summaries as a dict."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        timings = {name: sorted(vals) for name, vals in _timings.items()}
+
+    summaries = {}
+    for name, vals in timings.items():
+        summaries[name] = {
+            'count': len(vals),
+            'mean': sum(vals) / len(vals) if vals else None,
+            'p50': _percentile(vals, 0.50),
+            'p95': _percentile(vals, 0.95),
+            'max': vals[-1] if vals else None,
+        }
+    return {'counters': counters, 'gauges': gauges, 'timings': summaries}
+
+
+def reset():
+    """Clear all metrics (used by tests and management commands)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timings.clear()
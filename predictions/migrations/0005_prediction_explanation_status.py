@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:27
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    # Rows created before this migration were explained eagerly at creation
+    Prediction = apps.get_model("predictions", "Prediction")
+    Prediction.objects.update(explanation_status="Ready")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("predictions", "0004_prediction_diabetes_explanation_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="prediction",
+            name="explanation_started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="prediction",
+            name="explanation_status",
+            field=models.CharField(
+                choices=[
+                    ("Pending", "Pending"),
+                    ("Running", "Running"),
+                    ("Ready", "Ready"),
+                    ("Failed", "Failed"),
+                ],
+                default="Pending",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="prediction",
+            name="explanation_viewed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("predictions", "0005_prediction_explanation_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="prediction",
+            name="diabetes_model_version",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="prediction",
+            name="kidney_model_version",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("predictions", "0006_prediction_model_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RescoreCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model_name", models.CharField(max_length=20)),
+                ("model_version", models.CharField(max_length=64)),
+                ("last_prediction_id", models.IntegerField(default=0)),
+                ("scored", models.IntegerField(default=0)),
+                ("started_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("model_name", "model_version"),
+                        name="unique_rescore_checkpoint",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="PredictionScore",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model_name", models.CharField(max_length=20)),
+                ("model_version", models.CharField(max_length=64)),
+                ("probability", models.FloatField(blank=True, null=True)),
+                ("label", models.IntegerField(blank=True, null=True)),
+                ("risk", models.CharField(blank=True, max_length=20, null=True)),
+                ("scored_at", models.DateTimeField()),
+                (
+                    "prediction",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="scores",
+                        to="predictions.prediction",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["model_name", "model_version"],
+                        name="predictions_model_n_721669_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("prediction", "model_name", "model_version"),
+                        name="unique_prediction_score",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("predictions", "0007_prediction_score"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShadowScore",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model_name", models.CharField(max_length=20)),
+                (
+                    "production_version",
+                    models.CharField(blank=True, max_length=64, null=True),
+                ),
+                ("shadow_version", models.CharField(max_length=64)),
+                ("production_probability", models.FloatField(blank=True, null=True)),
+                ("shadow_probability", models.FloatField()),
+                ("production_label", models.IntegerField(blank=True, null=True)),
+                ("shadow_label", models.IntegerField()),
+                (
+                    "production_risk",
+                    models.CharField(blank=True, max_length=20, null=True),
+                ),
+                ("shadow_risk", models.CharField(max_length=20)),
+                ("production_ms", models.FloatField(blank=True, null=True)),
+                ("shadow_ms", models.FloatField()),
+                ("scored_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "prediction",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shadow_scores",
+                        to="predictions.prediction",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["model_name", "shadow_version"],
+                        name="predictions_model_n_8ee7fe_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("prediction", "model_name", "shadow_version"),
+                        name="unique_shadow_score",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("predictions", "0008_shadow_score"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="prediction",
+            name="recommendation_data",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("predictions", "0009_prediction_recommendation_data"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="prediction",
+            name="ckd_stage",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("G1", "G1"),
+                    ("G2", "G2"),
+                    ("G3a", "G3a"),
+                    ("G3b", "G3b"),
+                    ("G4", "G4"),
+                    ("G5", "G5"),
+                ],
+                db_index=True,
+                default="",
+                max_length=3,
+            ),
+        ),
+        migrations.AddField(
+            model_name="prediction",
+            name="egfr",
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+    ]
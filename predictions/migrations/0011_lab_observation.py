@@ -0,0 +1,66 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_patient_is_verified"),
+        ("predictions", "0010_prediction_egfr"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LabObservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("feature", models.CharField(max_length=20)),
+                ("value", models.FloatField()),
+                ("observed_at", models.DateTimeField()),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lab_observations",
+                        to="accounts.patient",
+                    ),
+                ),
+                (
+                    "prediction",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lab_observations",
+                        to="predictions.prediction",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["feature", "value"], name="lab_observation_range"
+                    ),
+                    models.Index(
+                        fields=["patient", "feature", "observed_at"],
+                        name="lab_observation_latest",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("prediction", "feature"), name="unique_lab_observation"
+                    )
+                ],
+            },
+        ),
+    ]
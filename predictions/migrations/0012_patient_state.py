@@ -0,0 +1,80 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_patient_is_verified"),
+        ("predictions", "0011_lab_observation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PatientState",
+            fields=[
+                (
+                    "patient",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="state",
+                        serialize=False,
+                        to="accounts.patient",
+                    ),
+                ),
+                (
+                    "diabetes_risk",
+                    models.CharField(blank=True, default="", max_length=20),
+                ),
+                (
+                    "kidney_risk",
+                    models.CharField(blank=True, default="", max_length=20),
+                ),
+                ("diabetes_probability", models.FloatField(blank=True, null=True)),
+                ("kidney_probability", models.FloatField(blank=True, null=True)),
+                ("glucose", models.FloatField(blank=True, null=True)),
+                ("creatinine", models.FloatField(blank=True, null=True)),
+                ("egfr", models.FloatField(blank=True, null=True)),
+                (
+                    "ckd_stage",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("G1", "G1"),
+                            ("G2", "G2"),
+                            ("G3a", "G3a"),
+                            ("G3b", "G3b"),
+                            ("G4", "G4"),
+                            ("G5", "G5"),
+                        ],
+                        default="",
+                        max_length=3,
+                    ),
+                ),
+                ("prediction_count", models.IntegerField(default=0)),
+                ("approved_count", models.IntegerField(default=0)),
+                ("pending_count", models.IntegerField(default=0)),
+                ("diabetes_low", models.IntegerField(default=0)),
+                ("diabetes_medium", models.IntegerField(default=0)),
+                ("diabetes_high", models.IntegerField(default=0)),
+                ("kidney_low", models.IntegerField(default=0)),
+                ("kidney_medium", models.IntegerField(default=0)),
+                ("kidney_high", models.IntegerField(default=0)),
+                ("last_activity", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "latest_approved",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="predictions.prediction",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_patient_is_verified"),
+        ("predictions", "0012_patient_state"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RiskTrend",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "disease",
+                    models.CharField(
+                        choices=[("diabetes", "Diabetes"), ("kidney", "Kidney")],
+                        max_length=10,
+                    ),
+                ),
+                ("count", models.IntegerField(default=0)),
+                ("mean", models.FloatField(default=0.0)),
+                ("slope", models.FloatField(default=0.0)),
+                ("last_value", models.FloatField(blank=True, null=True)),
+                ("last_delta", models.FloatField(blank=True, null=True)),
+                ("max_value", models.FloatField(blank=True, null=True)),
+                ("last_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="risk_trends",
+                        to="accounts.patient",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("patient", "disease"), name="unique_risk_trend"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from accounts.models import Patient, Doctor
+from recommendations.clinical import CKD_STAGES
+
+CKD_STAGE_CHOICES = [(stage, stage) for stage in reversed(CKD_STAGES)]
 
 class Prediction(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="predictions")
@@ -15,6 +18,10 @@ class Prediction(models.Model):
     kidney_label = models.IntegerField(null=True, blank=True)
     kidney_risk = models.CharField(max_length=20, null=True, blank=True)
 
+    # Model bundle versions the probabilities were scored with
+    diabetes_model_version = models.CharField(max_length=64, null=True, blank=True)
+    kidney_model_version = models.CharField(max_length=64, null=True, blank=True)
+
     # Approval workflow
     approval_status = models.CharField(
         max_length=20,
@@ -38,13 +45,36 @@ class Prediction(models.Model):
     kidney_fi_image = models.CharField(max_length=500, null=True, blank=True)
     
     # Recommendations
+    # Engine output as item codes and values (see recommendations.engine);
+    # rendered on display. recommendation_text, when set, takes precedence:
+    # it holds HTML a doctor approved, or legacy HTML from before this field.
+    recommendation_data = models.JSONField(null=True, blank=True)
     recommendation_text = models.TextField(null=True, blank=True)
     doctor_notes = models.TextField(null=True, blank=True)
 
+    # Derived from the saved creatinine, age and gender when creatinine was
+    # measured (recommendations.batch.egfr_fields), indexed for cohort filters
+    egfr = models.FloatField(null=True, blank=True, db_index=True)
+    ckd_stage = models.CharField(max_length=3, choices=CKD_STAGE_CHOICES, blank=True, default="", db_index=True)
+
     # Clinical Explanations (Plain English)
     diabetes_explanation = models.TextField(null=True, blank=True)
     kidney_explanation = models.TextField(null=True, blank=True)
 
+    # Explanation lifecycle (computed eagerly, on first view or in the background)
+    explanation_status = models.CharField(
+        max_length=20,
+        choices=[
+            ("Pending", "Pending"),
+            ("Running", "Running"),
+            ("Ready", "Ready"),
+            ("Failed", "Failed"),
+        ],
+        default="Pending"
+    )
+    explanation_started_at = models.DateTimeField(null=True, blank=True)
+    explanation_viewed_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         ordering = ["-created_at"]
 
@@ -66,3 +96,175 @@ class PredictionFeature(models.Model):
         return f"{self.feature_name}: {self.feature_value}"
 
 
+class PredictionScore(models.Model):
+    """A stored prediction re-scored by one model version (``manage.py rescore``)."""
+    prediction = models.ForeignKey(Prediction, on_delete=models.CASCADE, related_name="scores")
+    model_name = models.CharField(max_length=20)
+    model_version = models.CharField(max_length=64)
+    probability = models.FloatField(null=True, blank=True)
+    label = models.IntegerField(null=True, blank=True)
+    risk = models.CharField(max_length=20, null=True, blank=True)
+    scored_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["prediction", "model_name", "model_version"], name="unique_prediction_score"
+            ),
+        ]
+        indexes = [models.Index(fields=["model_name", "model_version"])]
+
+    def __str__(self):
+        return f"{self.model_version} on prediction #{self.prediction_id}: {self.probability}"
+
+
+class RescoreCheckpoint(models.Model):
+    """Progress of a ``manage.py rescore`` run, so an interrupted run resumes."""
+    model_name = models.CharField(max_length=20)
+    model_version = models.CharField(max_length=64)
+    last_prediction_id = models.IntegerField(default=0)
+    scored = models.IntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["model_name", "model_version"], name="unique_rescore_checkpoint"),
+        ]
+
+    def __str__(self):
+        return f"{self.model_version}: {self.scored} scored, last #{self.last_prediction_id}"
+
+
+class ShadowScore(models.Model):
+    """A live prediction scored by a shadow-slot candidate next to the deployed model."""
+    prediction = models.ForeignKey(Prediction, on_delete=models.CASCADE, related_name="shadow_scores")
+    model_name = models.CharField(max_length=20)
+    production_version = models.CharField(max_length=64, null=True, blank=True)
+    shadow_version = models.CharField(max_length=64)
+    production_probability = models.FloatField(null=True, blank=True)
+    shadow_probability = models.FloatField()
+    production_label = models.IntegerField(null=True, blank=True)
+    shadow_label = models.IntegerField()
+    production_risk = models.CharField(max_length=20, null=True, blank=True)
+    shadow_risk = models.CharField(max_length=20)
+    # Preprocess + predict time of each model, in milliseconds
+    production_ms = models.FloatField(null=True, blank=True)
+    shadow_ms = models.FloatField()
+    scored_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["prediction", "model_name", "shadow_version"], name="unique_shadow_score"
+            ),
+        ]
+        indexes = [models.Index(fields=["model_name", "shadow_version"])]
+
+    def __str__(self):
+        return (f"{self.shadow_version} vs {self.production_version} on prediction "
+                f"#{self.prediction_id}: {self.shadow_probability} / {self.production_probability}")
+
+
+class LabObservation(models.Model):
+    """
+    One lab value of a prediction as a number, under one name per analyte
+    (see predictions.observations). Feeds the cohort search.
+    """
+    # Both foreign keys are covered by the composite indexes below
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="lab_observations", db_index=False)
+    prediction = models.ForeignKey(
+        Prediction, on_delete=models.CASCADE, related_name="lab_observations", db_index=False
+    )
+    feature = models.CharField(max_length=20)
+    value = models.FloatField()
+    observed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["prediction", "feature"], name="unique_lab_observation"),
+        ]
+        indexes = [
+            # Candidates for a value range ...
+            models.Index(fields=["feature", "value"], name="lab_observation_range"),
+            # ... and whether a candidate is the patient's latest reading
+            models.Index(fields=["patient", "feature", "observed_at"], name="lab_observation_latest"),
+        ]
+
+    def __str__(self):
+        return f"{self.feature} {self.value} for patient #{self.patient_id} at {self.observed_at:%Y-%m-%d}"
+
+
+class PatientState(models.Model):
+    """
+    Denormalized summary of a patient's predictions, one row per patient,
+    so dashboards read one indexed row instead of scanning the history.
+    Rewritten by predictions.patient_state.refresh whenever a prediction
+    of the patient is created, reviewed or deleted.
+    """
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True, related_name="state")
+    latest_approved = models.ForeignKey(
+        Prediction, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+
+    # Risks and key labs of the latest approved prediction
+    diabetes_risk = models.CharField(max_length=20, blank=True, default="")
+    kidney_risk = models.CharField(max_length=20, blank=True, default="")
+    diabetes_probability = models.FloatField(null=True, blank=True)
+    kidney_probability = models.FloatField(null=True, blank=True)
+    glucose = models.FloatField(null=True, blank=True)
+    creatinine = models.FloatField(null=True, blank=True)
+    egfr = models.FloatField(null=True, blank=True)
+    ckd_stage = models.CharField(max_length=3, choices=CKD_STAGE_CHOICES, blank=True, default="")
+
+    # Counts over all of the patient's predictions
+    prediction_count = models.IntegerField(default=0)
+    approved_count = models.IntegerField(default=0)
+    pending_count = models.IntegerField(default=0)
+    diabetes_low = models.IntegerField(default=0)
+    diabetes_medium = models.IntegerField(default=0)
+    diabetes_high = models.IntegerField(default=0)
+    kidney_low = models.IntegerField(default=0)
+    kidney_medium = models.IntegerField(default=0)
+    kidney_high = models.IntegerField(default=0)
+
+    last_activity = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def risk_labels(self):
+        """(disease, latest risk) pairs for display"""
+        return (("Diabetes", self.diabetes_risk), ("Kidney", self.kidney_risk))
+
+    def __str__(self):
+        return f"State of patient #{self.patient_id}: latest approved #{self.latest_approved_id}"
+
+
+class RiskTrend(models.Model):
+    """
+    Running statistics of one patient's approved risk probabilities for one
+    disease, folded in one approval at a time (see predictions.trends).
+    """
+    DISEASE_CHOICES = [("diabetes", "Diabetes"), ("kidney", "Kidney")]
+
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="risk_trends")
+    disease = models.CharField(max_length=10, choices=DISEASE_CHOICES)
+
+    count = models.IntegerField(default=0)
+    mean = models.FloatField(default=0.0)
+    # Exponentially weighted mean of the change between consecutive values
+    slope = models.FloatField(default=0.0)
+    last_value = models.FloatField(null=True, blank=True)
+    last_delta = models.FloatField(null=True, blank=True)
+    max_value = models.FloatField(null=True, blank=True)
+    last_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["patient", "disease"], name="unique_risk_trend"),
+        ]
+
+    def __str__(self):
+        return f"{self.disease} trend of patient #{self.patient_id}: {self.count} values, slope {self.slope:+.1f}"
@@ -0,0 +1,191 @@
+"""
+Typed lab observations and cohort queries over them.
+
+PredictionFeature keeps each saved input as text under the form's prefixed
+name ("Kidney_Creatinine"), so "patients whose latest creatinine is above
+2.0" used to mean reading and casting every row in Python. LabObservation
+holds the same values as floats under one name per analyte, plus the
+derived eGFR, and ``cohort`` compiles conditions into one SQL query:
+
+    cohort(parse("creatinine > 2.0 and glucose > 180"))
+
+Each condition becomes a subquery that finds candidates through the
+(feature, value) index and keeps those that are the patient's latest
+reading of that feature through the (patient, feature, observed_at) index.
+
+Only readings of approved predictions count, by default: the patient's
+history and charts (predictions.timeseries) show approved predictions
+only, so "latest creatinine" means the same on every page. Pass
+``approved=False`` to include pending and rejected predictions.
+
+Observations are written by ``create_prediction`` (``record``) and, for
+predictions saved before this table existed, by
+``manage.py backfill_observations``.
+"""
+import re
+from collections import namedtuple
+
+from django.db.models import OuterRef, Subquery
+
+from accounts.models import Patient
+
+from .models import LabObservation
+
+# PredictionFeature name -> observation feature. The diabetes and kidney
+# forms both carry a (diastolic) pressure; the first one saved wins.
+LABS = {
+    'Diabetes_Glucose': 'glucose',
+    'Diabetes_BMI': 'bmi',
+    'Diabetes_BloodPressure': 'bp_diastolic',
+    'Kidney_Blood Pressure': 'bp_diastolic',
+    'Kidney_Creatinine': 'creatinine',
+    'Kidney_Pottasium': 'potassium',
+    'Kidney_Sodium': 'sodium',
+    'Kidney_Hemoglobin': 'hemoglobin',
+    'Kidney_Urea': 'urea',
+    'Kidney_Albumin': 'albumin',
+}
+# Stored on Prediction rather than as a PredictionFeature
+EGFR = 'egfr'
+
+# Observation feature -> (label, unit), in display order
+FEATURES = {
+    'glucose': ("Glucose", "mg/dL"),
+    'bmi': ("BMI", "kg/m²"),
+    'bp_diastolic': ("Diastolic BP", "mmHg"),
+    'creatinine': ("Creatinine", "mg/dL"),
+    EGFR: ("eGFR", "mL/min/1.73m²"),
+    'potassium': ("Potassium", "mEq/L"),
+    'sodium': ("Sodium", "mEq/L"),
+    'hemoglobin': ("Hemoglobin", "g/dL"),
+    'urea': ("BUN", "mg/dL"),
+    'albumin': ("Albumin", "level"),
+}
+
+# Comparison -> field lookup
+OPERATORS = {'>': 'gt', '>=': 'gte', '<': 'lt', '<=': 'lte', '=': 'exact'}
+
+Condition = namedtuple("Condition", "feature op value")
+
+_CONDITION = re.compile(r"^\s*([a-z_]+)\s*(>=|<=|>|<|=)\s*(-?\d+(?:\.\d*)?)\s*$")
+_SEPARATOR = re.compile(r"\s*(?:,|\band\b|&)\s*", re.IGNORECASE)
+
+
+def observations_for(prediction, saved):
+    """
+    Unsaved LabObservations of a prediction.
+
+    Args:
+        prediction: A saved Prediction (its patient, created_at and egfr
+            are used)
+        saved: {PredictionFeature name: value} of the prediction
+
+    Returns:
+        list: one LabObservation per feature that has a numeric value
+    """
+    values = {}
+    for name, feature in LABS.items():
+        if feature in values or name not in saved:
+            continue
+        try:
+            values[feature] = float(saved[name])
+        except (TypeError, ValueError):
+            continue
+    if prediction.egfr is not None:
+        values[EGFR] = prediction.egfr
+    return [
+        LabObservation(
+            patient_id=prediction.patient_id, prediction_id=prediction.id,
+            feature=feature, value=value, observed_at=prediction.created_at,
+        )
+        for feature, value in values.items()
+    ]
+
+
+def record(prediction, saved):
+    """Store a prediction's observations (existing ones are left as they are)."""
+    LabObservation.objects.bulk_create(observations_for(prediction, saved), ignore_conflicts=True)
+
+
+def parse(query):
+    """
+    Parse "creatinine > 2.0 and glucose >= 180" into Conditions.
+
+    Conditions are separated by "and", "&" or commas.
+
+    Raises:
+        ValueError: on an unknown feature or a malformed condition
+    """
+    conditions = []
+    for part in _SEPARATOR.split(query.strip().lower()):
+        if not part:
+            continue
+        match = _CONDITION.match(part)
+        if not match:
+            raise ValueError(f"Cannot read {part!r}; expected e.g. 'creatinine > 2.0'")
+        feature, op, value = match.groups()
+        if feature not in FEATURES:
+            raise ValueError(f"Unknown lab {feature!r}; known: {', '.join(FEATURES)}")
+        conditions.append(Condition(feature, op, float(value)))
+    return conditions
+
+
+def _observations(approved):
+    observations = LabObservation.objects.all()
+    if approved:
+        observations = observations.filter(prediction__approval_status="Approved")
+    return observations
+
+
+def _latest_ids(approved):
+    """Id of the latest observation of the outer row's patient and feature."""
+    return Subquery(
+        _observations(approved).filter(patient_id=OuterRef("patient_id"), feature=OuterRef("feature"))
+        .order_by("-observed_at", "-id")
+        .values("id")[:1]
+    )
+
+
+def matching(condition, latest=True, approved=True):
+    """
+    Observations satisfying one condition (only latest readings of
+    approved predictions by default).
+    """
+    observations = _observations(approved).filter(
+        feature=condition.feature, **{f"value__{OPERATORS[condition.op]}": condition.value}
+    )
+    if latest:
+        observations = observations.filter(id=_latest_ids(approved))
+    return observations
+
+
+def cohort(conditions, latest=True, approved=True):
+    """
+    Patients meeting every condition.
+
+    Args:
+        conditions: Conditions (see ``parse``)
+        latest: Test each patient's latest reading of a feature; when False
+            any reading counts
+        approved: Only count readings of approved predictions
+
+    Returns:
+        QuerySet: Patients, one SQL query when evaluated
+    """
+    patients = Patient.objects.all()
+    for condition in conditions:
+        patients = patients.filter(id__in=matching(condition, latest, approved).values("patient_id"))
+    return patients
+
+
+def latest_values(patient_ids, features, approved=True):
+    """{patient id: {feature: (value, observed_at)}} of the latest readings."""
+    rows = (
+        _observations(approved).filter(patient_id__in=patient_ids, feature__in=features)
+        .filter(id=_latest_ids(approved))
+        .values_list("patient_id", "feature", "value", "observed_at")
+    )
+    values = {}
+    for patient_id, feature, value, observed_at in rows:
+        values.setdefault(patient_id, {})[feature] = (value, observed_at)
+    return values
@@ -0,0 +1,162 @@
+"""
+Per-patient summary rows (PatientState) and their maintenance.
+
+The patient dashboard, recommendations and latest-report pages, the
+doctor's patient list and the admin user list all need "the latest
+approved prediction", per-risk counts or the last activity of a patient.
+They read them from the patient's PatientState row:
+
+    state = patient_state.get(patient)        # one indexed row
+    state.latest_approved, state.approved_count, state.last_activity
+    patient_state.states(patient_ids)         # {patient id: state}, for lists
+
+Rows are recomputed from the predictions table, never patched: every view
+that creates, approves, rejects or deletes a prediction calls
+
+    patient_state.refresh(prediction.patient_id)
+
+in the same transaction as its write, and the row is rebuilt with a few
+aggregate queries over that one patient's predictions. A reviewed
+prediction that is later rejected, or deleted, can therefore never leave
+the row out of step. ``manage.py rebuild_patient_state`` does the same for
+every patient in batches (after upgrading, or after bulk changes such as
+``derive_clinical``).
+"""
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+
+from accounts.models import Patient
+
+from .models import LabObservation, PatientState, Prediction
+
+RISK_LEVELS = ("Low", "Medium", "High")
+
+# PatientState field -> observation feature of the latest approved prediction
+KEY_LABS = {'glucose': 'glucose', 'creatinine': 'creatinine'}
+
+APPROVED = Q(approval_status="Approved")
+
+# PatientState count field -> filter over the patient's predictions
+COUNTS = {
+    'prediction_count': Q(),
+    'approved_count': APPROVED,
+    'pending_count': Q(approval_status="Pending"),
+    **{
+        f"{disease}_{level.lower()}": APPROVED & Q(**{f"{disease}_risk": level})
+        for disease in ("diabetes", "kidney") for level in RISK_LEVELS
+    },
+}
+
+# Copied from the latest approved prediction (empty when there is none)
+LATEST_FIELDS = ("diabetes_risk", "kidney_risk", "diabetes_probability", "kidney_probability", "egfr", "ckd_stage")
+STRING_FIELDS = {"diabetes_risk", "kidney_risk", "ckd_stage"}
+
+FIELDS = ["latest_approved", *LATEST_FIELDS, *KEY_LABS, *COUNTS, "last_activity", "updated_at"]
+
+
+def compute(patient_ids):
+    """
+    Unsaved PatientStates of patients, from their predictions.
+
+    Four queries whatever the number of patients.
+
+    Args:
+        patient_ids: Patient ids
+
+    Returns:
+        list: one PatientState per id (patients without predictions get
+            zero counts)
+    """
+    patient_ids = list(patient_ids)
+    aggregates = {
+        row["patient_id"]: row
+        for row in Prediction.objects.filter(patient_id__in=patient_ids)
+        .order_by().values("patient_id")
+        .annotate(last_activity=Max("created_at"), **{
+            name: Count("id", filter=condition) for name, condition in COUNTS.items()
+        })
+    }
+    latest_ids = Subquery(
+        Prediction.objects.filter(APPROVED, patient_id=OuterRef("pk"))
+        .order_by("-created_at", "-id").values("id")[:1]
+    )
+    latest = {
+        prediction.patient_id: prediction
+        for prediction in Prediction.objects.filter(
+            id__in=Patient.objects.filter(id__in=patient_ids).values(latest=latest_ids)
+        ).only("id", "patient_id", *LATEST_FIELDS)
+    }
+    labs = {}
+    for prediction_id, feature, value in LabObservation.objects.filter(
+        prediction_id__in=[p.id for p in latest.values()], feature__in=list(KEY_LABS.values())
+    ).values_list("prediction_id", "feature", "value"):
+        labs.setdefault(prediction_id, {})[feature] = value
+
+    states = []
+    for patient_id in patient_ids:
+        row = aggregates.get(patient_id, {})
+        state = PatientState(
+            patient_id=patient_id,
+            last_activity=row.get("last_activity"),
+            **{name: row.get(name, 0) for name in COUNTS},
+        )
+        prediction = latest.get(patient_id)
+        if prediction is not None:
+            state.latest_approved = prediction
+            for name in LATEST_FIELDS:
+                value = getattr(prediction, name)
+                setattr(state, name, (value or "") if name in STRING_FIELDS else value)
+            found = labs.get(prediction.id, {})
+            for name, feature in KEY_LABS.items():
+                setattr(state, name, found.get(feature))
+        states.append(state)
+    return states
+
+
+def save(states):
+    """Insert or overwrite PatientState rows (one statement per call)."""
+    return PatientState.objects.bulk_create(
+        states, update_conflicts=True, unique_fields=["patient"], update_fields=FIELDS,
+    )
+
+
+def refresh(patient_id):
+    """
+    Recompute and store one patient's state.
+
+    Call after any write to the patient's predictions; it joins the
+    caller's transaction, or runs in its own.
+    """
+    with transaction.atomic():
+        # Serialize concurrent refreshes of the same patient
+        list(Patient.objects.select_for_update().filter(id=patient_id).values_list("id", flat=True))
+        save(compute([patient_id]))
+
+
+def states(patient_ids):
+    """
+    {patient id: PatientState} of many patients in one query, for lists;
+    missing rows are computed and stored in one batch.
+    """
+    patient_ids = list(patient_ids)
+    found = PatientState.objects.in_bulk(patient_ids)
+    missing = [patient_id for patient_id in patient_ids if patient_id not in found]
+    if missing:
+        with transaction.atomic():
+            for state in save(compute(missing)):
+                found[state.patient_id] = state
+    return found
+
+
+def get(patient):
+    """
+    A patient's state with its latest approved prediction (and reviewing
+    doctor) loaded; created on first use for patients no write has
+    refreshed yet.
+    """
+    queryset = PatientState.objects.select_related("latest_approved__doctor__user")
+    state = queryset.filter(patient_id=patient.id).first()
+    if state is None:
+        refresh(patient.id)
+        state = queryset.get(patient_id=patient.id)
+    return state
@@ -0,0 +1,277 @@
+"""
+One preprocessing pipeline for training, evaluation and serving.
+
+Each disease has a ``Preprocessor`` that renames the raw CSV columns, puts
+the features in model order, imputes missing values (NaN, and zeros where a
+zero means "not measured"), clips every feature to its plausible range and
+applies robust scaling -- all in one vectorized ``transform`` call. Zeros
+are only treated as missing in training rows; at serving time (and when
+test sheets are evaluated) an entered 0 is a value like any other and is
+clipped to the range, as the prediction form always did. The same
+object is fitted by the training pipeline, stored in the model bundle
+manifest and used by the prediction views, so training and serving can no
+longer drift apart.
+
+A Preprocessor exposes ``transform``, ``feature_names_in_``, ``center_`` and
+``scale_``, so it can stand in wherever a fitted RobustScaler was used.
+numpy is bound lazily because the spec constants are imported at startup.
+"""
+from pathlib import Path
+
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+ML_DIR = Path(__file__).resolve().parent / "ml"
+
+# Bump when the transform itself changes (not just SPECS), so derived
+# dataset caches are rebuilt
+PREPROCESSING_VERSION = 1
+
+KIDNEY_RENAME_MAP = {
+    'Bp': 'Blood Pressure',
+    'Sg': 'Specific Gravity',
+    'Al': 'Albumin',
+    'Su': 'Sugar',
+    'Rbc': 'Red Blood Cell',
+    'Bu': 'Urea',
+    'Sc': 'Creatinine',
+    'Sod': 'Sodium',
+    'Pot': 'Pottasium',  # Keep the typo as expected by the app
+    'Hemo': 'Hemoglobin',
+    'Wbcc': 'White Blood Cell Count',
+    'Rbcc': 'Red Blood Cell Count',
+    'Htn': 'Hypertension',
+    'Class': 'Predicted Class'
+}
+
+SPECS = {
+    'diabetes': {
+        'csv': "diabetes.csv",
+        'target': "Outcome",
+        'rename': {},
+        'features': ['Age', 'BMI', 'BloodPressure', 'Glucose'],
+        # A zero here is a missing measurement, not a real value
+        'zero_as_missing': ['BMI', 'BloodPressure', 'Glucose'],
+        # Glucose in mg/dL; BloodPressure is diastolic
+        'clip': {
+            'Age': (21, 100),
+            'BMI': (10, 70),
+            'BloodPressure': (40, 130),
+            'Glucose': (70, 400),
+        },
+        # Training rows outside these bounds are dropped, not clipped
+        'row_filters': {},
+    },
+    'kidney': {
+        'csv': "kidney.csv",
+        'target': "Predicted Class",
+        'rename': KIDNEY_RENAME_MAP,
+        'features': ['Creatinine', 'Pottasium', 'Hemoglobin', 'Sodium',
+                     'Blood Pressure', 'Red Blood Cell', 'Urea', 'Albumin'],
+        'zero_as_missing': [],
+        # Creatinine and Urea in mg/dL, Potassium and Sodium in mEq/L
+        'clip': {
+            'Creatinine': (0.4, 15),
+            'Pottasium': (2.0, 7.0),
+            'Hemoglobin': (4.0, 20),
+            'Sodium': (100, 180),
+            'Blood Pressure': (50, 180),
+            'Urea': (5, 400),
+            'Albumin': (0, 5),
+        },
+        'row_filters': {
+            'Pottasium': (None, 7),
+            'Hemoglobin': (None, 20),
+            'Blood Pressure': (50, None),
+        },
+    },
+}
+
+
+class Preprocessor:
+    """
+    Fused rename -> order -> impute -> clip -> scale transform.
+
+    Build one with ``Preprocessor.for_disease(name)`` and ``fit`` it on raw
+    training rows, or restore a fitted one with ``from_dict``.
+    """
+
+    def __init__(self, features, rename=None, zero_as_missing=(), clip=None,
+                 impute=None, center=None, scale=None):
+        n = len(features)
+        clip = clip or {}
+        self.features = list(features)
+        self.rename = dict(rename or {})
+        self.zero_as_missing = [f for f in features if f in set(zero_as_missing)]
+        self.clip = {f: tuple(clip[f]) for f in features if f in clip}
+
+        self.zero_mask = np.array([f in self.zero_as_missing for f in features])
+        self.lower = np.array([self.clip.get(f, (-np.inf, np.inf))[0] for f in features], dtype=np.float64)
+        self.upper = np.array([self.clip.get(f, (-np.inf, np.inf))[1] for f in features], dtype=np.float64)
+        self.impute = np.asarray(impute if impute is not None else np.full(n, np.nan), dtype=np.float64)
+        self.center_ = np.asarray(center if center is not None else np.zeros(n), dtype=np.float64)
+        self.scale_ = np.asarray(scale if scale is not None else np.ones(n), dtype=np.float64)
+
+        self.feature_names_in_ = np.asarray(self.features, dtype=object)
+        self.n_features_in_ = n
+
+    @classmethod
+    def for_disease(cls, name):
+        spec = SPECS[name]
+        return cls(spec['features'], spec['rename'], spec['zero_as_missing'], spec['clip'])
+
+    @classmethod
+    def from_scaler(cls, name, scaler):
+        """
+        Wrap a fitted RobustScaler pickled before preprocessing was shared.
+
+        Missing values fall back to the scaler's centre, i.e. the training
+        median.
+        """
+        center = np.asarray(getattr(scaler, 'center_', getattr(scaler, 'mean_', None)), dtype=np.float64)
+        pre = cls.for_disease(name)
+        pre.impute = center.copy()
+        pre.center_ = center
+        pre.scale_ = np.asarray(scaler.scale_, dtype=np.float64)
+        return pre
+
+    # --- Fitting --------------------------------------------------------------
+
+    def _as_array(self, X):
+        """Raw input (dict, DataFrame or array in feature order) as float64 rows."""
+        if isinstance(X, dict):
+            # None -> NaN, so absent inputs are imputed
+            return np.column_stack([
+                np.atleast_1d(np.asarray(X.get(f), dtype=np.float64)) for f in self.features
+            ])
+        if hasattr(X, 'columns'):
+            if not set(self.features).issubset(X.columns):
+                X = X.rename(columns=self.rename)
+            return X[self.features].to_numpy(dtype=np.float64, copy=True)
+        return np.array(X, dtype=np.float64, ndmin=2)
+
+    def _missing(self, X, zero_as_missing=True):
+        missing = np.isnan(X)
+        return missing | ((X == 0) & self.zero_mask) if zero_as_missing else missing
+
+    def fit_impute(self, X):
+        """Learn the per-feature median of the observed (non-missing) values."""
+        X = self._as_array(X)
+        observed = np.where(self._missing(X), np.nan, X)
+        self.impute = np.nanmedian(observed, axis=0)
+        return self
+
+    def fit_scale(self, X_clean):
+        """Learn RobustScaler centre (median) and scale (IQR) from cleaned rows."""
+        X_clean = self._as_array(X_clean)
+        self.center_ = np.nanmedian(X_clean, axis=0)
+        q25, q75 = np.nanpercentile(X_clean, [25, 75], axis=0)
+        scale = q75 - q25
+        self.scale_ = np.where(scale == 0, 1.0, scale)
+        return self
+
+    def fit(self, X):
+        """Fit imputation and scaling on raw training rows."""
+        self.fit_impute(X)
+        return self.fit_scale(self.clean(X))
+
+    # --- Transform ------------------------------------------------------------
+
+    def clean(self, X, zero_as_missing=True):
+        """Impute and clip without scaling (the values shown to clinicians)."""
+        X = self._as_array(X)
+        X = np.where(self._missing(X, zero_as_missing), self.impute, X)
+        return np.clip(X, self.lower, self.upper, out=X)
+
+    def transform(self, X, return_clean=False, zero_as_missing=True):
+        """
+        Run the full pipeline on raw rows.
+
+        Args:
+            X: dict of feature -> value (or arrays), DataFrame with raw or
+                renamed columns, or an array already in feature order
+            return_clean: Also return the imputed/clipped unscaled values
+            zero_as_missing: Impute zeros of the ``zero_as_missing``
+                features; False when scoring entered values, so a 0 is
+                clipped to the lower bound instead
+
+        Returns:
+            ndarray of scaled rows, or (clean, scaled) if ``return_clean``
+        """
+        X_clean = self.clean(X, zero_as_missing)
+        scaled = (X_clean - self.center_) / self.scale_
+        return (X_clean, scaled) if return_clean else scaled
+
+    # --- Serialization --------------------------------------------------------
+
+    def to_dict(self):
+        return {
+            'features': self.features,
+            'rename': self.rename,
+            'zero_as_missing': self.zero_as_missing,
+            'clip': {f: list(bounds) for f, bounds in self.clip.items()},
+            'impute': [float(v) for v in self.impute],
+            'center': [float(v) for v in self.center_],
+            'scale': [float(v) for v in self.scale_],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['features'], data.get('rename'), data.get('zero_as_missing', ()),
+            data.get('clip'), data.get('impute'), data.get('center'), data.get('scale'),
+        )
+
+
+def spec_version(name):
+    """Short key for the preprocessing applied to ``name`` (code version + spec)."""
+    import hashlib
+    import json
+
+    spec = json.dumps(SPECS[name], sort_keys=True, default=list)
+    return f"p{PREPROCESSING_VERSION}-{hashlib.sha256(spec.encode()).hexdigest()[:8]}"
+
+
+def as_preprocessor(name, scaler):
+    """Return ``scaler`` as a Preprocessor, wrapping a legacy fitted scaler."""
+    if isinstance(scaler, Preprocessor):
+        return scaler
+    return Preprocessor.from_scaler(name, scaler)
+
+
+def prepare_frame(name, df):
+    """
+    Rename raw CSV columns and drop implausible training rows.
+
+    Works on a whole table or on one chunk of a streamed CSV.
+
+    Returns:
+        tuple: (X DataFrame with raw feature values, y Series)
+    """
+    spec = SPECS[name]
+    df = df.rename(columns=spec['rename'])
+
+    keep = np.ones(len(df), dtype=bool)
+    for column, (low, high) in spec['row_filters'].items():
+        if low is not None:
+            keep &= (df[column] >= low).to_numpy()
+        if high is not None:
+            keep &= (df[column] <= high).to_numpy()
+    df = df[keep]
+    return df[spec['features']], df[spec['target']].astype(int)
+
+
+def load_frame(name, ml_dir=ML_DIR):
+    """
+    Read a disease CSV through ``prepare_frame``.
+
+    The CSV is parsed once and then served from the columnar dataset cache
+    (see predictions.datasets).
+
+    Returns:
+        tuple: (X DataFrame with raw feature values, y Series)
+    """
+    from .datasets import load_table
+
+    return prepare_frame(name, load_table(SPECS[name]['csv'], ml_dir))
@@ -0,0 +1,241 @@
+"""
+Process-wide registry of the deployed models and their SHAP backgrounds.
+
+Everything here is loaded once per process and reused. Under a pre-forking
+server (``gunicorn --preload``, uWSGI without ``lazy-apps``) ``preload()``
+runs in the master from ``medpredict.wsgi``/``medpredict.asgi`` so workers
+inherit the loaded objects copy-on-write:
+
+* background matrices are saved as ``.npy`` once and opened with
+  ``np.load(mmap_mode='r')``, so their pages are file-backed and shared
+  by every process regardless of reference counting;
+* a current ``<model>_bundle.npz`` (see predictions.bundle) is preferred
+  over the pickles; its arrays are memory-mapped rather than unpickled;
+* ``gc.freeze()`` moves the preloaded objects into the permanent
+  generation so the cyclic GC never writes to their headers after fork.
+
+A candidate model can be published to the shadow slot (``ml/shadow/``, the
+same file names as the deployed artifacts) instead of over the deployed
+pickles. ``get_shadow`` loads it for predictions.shadow; it is never served.
+"""
+import gc
+import os
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+from .lazy import lazy_import, ensure_loaded
+
+np = lazy_import("numpy")
+joblib = lazy_import("joblib")
+
+MODEL_FILES = {
+    'diabetes': "diabetes_model.pkl",
+    'kidney': "kidney_model.pkl",
+}
+
+SCALER_FILES = {
+    'diabetes': "diab_scaler.pkl",
+    'kidney': "kid_scaler.pkl",
+}
+
+# Rows of the training CSV used as SHAP background
+BACKGROUND_ROWS = 50
+
+# Subdirectory of ml_dir() holding candidate models scored in shadow mode
+SHADOW_DIR = "shadow"
+
+_lock = threading.Lock()
+_models = {}
+_shadows = {}
+_backgrounds = {}
+
+
+def ml_dir():
+    return Path(settings.BASE_DIR) / "predictions" / "ml"
+
+
+def cache_dir():
+    path = ml_dir() / "cache"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _mtime(path):
+    return os.path.getmtime(path) if path.exists() else None
+
+
+def shadow_dir():
+    """The shadow slot: candidate artifacts, named like the deployed ones."""
+    return ml_dir() / SHADOW_DIR
+
+
+def _slot_files(model_name, directory):
+    from .bundle import bundle_path
+
+    return (directory / MODEL_FILES[model_name],
+            directory / SCALER_FILES[model_name],
+            bundle_path(model_name, directory))
+
+
+def _load_model(model_name, directory=None):
+    """
+    Load one disease model as (model, scaler, version, bundle).
+
+    The bundle is used when it mirrors the pickle on disk; otherwise (no
+    bundle, stale bundle, or a model kind bundles cannot hold) the pickles
+    are unpickled and versioned by the model file hash.
+
+    Args:
+        directory: Slot to load from (default: the deployed models in ml_dir)
+    """
+    from .bundle import file_hash, is_current, load_bundle, read_manifest
+    from .preprocessing import as_preprocessor
+
+    directory = directory or ml_dir()
+    model_path, scaler_path, path = _slot_files(model_name, directory)
+    if path.exists():
+        try:
+            if is_current(read_manifest(path), model_path):
+                bundle = load_bundle(path)
+                return bundle.model, bundle.scaler, bundle.version, bundle
+            print(f"Model bundle {path.name} is older than {model_path.name}; using the pickle")
+        except Exception as e:
+            print(f"Could not load model bundle {path.name}: {e}")
+
+    model = joblib.load(model_path)
+    scaler = joblib.load(scaler_path)
+    return model, as_preprocessor(model_name, scaler), f"{model_name}-pkl-{file_hash(model_path)[:12]}", None
+
+
+def _loaded():
+    key = tuple(
+        _mtime(path)
+        for model_name in MODEL_FILES
+        for path in _slot_files(model_name, ml_dir())
+    )
+    with _lock:
+        if _models.get('key') != key:
+            _models['loaded'] = {name: _load_model(name) for name in MODEL_FILES}
+            _models['key'] = key
+        return _models['loaded']
+
+
+def get_models():
+    """
+    Return (diabetes_model, diabetes_scaler, kidney_model, kidney_scaler).
+
+    The "scalers" are predictions.preprocessing.Preprocessor objects: one
+    ``transform`` call imputes, clips and scales raw inputs. The loaded
+    objects are reused until one of the files on disk changes.
+    """
+    loaded = _loaded()
+    return loaded['diabetes'][:2] + loaded['kidney'][:2]
+
+
+def get_model_versions():
+    """Return {model_name: version} for the models get_models() serves."""
+    return {name: entry[2] for name, entry in _loaded().items()}
+
+
+def get_bundle(model_name):
+    """The loaded Bundle for ``model_name``, or None when serving a pickle."""
+    return _loaded()[model_name][3]
+
+
+def has_shadow(model_name):
+    """Whether a candidate for ``model_name`` sits in the shadow slot (two stat calls)."""
+    model_path, _, path = _slot_files(model_name, shadow_dir())
+    return model_path.exists() or path.exists()
+
+
+def get_shadow(model_name):
+    """
+    The candidate in the shadow slot as (model, scaler, version), or None.
+
+    Loaded like the deployed model and reused until its files change. It is
+    never returned by get_models(): only predictions.shadow scores with it.
+    """
+    files = _slot_files(model_name, shadow_dir())
+    key = tuple(_mtime(path) for path in files)
+    with _lock:
+        cached = _shadows.get(model_name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+    loaded = None
+    if has_shadow(model_name):
+        try:
+            loaded = _load_model(model_name, shadow_dir())[:3]
+        except Exception as e:
+            print(f"Could not load the shadow {model_name} model: {e}")
+
+    with _lock:
+        _shadows[model_name] = (key, loaded)
+    return loaded
+
+
+def _build_background(model_name, preprocessor):
+    from .preprocessing import load_frame
+
+    X, _ = load_frame(model_name, ml_dir())
+    return np.ascontiguousarray(preprocessor.transform(X.iloc[:BACKGROUND_ROWS]), dtype=np.float64)
+
+
+def get_background(model_name):
+    """
+    Scaled SHAP background rows for ``model_name`` as a read-only memmap.
+
+    A bundle carries its own background. Otherwise the matrix is written to
+    ``ml/cache`` once per scaler version (keyed by the scaler file hash) and
+    memory-mapped on every later load.
+
+    Returns:
+        numpy.memmap or None if the background cannot be built
+    """
+    from .importance import model_hash
+
+    bundle = get_bundle(model_name)
+    if bundle is not None and bundle.background is not None:
+        return bundle.background
+
+    scaler_path = ml_dir() / SCALER_FILES[model_name]
+    key = (model_name, os.path.getmtime(scaler_path))
+
+    with _lock:
+        if key in _backgrounds:
+            return _backgrounds[key]
+
+    try:
+        path = cache_dir() / f"{model_name}_background_{model_hash(scaler_path)}.npy"
+        if not path.exists():
+            models = get_models()
+            scaler = models[1] if model_name == 'diabetes' else models[3]
+            tmp = path.with_suffix(f".{os.getpid()}.tmp.npy")
+            np.save(tmp, _build_background(model_name, scaler))
+            os.replace(tmp, path)
+        background = np.load(path, mmap_mode='r')
+    except Exception as e:
+        print(f"Could not load SHAP background for {model_name}: {e}")
+        return None
+
+    with _lock:
+        _backgrounds[key] = background
+    return background
+
+
+def preload():
+    """
+    Load models, background matrices and the explainability stack, then
+    freeze the heap so forked workers keep sharing these pages.
+    """
+    get_models()
+    for model_name in SCALER_FILES:
+        get_background(model_name)
+
+    from . import explainability
+    ensure_loaded(explainability.np, explainability.shap, explainability.plt)
+
+    gc.collect()
+    gc.freeze()
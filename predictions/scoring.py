@@ -0,0 +1,102 @@
+"""
+Vectorized scoring of stored predictions.
+
+``create_prediction`` scores one request at a time; re-scoring the stored
+population with a new model version (``manage.py rescore``) needs the same
+numbers for thousands of rows at once. ``assemble`` turns streamed
+PredictionFeature rows into a feature matrix and ``score_rows`` applies the
+view's rules (probability in percent capped at 95, diabetes label from
+``predict``, kidney label at 50%, risk bands from
+predictions.utils.calculate_risk_level) to a whole batch.
+
+The pool helpers let a process pool score batches with a model handed to
+each worker once.
+"""
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+PROBABILITY_CAP = 95.0
+# Same bands as predictions.utils.calculate_risk_level
+RISK_BANDS = ((0.3, "Low"), (0.7, "Medium"))
+RISK_ABOVE = "High"
+
+# PredictionFeature.feature_name prefixes written by create_prediction
+FEATURE_PREFIXES = {
+    'diabetes': "Diabetes_",
+    'kidney': "Kidney_",
+}
+
+
+def risk_levels(probability):
+    """Risk level for each probability in [0, 1]."""
+    probability = np.asarray(probability, dtype=np.float64)
+    return np.select(
+        [probability < bound for bound, _ in RISK_BANDS],
+        [level for _, level in RISK_BANDS],
+        RISK_ABOVE,
+    ).astype(object)
+
+
+def score_rows(model_name, model, preprocessor, X):
+    """
+    Score feature rows the way create_prediction does.
+
+    Args:
+        X: Rows in ``preprocessor.features`` order
+
+    Returns:
+        tuple: (probability in percent, label, risk level) arrays
+    """
+    if not len(X):
+        return np.empty(0), np.empty(0, dtype=int), np.empty(0, dtype=object)
+    X_scaled = preprocessor.transform(X, zero_as_missing=False)
+    probability = np.minimum(model.predict_proba(X_scaled)[:, 1] * 100, PROBABILITY_CAP)
+    if model_name == 'diabetes':
+        label = np.asarray(model.predict(X_scaled)).astype(int)
+    else:
+        label = (probability >= 50.0).astype(int)
+    return probability, label, risk_levels(probability / 100.0)
+
+
+def assemble(model_name, features, prediction_ids, feature_names, feature_values):
+    """
+    Feature matrix of the predictions in a stream of PredictionFeature rows.
+
+    Args:
+        features: Model feature names, in column order
+        prediction_ids, feature_names, feature_values: Parallel sequences
+            from ``values_list('prediction_id', 'feature_name', 'feature_value')``
+
+    Returns:
+        tuple: (prediction ids, X) for predictions with every feature present
+    """
+    import pandas as pd
+
+    prefix = FEATURE_PREFIXES[model_name]
+    column = {f"{prefix}{name}": i for i, name in enumerate(features)}
+    names = pd.Series(feature_names, dtype=object).map(column)
+    keep = names.notna().to_numpy()
+
+    ids, rows = np.unique(np.asarray(prediction_ids)[keep], return_inverse=True)
+    X = np.full((len(ids), len(features)), np.nan)
+    X[rows, names[keep].to_numpy(dtype=np.int64)] = pd.to_numeric(
+        pd.Series(feature_values, dtype=object)[keep], errors='coerce'
+    ).to_numpy(dtype=np.float64)
+
+    complete = ~np.isnan(X).any(axis=1)
+    return ids[complete], X[complete]
+
+
+# --- Process pool -------------------------------------------------------------
+
+_worker = {}
+
+
+def init_worker(model_name, model, preprocessor):
+    """Pool initializer: keep the model in the worker for every batch."""
+    _worker.update(model_name=model_name, model=model, preprocessor=preprocessor)
+
+
+def score_in_worker(X):
+    return score_rows(_worker['model_name'], _worker['model'], _worker['preprocessor'], X)
@@ -0,0 +1,235 @@
+"""
+Shadow-mode scoring of a candidate model against live traffic.
+
+A retrained model is published to the registry's shadow slot (``manage.py
+train --shadow``) instead of over the deployed pickles. While the slot holds
+a candidate for a disease, every prediction the deployed model scores is
+scored again by the candidate on the background pool (predictions.tasks)
+once the request's transaction commits. Both outputs and both latencies are
+stored side by side in ShadowScore; ``comparison`` summarises them per
+(production, shadow) version pair for the admin and ``manage.py shadow``,
+and ``promote`` moves the candidate into service.
+
+The request path only times its own model call and hands the raw inputs
+over. At most MAX_PENDING shadow jobs wait per process; past that a
+prediction is simply not shadowed (counted as ``shadow.dropped``) so a slow
+candidate can never build up a backlog behind the live traffic.
+
+Settings (optional):
+    SHADOW_SCORING: Set False to stop scoring shadow candidates (default True)
+"""
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from . import metrics, registry, scoring
+from .models import Prediction, ShadowScore
+
+MAX_PENDING = 100
+
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def shadow_enabled():
+    return getattr(settings, 'SHADOW_SCORING', True)
+
+
+def schedule_shadow(prediction, inputs):
+    """
+    Queue shadow scoring of a freshly created prediction.
+
+    Args:
+        inputs: {model_name: (raw input dict, production milliseconds)} for
+            the models the deployed registry scored
+    """
+    if not shadow_enabled():
+        return
+    for model_name, (values, production_ms) in inputs.items():
+        if registry.has_shadow(model_name):
+            transaction.on_commit(
+                lambda name=model_name, values=values, ms=production_ms:
+                    _submit(prediction.id, name, values, ms)
+            )
+
+
+def _submit(prediction_id, model_name, values, production_ms):
+    global _pending
+    from .tasks import submit
+
+    with _pending_lock:
+        if _pending >= MAX_PENDING:
+            metrics.incr('shadow.dropped')
+            return
+        _pending += 1
+    submit(_score_and_release, prediction_id, model_name, values, production_ms)
+
+
+def _score_and_release(*args):
+    global _pending
+    try:
+        return score_shadow(*args)
+    finally:
+        with _pending_lock:
+            _pending -= 1
+
+
+def score_shadow(prediction_id, model_name, values, production_ms=None):
+    """
+    Score one prediction's raw inputs with the shadow candidate and store
+    the result next to the deployed model's.
+
+    Returns:
+        ShadowScore or None when the slot is empty
+    """
+    shadow = registry.get_shadow(model_name)
+    if shadow is None:
+        return None
+    model, preprocessor, version = shadow
+
+    started = time.perf_counter()
+    probability, label, risk = scoring.score_rows(model_name, model, preprocessor, values)
+    shadow_ms = (time.perf_counter() - started) * 1000
+
+    production = Prediction.objects.filter(id=prediction_id).values(
+        f"{model_name}_probability", f"{model_name}_label", f"{model_name}_risk",
+        f"{model_name}_model_version",
+    ).first()
+    if production is None:
+        return None
+
+    score, _ = ShadowScore.objects.update_or_create(
+        prediction_id=prediction_id, model_name=model_name, shadow_version=version,
+        defaults={
+            'production_version': production[f"{model_name}_model_version"],
+            'production_probability': production[f"{model_name}_probability"],
+            'production_label': production[f"{model_name}_label"],
+            'production_risk': production[f"{model_name}_risk"],
+            'production_ms': production_ms,
+            'shadow_probability': float(probability[0]),
+            'shadow_label': int(label[0]),
+            'shadow_risk': risk[0],
+            'shadow_ms': shadow_ms,
+        },
+    )
+    metrics.incr('shadow.scored')
+    metrics.observe(f'shadow.{model_name}.latency', shadow_ms / 1000)
+    return score
+
+
+def comparison(model_name=None):
+    """
+    Agreement, probability drift and latency deltas of every shadow run.
+
+    Returns:
+        list: One dict per (model_name, production_version, shadow_version),
+            newest first: predictions, label/risk agreement rates, mean and
+            mean absolute drift (shadow minus production, in probability
+            points), p50/p99 latency of both models and their deltas (ms)
+    """
+    import numpy as np
+    import pandas as pd
+
+    qs = ShadowScore.objects.all()
+    if model_name:
+        qs = qs.filter(model_name=model_name)
+    frame = pd.DataFrame.from_records(qs.values(
+        'model_name', 'production_version', 'shadow_version',
+        'production_probability', 'shadow_probability', 'production_label', 'shadow_label',
+        'production_risk', 'shadow_risk', 'production_ms', 'shadow_ms', 'scored_at',
+    ))
+    if frame.empty:
+        return []
+
+    frame['production_version'] = frame['production_version'].fillna("")
+    frame['drift'] = frame['shadow_probability'] - frame['production_probability'].astype(float)
+    frame['label_agrees'] = frame['shadow_label'] == frame['production_label']
+    frame['risk_agrees'] = frame['shadow_risk'] == frame['production_risk']
+
+    def ms(values, q):
+        values = values.dropna()
+        return float(np.percentile(values, q)) if len(values) else None
+
+    def delta(shadow, production):
+        return shadow - production if shadow is not None and production is not None else None
+
+    rows = []
+    for (name, production_version, shadow_version), group in frame.groupby(
+            ['model_name', 'production_version', 'shadow_version']):
+        row = {
+            'model_name': name,
+            'production_version': production_version or None,
+            'shadow_version': shadow_version,
+            'predictions': int(len(group)),
+            'label_agreement': float(group['label_agrees'].mean()),
+            'risk_agreement': float(group['risk_agrees'].mean()),
+            'mean_drift': float(group['drift'].mean()),
+            'mean_abs_drift': float(group['drift'].abs().mean()),
+            'max_abs_drift': float(group['drift'].abs().max()),
+            'first_scored': group['scored_at'].min(),
+            'last_scored': group['scored_at'].max(),
+        }
+        for q in (50, 99):
+            production, shadow = ms(group['production_ms'], q), ms(group['shadow_ms'], q)
+            row[f'production_p{q}_ms'] = production
+            row[f'shadow_p{q}_ms'] = shadow
+            row[f'p{q}_delta_ms'] = delta(shadow, production)
+        rows.append(row)
+    return sorted(rows, key=lambda row: row['last_scored'], reverse=True)
+
+
+def slot_files(model_name, directory):
+    """Artifacts of ``model_name`` in a registry slot, in promotion order."""
+    from .benchmark import benchmark_path
+    from .distillation import teacher_path
+    from .importance import importance_path
+
+    model_path, scaler_path, bundle = registry._slot_files(model_name, directory)
+    # With a bundle present the registry serves it as soon as the model pickle
+    # it mirrors is in place, so the bundle goes first and the scaler last
+    return [
+        importance_path(model_name, directory),
+        benchmark_path(model_name, directory),
+        teacher_path(model_name, directory),
+        bundle,
+        model_path,
+        scaler_path,
+    ]
+
+
+def promote(model_name):
+    """
+    Move the shadow candidate into service and empty the slot.
+
+    Every file is moved with ``os.replace``; the registry reloads on the
+    next request. Deployed artifacts the candidate does not have (e.g. a
+    bundle for a kind that cannot be bundled) are removed so they cannot
+    be mistaken for the promoted model's.
+
+    Returns:
+        str: The promoted version
+    """
+    shadow = registry.get_shadow(model_name)
+    if shadow is None:
+        raise ValueError(f"No shadow candidate for {model_name}")
+
+    for source, target in zip(slot_files(model_name, registry.shadow_dir()),
+                              slot_files(model_name, registry.ml_dir())):
+        if source.exists():
+            os.replace(source, target)
+        elif target.exists():
+            target.unlink()
+    return shadow[2]
+
+
+def clear(model_name):
+    """Delete the shadow candidate; recorded ShadowScore rows are kept."""
+    removed = []
+    for path in slot_files(model_name, registry.shadow_dir()):
+        if path.exists():
+            path.unlink()
+            removed.append(path.name)
+    return removed
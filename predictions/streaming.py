@@ -0,0 +1,337 @@
+"""
+Out-of-core training for datasets larger than memory.
+
+The source CSV is read in chunks and never held whole:
+
+1. A statistics pass feeds every training row into one ``QuantileSketch``
+   per feature (a mergeable KLL-style sketch of bounded size), counts the
+   classes and keeps a fixed-size reservoir sample of rows. The
+   Preprocessor's imputation medians and robust centre/IQR scale come from
+   the sketches instead of a full sort.
+2. Each training epoch streams the chunks again, transforms them with the
+   fitted Preprocessor and calls ``partial_fit`` on every candidate
+   (``SGDClassifier`` with logistic loss, ``GaussianNB``). Class imbalance is
+   handled with balanced sample weights instead of SMOTE.
+3. Held-out rows are scored mini-batch by mini-batch (accuracy, log loss and
+   a binned ROC AUC) and the best candidate is saved exactly like the
+   in-memory path: pickles, global importance and model bundle.
+
+Rows are assigned to the test split by a hash of their position in the
+file, so the split is stable across passes and chunk sizes. Peak memory is
+bounded by the chunk size plus the (fixed) sketch and reservoir sizes.
+"""
+import time
+from pathlib import Path
+
+from .lazy import lazy_import
+from .preprocessing import SPECS, Preprocessor, prepare_frame
+
+np = lazy_import("numpy")
+
+ML_DIR = Path(__file__).resolve().parent / "ml"
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# Rows kept for the SHAP background and global importance
+RESERVOIR_ROWS = 2000
+
+# Score bins for the streaming ROC AUC
+AUC_BINS = 1000
+
+
+class QuantileSketch:
+    """
+    Approximate quantiles of a stream of floats in bounded memory.
+
+    Values land in level 0. Whenever a level holds more than ``k`` values it
+    is sorted and every other value (random offset) is promoted to the next
+    level, where each value stands for twice as many inputs. Memory stays
+    around ``k * log2(n / k)`` values; the rank error is a few ``1/k``.
+    """
+
+    def __init__(self, k=4096, seed=0):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            buf = self.levels[level]
+            if len(buf) > self.k:
+                buf = np.sort(buf)
+                # An odd value out stays on this level
+                keep, buf = (buf[-1:], buf[:-1]) if len(buf) % 2 else (buf[:0], buf)
+                promoted = buf[self._rng.integers(2)::2]
+                self.levels[level] = keep
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def merge(self, other):
+        for level, buf in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], buf])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def quantile(self, q, extra_value=None, extra_count=0):
+        """
+        Approximate quantile(s) ``q`` of everything seen so far.
+
+        Args:
+            q: Quantile or array of quantiles in [0, 1]
+            extra_value: Optional point mass added to the distribution
+                (used for rows whose missing value is imputed)
+            extra_count: Number of rows in that point mass
+        """
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(buf), 2.0 ** i) for i, buf in enumerate(self.levels)])
+        if extra_count:
+            values = np.append(values, extra_value)
+            weights = np.append(weights, float(extra_count))
+        if not len(values):
+            return np.full(np.shape(q), np.nan)
+
+        order = np.argsort(values, kind='stable')
+        values, cumulative = values[order], np.cumsum(weights[order])
+        ranks = np.asarray(q) * cumulative[-1]
+        return values[np.minimum(np.searchsorted(cumulative, ranks), len(values) - 1)]
+
+
+class StreamingMetrics:
+    """Accuracy, log loss and binned ROC AUC accumulated over mini-batches."""
+
+    def __init__(self):
+        self.n = 0
+        self.correct = 0
+        self.log_loss = 0.0
+        self.pos = np.zeros(AUC_BINS)
+        self.neg = np.zeros(AUC_BINS)
+
+    def update(self, y, proba):
+        y = np.asarray(y)
+        p = np.clip(proba, 1e-15, 1 - 1e-15)
+        self.n += len(y)
+        self.correct += int(((proba >= 0.5).astype(int) == y).sum())
+        self.log_loss += float(-(y * np.log(p) + (1 - y) * np.log(1 - p)).sum())
+        bins = np.minimum((proba * AUC_BINS).astype(int), AUC_BINS - 1)
+        self.pos += np.bincount(bins[y == 1], minlength=AUC_BINS)
+        self.neg += np.bincount(bins[y == 0], minlength=AUC_BINS)
+
+    def result(self):
+        if not self.n:
+            return {}
+        # P(score_pos > score_neg) with ties counted half, from the bin counts
+        neg_below = np.cumsum(self.neg) - self.neg
+        pairs = self.pos.sum() * self.neg.sum()
+        auc = float((self.pos * (neg_below + 0.5 * self.neg)).sum() / pairs) if pairs else float('nan')
+        return {
+            'accuracy': self.correct / self.n,
+            'log_loss': self.log_loss / self.n,
+            'roc_auc': auc,
+            'rows': self.n,
+        }
+
+
+def _is_test(row_index, test_size):
+    # Knuth multiplicative hash of the row position: stable across passes
+    return ((row_index.astype(np.uint64) * np.uint64(2654435761)) % np.uint64(2 ** 32)) < test_size * 2 ** 32
+
+
+def iter_chunks(disease, source, chunksize=DEFAULT_CHUNKSIZE, test_size=0.2):
+    """
+    Stream (X_raw, y, is_test) chunks of a disease CSV.
+
+    Renames and training row filters are applied per chunk through
+    predictions.preprocessing.prepare_frame.
+    """
+    import pandas as pd
+
+    offset = 0
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        row_index = np.arange(offset, offset + len(chunk))
+        offset += len(chunk)
+        chunk.index = row_index
+        X, y = prepare_frame(disease, chunk)
+        yield (
+            X.to_numpy(dtype=np.float64),
+            y.to_numpy(),
+            _is_test(X.index.to_numpy(), test_size),
+        )
+
+
+def fit_statistics(disease, source, chunksize=DEFAULT_CHUNKSIZE, test_size=0.2,
+                   sketch_size=4096, random_state=42):
+    """
+    One pass over the training rows: Preprocessor, class counts and a sample.
+
+    Returns:
+        tuple: (fitted Preprocessor, {class: count}, (X_sample, y_sample))
+    """
+    preprocessor = Preprocessor.for_disease(disease)
+    n_features = len(preprocessor.features)
+    sketches = [QuantileSketch(sketch_size, seed=random_state + i) for i in range(n_features)]
+    missing = np.zeros(n_features, dtype=np.int64)
+    class_counts = {}
+
+    rng = np.random.default_rng(random_state)
+    sample_X = np.empty((0, n_features))
+    sample_y = np.empty(0, dtype=np.int64)
+    seen = 0
+
+    for X, y, is_test in iter_chunks(disease, source, chunksize, test_size):
+        X, y = X[~is_test], y[~is_test]
+        is_missing = preprocessor._missing(X)
+        missing += is_missing.sum(axis=0)
+        for i, sketch in enumerate(sketches):
+            sketch.update(X[~is_missing[:, i], i])
+        for cls, count in zip(*np.unique(y, return_counts=True)):
+            class_counts[int(cls)] = class_counts.get(int(cls), 0) + int(count)
+
+        # Reservoir sample: every row ends up in it with equal probability
+        if len(sample_y) < RESERVOIR_ROWS:
+            take = min(RESERVOIR_ROWS - len(sample_y), len(y))
+            sample_X = np.vstack([sample_X, X[:take]])
+            sample_y = np.concatenate([sample_y, y[:take]])
+            X, y = X[take:], y[take:]
+            seen += take
+        if len(y):
+            slots = rng.integers(0, seen + np.arange(1, len(y) + 1))
+            replace = slots < RESERVOIR_ROWS
+            sample_X[slots[replace]] = X[replace]
+            sample_y[slots[replace]] = y[replace]
+            seen += len(y)
+
+    impute = np.array([sketch.quantile(0.5) for sketch in sketches])
+    preprocessor.impute = impute
+
+    # Quantiles of the cleaned values: the imputed rows are a point mass at
+    # the median, and clipping is monotonic so it commutes with quantiles
+    quartiles = np.array([
+        sketch.quantile([0.25, 0.5, 0.75], extra_value=impute[i], extra_count=missing[i])
+        for i, sketch in enumerate(sketches)
+    ])
+    quartiles = np.clip(quartiles, preprocessor.lower[:, None], preprocessor.upper[:, None])
+    preprocessor.center_ = quartiles[:, 1]
+    scale = quartiles[:, 2] - quartiles[:, 0]
+    preprocessor.scale_ = np.where(scale == 0, 1.0, scale)
+
+    return preprocessor, class_counts, (sample_X, sample_y)
+
+
+def candidates(random_state=42):
+    """Estimators that can learn from one mini-batch at a time."""
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.naive_bayes import GaussianNB
+
+    return {
+        "SGD Logistic Regression": SGDClassifier(
+            loss="log_loss", alpha=1e-4, learning_rate="optimal", random_state=random_state
+        ),
+        "Gaussian Naive Bayes": GaussianNB(),
+    }
+
+
+def train_streaming(disease, source=None, chunksize=DEFAULT_CHUNKSIZE, epochs=3,
+                    test_size=0.2, ml_dir=ML_DIR, save=True, random_state=42, log=print,
+                    publish_dir=None):
+    """
+    Train ``disease`` from a CSV that need not fit in memory.
+
+    Args:
+        source: CSV path (default: the disease CSV in ``ml_dir``)
+        chunksize: Rows read per chunk; bounds peak memory
+        epochs: Passes over the training rows for the SGD candidate
+            (naive Bayes statistics are exact after the first)
+        publish_dir: Write the artifacts here instead of ``ml_dir``
+
+    Returns:
+        dict: Same shape as predictions.training.train
+    """
+    import pandas as pd
+
+    from .training import save_model
+
+    source = Path(source) if source else Path(ml_dir) / SPECS[disease]['csv']
+    started = time.perf_counter()
+
+    preprocessor, class_counts, (sample_X, sample_y) = fit_statistics(
+        disease, source, chunksize, test_size, random_state=random_state
+    )
+    n_train = sum(class_counts.values())
+    log(f"   statistics pass: {n_train} training rows, classes {class_counts}")
+
+    classes = np.array(sorted(class_counts))
+    # Balanced weights: n / (n_classes * count)
+    class_weight = np.array([n_train / (len(classes) * class_counts[c]) for c in classes])
+    models = candidates(random_state)
+
+    rng = np.random.default_rng(random_state)
+    for epoch in range(epochs):
+        for X, y, is_test in iter_chunks(disease, source, chunksize, test_size):
+            X, y = preprocessor.transform(X[~is_test]), y[~is_test]
+            if not len(y):
+                continue
+            order = rng.permutation(len(y))
+            X, y = X[order], y[order]
+            weights = class_weight[np.searchsorted(classes, y)]
+            for name, model in models.items():
+                if epoch > 0 and name == "Gaussian Naive Bayes":
+                    continue
+                model.partial_fit(X, y, classes=classes, sample_weight=weights)
+        log(f"   epoch {epoch + 1}/{epochs} done")
+
+    evaluation = {name: StreamingMetrics() for name in models}
+    for X, y, is_test in iter_chunks(disease, source, chunksize, test_size):
+        if not is_test.any():
+            continue
+        X_test = preprocessor.transform(X[is_test])
+        for name, model in models.items():
+            evaluation[name].update(y[is_test], model.predict_proba(X_test)[:, 1])
+
+    leaderboard = sorted(
+        ((name, {}, m.result().get('roc_auc', float('nan')), m.result().get('rows', 0))
+         for name, m in evaluation.items()),
+        key=lambda item: -item[2],
+    )
+    best_name = leaderboard[0][0]
+    best = evaluation[best_name].result()
+    metrics = {
+        'model': best_name,
+        'mode': "streaming",
+        'chunksize': chunksize,
+        'epochs': epochs,
+        'accuracy': best.get('accuracy'),
+        'roc_auc': best.get('roc_auc'),
+        'log_loss': best.get('log_loss'),
+        'train_rows': n_train,
+        'test_rows': best.get('rows', 0),
+    }
+
+    version = None
+    if save:
+        sample = pd.DataFrame(sample_X, columns=preprocessor.features)
+        version = save_model(
+            disease, models[best_name], preprocessor, sample, pd.Series(sample_y), metrics,
+            publish_dir or ml_dir, training_data_path=source,
+        )
+
+    return {
+        'best': {'name': best_name, 'leaderboard': leaderboard},
+        'metrics': metrics,
+        'search_seconds': time.perf_counter() - started,
+        'total_seconds': time.perf_counter() - started,
+        'version': version,
+    }
@@ -0,0 +1,54 @@
+"""
+Background work that must stay off the request path.
+
+The project has no external task queue, so jobs run on a small in-process
+thread pool. Each job closes its own database connection when it finishes.
+
+Settings (optional):
+    BACKGROUND_WORKERS: Number of worker threads (default 2)
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import metrics
+
+DEFAULT_WORKERS = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'BACKGROUND_WORKERS', DEFAULT_WORKERS),
+                thread_name_prefix="medpredict-bg",
+            )
+        return _executor
+
+
+def _run(fn, args, kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        print(f"Background task {fn.__name__} failed: {e}")
+        metrics.incr('tasks.failed')
+        raise
+    finally:
+        connection.close()
+
+
+def submit(fn, *args, **kwargs):
+    """Run ``fn(*args, **kwargs)`` on the background pool and return its future."""
+    metrics.incr('tasks.submitted')
+    return _get_executor().submit(_run, fn, args, kwargs)
+
+
+def submit_on_commit(fn, *args, **kwargs):
+    """Submit ``fn`` once the current transaction commits, so it sees saved rows."""
+    transaction.on_commit(lambda: submit(fn, *args, **kwargs))
@@ -1,3 +1,677 @@
-from django.test import TestCase
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Doctor, Patient
+from predictions import (
+    bundle, datasets, distillation, evaluation, observations, patient_state, preprocessing, registry, streaming,
+    timeseries, trends, units,
+)
+from predictions.models import LabObservation, PatientState, Prediction, PredictionFeature, RiskTrend
+
+# Heavy scientific modules must not load during django.setup() or URL import
+HEAVY_MODULES = ["numpy", "pandas", "joblib", "sklearn", "shap", "numba", "matplotlib"]
+
+# Generous budget for the summed self-import time (seconds); override via env
+IMPORT_TIME_BUDGET = float(os.environ.get("IMPORT_TIME_BUDGET", "1.0"))
+
+STARTUP_SCRIPT = (
+    "import os, sys;"
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medpredict.settings');"
+    "import django; django.setup();"
+    "import medpredict.urls;"
+    "print(','.join(m for m in {heavy!r} if m in sys.modules))"
+)
+
+
+def run_importtime():
+    """Run django.setup() + URL import under -X importtime in a fresh interpreter."""
+    script = STARTUP_SCRIPT.format(heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        capture_output=True, text=True, cwd=settings.BASE_DIR,
+    )
+    if result.returncode != 0:
+        raise AssertionError(result.stderr[-2000:])
+
+    total_us = 0
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        self_us = line.split(":", 1)[1].split("|")[0].strip()
+        if self_us.isdigit():
+            total_us += int(self_us)
+
+    loaded = [m for m in result.stdout.strip().split(",") if m]
+    return total_us / 1e6, loaded
+
+
+class StartupImportTimeTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.import_seconds, cls.loaded = run_importtime()
+
+    def test_heavy_modules_are_deferred(self):
+        self.assertEqual(self.loaded, [], f"Loaded at startup: {self.loaded}")
+
+    def test_startup_import_time_within_budget(self):
+        self.assertLess(
+            self.import_seconds, IMPORT_TIME_BUDGET,
+            f"django.setup() imports took {self.import_seconds:.2f}s "
+            f"(budget {IMPORT_TIME_BUDGET:.2f}s)"
+        )
+
+
+class CohortQueryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.patients = []
+        # (creatinine, glucose) per visit, oldest first
+        for name, visits in [("a", [(2.5, 200), (1.0, 90)]), ("b", [(1.0, 90), (2.5, 200)]), ("c", [(3.0, 120)])]:
+            user = User.objects.create_user(username=name, password="x")
+            patient = Patient.objects.create(user=user, gender="Female", age=60)
+            for i, (creatinine, glucose) in enumerate(visits):
+                prediction = Prediction.objects.create(patient=patient, approval_status="Approved")
+                prediction.created_at = now - timedelta(days=len(visits) - i)
+                observations.record(prediction, {
+                    "Kidney_Creatinine": creatinine, "Diabetes_Glucose": glucose, "Kidney_Sodium": "",
+                })
+            cls.patients.append(patient)
+        # A newer reading of "a" that no doctor has approved yet
+        pending = Prediction.objects.create(patient=cls.patients[0])
+        observations.record(pending, {"Kidney_Creatinine": 4.0})
+
+    def ids(self, query, latest=True):
+        return {p.user.username for p in observations.cohort(observations.parse(query), latest).select_related("user")}
+
+    def test_parse(self):
+        self.assertEqual(
+            observations.parse("Creatinine > 2, glucose>=180.5 and egfr < 30"),
+            [("creatinine", ">", 2.0), ("glucose", ">=", 180.5), ("egfr", "<", 30.0)],
+        )
+        for query in ("creatinine >> 2", "ldl > 100"):
+            with self.assertRaises(ValueError):
+                observations.parse(query)
+
+    def test_latest_reading_decides(self):
+        self.assertEqual(self.ids("creatinine > 2"), {"b", "c"})
+        self.assertEqual(self.ids("creatinine > 2 and glucose > 180"), {"b"})
+
+    def test_any_reading(self):
+        self.assertEqual(self.ids("creatinine > 2 and glucose > 180", latest=False), {"a", "b"})
+
+    def test_only_approved_readings_count_by_default(self):
+        condition = observations.parse("creatinine > 3.5")
+        self.assertEqual(self.ids("creatinine > 3.5"), set())
+        unreviewed = observations.cohort(condition, approved=False).select_related("user")
+        self.assertEqual({p.user.username for p in unreviewed}, {"a"})
+        a = self.patients[0].id
+        self.assertEqual(observations.latest_values([a], ["creatinine"])[a]["creatinine"][0], 1.0)
+        self.assertEqual(observations.latest_values([a], ["creatinine"], approved=False)[a]["creatinine"][0], 4.0)
+
+    def test_unparseable_values_are_skipped(self):
+        self.assertFalse(observations.matching(observations.parse("sodium > 0")[0], latest=False).exists())
+
+
+class PatientStateTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="p", password="x")
+        self.patient = Patient.objects.create(user=user, gender="Male", age=50)
+
+    def predict(self, status, diabetes_risk, days_ago, creatinine=None):
+        prediction = Prediction.objects.create(
+            patient=self.patient, approval_status=status, diabetes_risk=diabetes_risk, kidney_risk="Low",
+        )
+        Prediction.objects.filter(id=prediction.id).update(created_at=timezone.now() - timedelta(days=days_ago))
+        prediction.refresh_from_db()
+        if creatinine is not None:
+            observations.record(prediction, {"Kidney_Creatinine": creatinine})
+        patient_state.refresh(self.patient.id)
+        return prediction
+
+    def state(self):
+        return PatientState.objects.get(patient=self.patient)
+
+    def test_empty_patient(self):
+        state = patient_state.get(self.patient)
+        self.assertIsNone(state.latest_approved)
+        self.assertEqual((state.prediction_count, state.last_activity), (0, None))
+
+    def test_tracks_latest_approved_and_counts(self):
+        older = self.predict("Approved", "High", 3, creatinine=2.1)
+        newer = self.predict("Approved", "Low", 2, creatinine=1.0)
+        pending = self.predict("Pending", "Medium", 1)
+        state = self.state()
+        self.assertEqual(state.latest_approved_id, newer.id)
+        self.assertEqual((state.diabetes_risk, state.creatinine), ("Low", 1.0))
+        self.assertEqual((state.prediction_count, state.approved_count, state.pending_count), (3, 2, 1))
+        self.assertEqual((state.diabetes_low, state.diabetes_high, state.kidney_low), (1, 1, 2))
+        self.assertEqual(state.last_activity, pending.created_at)
+
+        # Rejecting the newest approved one falls back to the previous
+        newer.approval_status = "Rejected"
+        newer.save()
+        patient_state.refresh(self.patient.id)
+        state = self.state()
+        self.assertEqual((state.latest_approved_id, state.diabetes_risk, state.creatinine), (older.id, "High", 2.1))
+
+        older.delete()
+        patient_state.refresh(self.patient.id)
+        state = self.state()
+        self.assertIsNone(state.latest_approved_id)
+        self.assertEqual((state.diabetes_risk, state.approved_count, state.prediction_count), ("", 0, 2))
+
+    def test_patient_dashboard_counts_only_approved(self):
+        self.patient.is_verified = True
+        self.patient.save()
+        self.predict("Approved", "Low", 2)
+        self.predict("Pending", "High", 1)
+        self.client.login(username="p", password="x")
+        response = self.client.get(reverse("patient_dashboard"))
+        self.assertEqual((response.context["total_predictions"], response.context["pending_count"]), (1, 0))
+        self.assertEqual(response.context["last_diabetes_risk"], "Low")
+
+    def test_states_creates_missing_rows(self):
+        self.predict("Approved", "Medium", 1)
+        PatientState.objects.all().delete()
+        states = patient_state.states([self.patient.id])
+        self.assertEqual(states[self.patient.id].diabetes_medium, 1)
+        self.assertTrue(PatientState.objects.filter(patient=self.patient).exists())
+
+
+class CreatePredictionTests(TestCase):
+    LABS = {"age": "50", "bmi": "31", "glucose": "160", "blood_pressure": "130/85", "creatinine": "2.1"}
+
+    def setUp(self):
+        user = User.objects.create_user(username="p", password="x")
+        self.patient = Patient.objects.create(user=user, gender="Female", age=50, is_verified=True)
+        doctor_user = User.objects.create_user(username="d", password="x")
+        Doctor.objects.create(user=doctor_user)
+        self.client.login(username="d", password="x")
+        self.url = reverse("create_prediction", args=[self.patient.id])
+
+    def saved_features(self, prediction):
+        return {f.feature_name: f.feature_value for f in PredictionFeature.objects.filter(prediction=prediction)}
+
+    def test_entered_zeros_are_clipped(self):
+        self.client.post(self.url, {**self.LABS, "bmi": "0", "glucose": "0", "blood_pressure": "0"})
+        features = self.saved_features(Prediction.objects.get())
+        self.assertEqual(
+            (features["Diabetes_BMI"], features["Diabetes_Glucose"], features["Diabetes_BloodPressure"]),
+            ("10.0", "70.0", "40.0"),
+        )
+
+    def test_preprocessing_failure_degrades_one_disease(self):
+        with mock.patch.object(preprocessing.Preprocessor, "transform", side_effect=ValueError("bad")):
+            response = self.client.post(self.url, self.LABS)
+        prediction = Prediction.objects.get()
+        self.assertRedirects(response, reverse("review_prediction", args=[prediction.id]), fetch_redirect_response=False)
+        self.assertEqual(prediction.diabetes_risk, "Error")
+        self.assertEqual(self.saved_features(prediction)["Diabetes_Glucose"], "160.0")
+
+    def test_writes_roll_back_together(self):
+        with mock.patch("predictions.views.patient_state.refresh", side_effect=RuntimeError("down")):
+            response = self.client.post(self.url, self.LABS)
+        self.assertContains(response, "Error creating prediction")
+        self.assertFalse(Prediction.objects.exists())
+        self.assertFalse(PredictionFeature.objects.exists())
+        self.assertFalse(LabObservation.objects.exists())
+
+    def test_explanations_and_shadow_start_after_commit(self):
+        with mock.patch("predictions.views.schedule_explanations") as explain, \
+                mock.patch("predictions.views.schedule_shadow") as shadow, \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post(self.url, self.LABS)
+            explain.assert_not_called()
+            shadow.assert_not_called()
+        prediction = Prediction.objects.get()
+        self.assertEqual(len(callbacks), 2)
+        explain.assert_called_once_with(prediction)
+        self.assertEqual(shadow.call_args.args[0], prediction)
+        self.assertEqual(PatientState.objects.get(patient=self.patient).pending_count, 1)
+
+
+class RegenerateRecommendationsTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="p", password="x")
+        patient = Patient.objects.create(user=user, gender="Female", age=50)
+        self.edited, self.plain = [
+            Prediction.objects.create(
+                patient=patient, diabetes_risk="High", kidney_risk="Low", reviewed_at=timezone.now(),
+                recommendation_text=text,
+            )
+            for text in ("<p>Edited by the doctor</p>", None)
+        ]
+        for prediction in (self.edited, self.plain):
+            PredictionFeature.objects.create(prediction=prediction, feature_name="Diabetes_Glucose", feature_value="180")
+
+    def regenerate(self, *args):
+        call_command("regenerate_recommendations", "--include-reviewed", *args, stdout=StringIO())
+        self.edited.refresh_from_db()
+        self.plain.refresh_from_db()
+
+    def test_edited_text_is_kept_unless_discarded(self):
+        self.regenerate()
+        self.assertEqual(self.edited.recommendation_text, "<p>Edited by the doctor</p>")
+        self.assertIsNone(self.edited.recommendation_data)
+        self.assertIsNotNone(self.plain.recommendation_data)
+
+        self.regenerate("--discard-edits")
+        self.assertIsNone(self.edited.recommendation_text)
+        self.assertIsNotNone(self.edited.recommendation_data)
+
+
+class TimeSeriesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="p", password="x")
+        cls.patient = Patient.objects.create(user=user, gender="Male", age=50)
+        start = timezone.now() - timedelta(days=100)
+        for day in range(100):
+            status = "Rejected" if day == 50 else "Approved"
+            prediction = Prediction.objects.create(patient=cls.patient, approval_status=status,
+                                                   diabetes_probability=day % 10)
+            Prediction.objects.filter(id=prediction.id).update(created_at=start + timedelta(days=day))
+            prediction.refresh_from_db()
+            observations.record(prediction, {"Kidney_Creatinine": 9.0 if day == 37 else 1.0})
+        User.objects.create_user(username="other", password="x")
+
+    def test_lttb_keeps_budget_endpoints_and_peaks(self):
+        t = list(range(1000))
+        v = [0.0] * 1000
+        v[500] = 10.0
+        kept = timeseries.lttb(t, v, 50)
+        self.assertEqual(len(kept), 50)
+        self.assertEqual((kept[0], kept[-1]), (0, 999))
+        self.assertIn(500, kept)
+        self.assertEqual(kept, sorted(kept))
+        self.assertEqual(timeseries.lttb(t[:10], v[:10], 50), list(range(10)))
+
+    def test_raw_series_is_downsampled(self):
+        data = timeseries.series(self.patient.id, ["creatinine", "diabetes"], points=20)
+        creatinine = data["creatinine"]
+        self.assertEqual(creatinine["count"], 99)  # the rejected prediction is left out
+        self.assertEqual(len(creatinine["t"]), 20)
+        self.assertIn(9.0, creatinine["v"])
+        self.assertEqual(creatinine["t"], sorted(creatinine["t"]))
+
+    def test_buckets_aggregate_in_sql(self):
+        data = timeseries.series(self.patient.id, ["diabetes"], bucket="month")["diabetes"]
+        self.assertLessEqual(data["count"], 5)
+        for low, mean, high in zip(data["lo"], data["v"], data["hi"]):
+            self.assertLessEqual(low, mean)
+            self.assertLessEqual(mean, high)
+        with self.assertRaises(ValueError):
+            timeseries.series(self.patient.id, ["diabetes"], bucket="year")
+
+    def test_view(self):
+        url = reverse("patient_series", args=[self.patient.id])
+        self.client.login(username="p", password="x")
+        response = self.client.get(url, {"series": "creatinine", "bucket": "week", "points": 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["series"]["creatinine"]["t"]), 10)
+        self.assertEqual(self.client.get(url, {"series": "ldl"}).status_code, 400)
+
+        self.client.login(username="other", password="x")
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class RiskTrendTests(TestCase):
+    VALUES = [20.0, 30.0, 25.0, 45.0, 60.0]
+
+    def setUp(self):
+        user = User.objects.create_user(username="p", password="x")
+        self.patient = Patient.objects.create(user=user, gender="Male", age=50)
+
+    def test_fold_matches_batch_statistics(self):
+        trend = RiskTrend(patient=self.patient, disease="diabetes")
+        for value in self.VALUES:
+            trends.fold(trend, value, timezone.now())
+        self.assertEqual(trend.count, 5)
+        self.assertAlmostEqual(trend.mean, sum(self.VALUES) / 5)
+        self.assertEqual((trend.max_value, trend.last_value, trend.last_delta), (60.0, 60.0, 15.0))
+
+        slope = 10.0
+        for delta in (-5.0, 20.0, 15.0):
+            slope = trends.TREND_ALPHA * delta + (1 - trends.TREND_ALPHA) * slope
+        self.assertAlmostEqual(trend.slope, slope)
+        self.assertEqual(trends.direction(trend), "rising")
+
+    def test_approval_updates_and_rebuild_agrees(self):
+        doctor_user = User.objects.create_user(username="d", password="x")
+        Doctor.objects.create(user=doctor_user)
+        self.client.login(username="d", password="x")
+        start = timezone.now() - timedelta(days=10)
+        for i, value in enumerate(self.VALUES):
+            prediction = Prediction.objects.create(patient=self.patient, diabetes_probability=value)
+            Prediction.objects.filter(id=prediction.id).update(created_at=start + timedelta(days=i))
+            url = reverse("review_prediction", args=[prediction.id])
+            self.client.post(url, {"action": "approve", "recommendation_text": "ok"})
+        # Approving again does not count twice
+        self.client.post(url, {"action": "approve", "recommendation_text": "ok"})
+
+        live = RiskTrend.objects.get(patient=self.patient, disease="diabetes")
+        self.assertEqual(live.count, 5)
+        self.assertFalse(RiskTrend.objects.filter(disease="kidney").exists())
+
+        RiskTrend.objects.all().delete()
+        call_command("rebuild_risk_trends", stdout=StringIO())
+        rebuilt = RiskTrend.objects.get(patient=self.patient, disease="diabetes")
+        for field in trends.STATS:
+            self.assertAlmostEqual(getattr(rebuilt, field), getattr(live, field))
+
+    def test_out_of_order_approval_matches_rebuild(self):
+        doctor_user = User.objects.create_user(username="d", password="x")
+        Doctor.objects.create(user=doctor_user)
+        self.client.login(username="d", password="x")
+        start = timezone.now() - timedelta(days=10)
+        predictions = []
+        for i, value in enumerate(self.VALUES):
+            prediction = Prediction.objects.create(patient=self.patient, diabetes_probability=value)
+            Prediction.objects.filter(id=prediction.id).update(created_at=start + timedelta(days=i))
+            predictions.append(prediction)
+        # The newest is approved before two older ones
+        for prediction in [predictions[0], predictions[4], predictions[2], predictions[1], predictions[3]]:
+            self.client.post(reverse("review_prediction", args=[prediction.id]), {"action": "approve"})
+
+        live = RiskTrend.objects.get(patient=self.patient, disease="diabetes")
+        self.assertEqual((live.count, live.last_value, live.last_delta), (5, 60.0, 15.0))
+        rebuilt = trends.history(self.patient.id, "diabetes")
+        for field in trends.STATS:
+            self.assertAlmostEqual(getattr(live, field), getattr(rebuilt, field))
+
+    def test_concurrent_approvals_fold_once(self):
+        doctor_user = User.objects.create_user(username="d", password="x")
+        Doctor.objects.create(user=doctor_user)
+        self.client.login(username="d", password="x")
+        prediction = Prediction.objects.create(patient=self.patient, diabetes_probability=40.0)
+        # A second request that loaded the prediction before the first approved it
+        stale = Prediction.objects.get(id=prediction.id)
+        self.client.post(reverse("review_prediction", args=[prediction.id]), {"action": "approve"})
+        with mock.patch("predictions.views.get_object_or_404", return_value=stale):
+            self.client.post(reverse("review_prediction", args=[prediction.id]), {"action": "approve"})
+        with mock.patch("dashboard.views.get_object_or_404", return_value=stale):
+            self.client.post(reverse("approve_prediction", args=[prediction.id]), {"text": "ok"})
+        self.assertEqual(RiskTrend.objects.get(patient=self.patient, disease="diabetes").count, 1)
+
+    def test_reject_and_delete_recompute_trends(self):
+        from django.contrib.admin.sites import site
+
+        doctor_user = User.objects.create_user(username="d", password="x")
+        Doctor.objects.create(user=doctor_user)
+        self.client.login(username="d", password="x")
+        start = timezone.now() - timedelta(days=10)
+        predictions = []
+        for i, value in enumerate(self.VALUES[:4]):
+            prediction = Prediction.objects.create(patient=self.patient, diabetes_probability=value)
+            Prediction.objects.filter(id=prediction.id).update(created_at=start + timedelta(days=i))
+            self.client.post(reverse("review_prediction", args=[prediction.id]), {"action": "approve"})
+            predictions.append(prediction)
+
+        def assert_matches_history():
+            live = RiskTrend.objects.get(patient=self.patient, disease="diabetes")
+            rebuilt = trends.history(self.patient.id, "diabetes")
+            for field in trends.STATS:
+                self.assertAlmostEqual(getattr(live, field), getattr(rebuilt, field))
+            return live
+
+        self.client.post(reverse("review_prediction", args=[predictions[3].id]), {"action": "reject"})
+        self.assertEqual(assert_matches_history().last_value, 25.0)
+        self.client.post(reverse("reject_prediction", args=[predictions[1].id]))
+        self.assertEqual(assert_matches_history().count, 2)
+
+        admin = site._registry[Prediction]
+        admin.delete_model(None, Prediction.objects.get(id=predictions[2].id))
+        self.assertEqual(assert_matches_history().count, 1)
+        admin.delete_queryset(None, Prediction.objects.filter(id=predictions[0].id))
+        self.assertFalse(RiskTrend.objects.filter(patient=self.patient).exists())
+
+
+class ReviewRecommendationTests(TestCase):
+    def setUp(self):
+        from recommendations.engine import ITEMS
+
+        user = User.objects.create_user(username="p", password="x")
+        patient = Patient.objects.create(user=user, gender="Male", age=50)
+        doctor_user = User.objects.create_user(username="d", password="x")
+        Doctor.objects.create(user=doctor_user)
+        self.client.login(username="d", password="x")
+        self.prediction = Prediction.objects.create(
+            patient=patient, diabetes_probability=40.0,
+            recommendation_data={"sections": [{"id": "summary", "items": [next(iter(ITEMS))]}]},
+        )
+        self.url = reverse("review_prediction", args=[self.prediction.id])
+
+    def approve(self, **post):
+        self.client.post(self.url, {"action": "approve", **post})
+        self.prediction.refresh_from_db()
+        return self.prediction
+
+    def test_unedited_approval_keeps_rendering_the_data(self):
+        from recommendations.rendering import recommendation_html
+
+        # What the editor was pre-filled with, re-indented as an editor would
+        rendered = recommendation_html(self.prediction).replace("><", ">\n  <")
+        self.assertIsNone(self.approve(recommendation_text=rendered).recommendation_text)
+        self.assertIsNone(self.approve(recommendation_text="<p>x</p>", recommendation_edited="0").recommendation_text)
+
+    def test_edited_text_is_stored(self):
+        self.assertEqual(self.approve(recommendation_text="<p>Edited</p>").recommendation_text, "<p>Edited</p>")
+        self.assertEqual(
+            self.approve(recommendation_text="<p>Again</p>", recommendation_edited="1").recommendation_text,
+            "<p>Again</p>",
+        )
+
+
+class BundleTests(SimpleTestCase):
+
+    def test_bundle_matches_pickled_model(self):
+        import joblib
+        import numpy as np
+
+        rng = np.random.default_rng(0)
+        for name in registry.MODEL_FILES:
+            with self.subTest(model=name):
+                loaded = bundle.load_bundle(bundle.bundle_path(name))
+                model = joblib.load(bundle.ML_DIR / registry.MODEL_FILES[name])
+                X = rng.normal(0, 2, size=(200, len(loaded.features)))
+                np.testing.assert_allclose(loaded.model.predict_proba(X), model.predict_proba(X), atol=1e-9)
+                np.testing.assert_array_equal(loaded.model.predict(X), model.predict(X))
+
+    def test_file_hash_follows_content(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "model.pkl"
+            path.write_bytes(b"one")
+            first = bundle.file_hash(path)
+            self.assertEqual(bundle.file_hash(path), first)
+            path.write_bytes(b"three")
+            self.assertNotEqual(bundle.file_hash(path), first)
+
+
+class PreprocessorTests(SimpleTestCase):
+
+    def fitted(self):
+        import numpy as np
+
+        rng = np.random.default_rng(1)
+        pre = preprocessing.Preprocessor.for_disease("diabetes")
+        X = rng.normal([45, 30, 70, 120], [12, 6, 10, 30], size=(300, 4))
+        X[::7, 1] = 0  # zero BMI reads as missing
+        X[::11, 3] = np.nan
+        return pre.fit(X), X
+
+    def test_dict_round_trip(self):
+        import json
+        import numpy as np
+
+        pre, X = self.fitted()
+        restored = preprocessing.Preprocessor.from_dict(json.loads(json.dumps(pre.to_dict())))
+        np.testing.assert_array_equal(restored.transform(X), pre.transform(X))
+        self.assertEqual(restored.to_dict(), pre.to_dict())
+
+    def test_inputs_agree_and_missing_values_are_imputed(self):
+        import numpy as np
+        import pandas as pd
+
+        pre, X = self.fitted()
+        row = dict(zip(pre.features, X[0]))
+        frame = pd.DataFrame(X[:1], columns=pre.features)
+        np.testing.assert_array_equal(pre.transform(row), pre.transform(X[:1]))
+        np.testing.assert_array_equal(pre.transform(frame), pre.transform(X[:1]))
+
+        clean = pre.clean({**row, "BMI": 0, "Glucose": None})
+        self.assertEqual(clean[0, 1], pre.impute[1])
+        self.assertEqual(clean[0, 3], pre.impute[3])
+
+    def test_serving_clips_zeros_instead_of_imputing(self):
+        pre, X = self.fitted()
+        row = {"Age": 40, "BMI": 0, "BloodPressure": 0, "Glucose": 0}
+        self.assertEqual(pre.clean(row, zero_as_missing=False)[0].tolist(), [40, 10, 40, 70])
+        self.assertEqual(pre.clean(row)[0].tolist(), [40, *pre.impute[1:]])
+
+    def test_scaling_matches_robust_scaler(self):
+        import numpy as np
+        from sklearn.preprocessing import RobustScaler
+
+        pre, X = self.fitted()
+        clean = pre.clean(X)
+        np.testing.assert_allclose(pre.transform(X), RobustScaler().fit(clean).transform(clean))
+
+
+class DatasetCacheTests(SimpleTestCase):
+
+    def test_text_columns_round_trip(self):
+        import numpy as np
+
+        with tempfile.TemporaryDirectory() as directory:
+            Path(directory, "labs.csv").write_text("Glucose,rbc,Outcome\n120,normal,1\n95,,0\n,abnormal,1\n")
+            for _ in range(2):  # written, then read from the cache
+                table = datasets.load_table("labs.csv", ml_dir=directory)
+                self.assertEqual(list(table.columns), ["Glucose", "rbc", "Outcome"])
+                self.assertEqual(table["rbc"].tolist()[::2], ["normal", "abnormal"])
+                self.assertTrue(np.isnan(table["rbc"][1]))
+                self.assertTrue(np.isnan(table["Glucose"][2]))
+            self.assertEqual(len(list(Path(directory, "cache").iterdir())), 1)
+
+    def test_unreadable_cache_file_is_not_kept(self):
+        import numpy as np
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "bad.npz"
+            with self.assertRaises(ValueError):
+                datasets._write_npz(path, {"objects": np.array([{"a": 1}], dtype=object)})
+            self.assertEqual(list(Path(directory).iterdir()), [])
+
+
+class StreamingSampleTests(SimpleTestCase):
+
+    def test_reservoir_is_uniform_with_chunks_smaller_than_it(self):
+        import numpy as np
+
+        rows = 2 * streaming.RESERVOIR_ROWS + 1000
+        with tempfile.TemporaryDirectory() as directory:
+            source = Path(directory) / "diabetes.csv"
+            # Age holds the row number, to see which rows were sampled
+            source.write_text("Age,BMI,BloodPressure,Glucose,Outcome\n" + "".join(
+                f"{i},30,70,120,{i % 2}\n" for i in range(rows)
+            ))
+            _, counts, (sample_X, _) = streaming.fit_statistics(
+                "diabetes", source, chunksize=100, test_size=0, sketch_size=64,
+            )
+        self.assertEqual(sum(counts.values()), rows)
+        ages = sample_X[:, 0]
+        self.assertEqual(len(np.unique(ages)), streaming.RESERVOIR_ROWS)
+        # Every row is kept with the same probability, so about half the
+        # sample comes from the second half of the file
+        later = (ages >= rows / 2).mean()
+        self.assertGreater(later, 0.45)
+        self.assertLess(later, 0.55)
+
+
+class UnitDetectionTests(SimpleTestCase):
+    # (analyte, value, detected unit) around every cut point; glucose and
+    # creatinine follow the original evaluation rules (glucose < 50 is
+    # mmol/L, creatinine > 20 is umol/L)
+    CASES = [
+        ('glucose', 49.9, "mmol/L"), ('glucose', 50, "mg/dL"), ('glucose', 50.1, "mg/dL"),
+        ('creatinine', 19.9, "mg/dL"), ('creatinine', 20, "mg/dL"), ('creatinine', 20.1, "umol/L"),
+        ('hemoglobin', 29.9, "g/dL"), ('hemoglobin', 30, "g/L"), ('hemoglobin', 30.1, "g/L"),
+    ]
+
+    def test_cut_points(self):
+        for name, value, unit in self.CASES:
+            with self.subTest(analyte=name, value=value):
+                self.assertEqual(units.normalize(name, value, units.AUTO).unit, unit)
+
+    def test_bound_values_are_not_converted(self):
+        self.assertEqual(units.normalize('glucose', 50, units.AUTO).value, 50.0)
+        self.assertEqual(units.normalize('creatinine', 20, units.AUTO).value, 20.0)
+
+    def test_every_cut_point_is_covered(self):
+        covered = {(name, value) for name, value, _ in self.CASES}
+        for name, analyte in units.ANALYTES.items():
+            for bound in analyte.bounds[:-1]:
+                self.assertIn((name, bound), covered)
+
+    def test_sheet_hemoglobin_is_not_converted(self):
+        import pandas as pd
+
+        sheet = pd.DataFrame({'Hemoglobin': [9.5, 35.0, 120.0]})
+        self.assertEqual(list(evaluation.prepare_kidney(sheet)['Hemoglobin']), [9.5, 35.0, 120.0])
+
+
+class DistillationTests(SimpleTestCase):
+    def test_student_must_beat_teacher_latency_and_size(self):
+        teacher = {'p99_ms': 1.0, 'artifact_bytes': 1000}
+        self.assertTrue(distillation.cheaper({'p99_ms': 0.5, 'artifact_bytes': 500}, teacher))
+        # As fast but as large, or as small but as slow, is not worth deploying
+        self.assertFalse(distillation.cheaper({'p99_ms': 0.5, 'artifact_bytes': 1000}, teacher))
+        self.assertFalse(distillation.cheaper({'p99_ms': 1.0, 'artifact_bytes': 500}, teacher))
+        self.assertFalse(distillation.cheaper({'p99_ms': 0.9, 'artifact_bytes': 900}, teacher))
+
+
+class EvaluationTests(SimpleTestCase):
+    class Recorder:
+        """A model that records the scaled rows it is asked to score."""
+
+        def predict(self, X):
+            import numpy as np
+
+            self.X = X
+            return np.zeros(len(X), dtype=int)
+
+    def test_sheet_rows_are_clipped_before_scaling(self):
+        import numpy as np
+        import pandas as pd
+        from sklearn.preprocessing import RobustScaler
+
+        sheet = pd.DataFrame({
+            "Age": [45, 45], "BMI": [0, 31], "Blood Pressure": ["120/80", "120/80"], "Glucose": [120, 600],
+        })
+        # A legacy RobustScaler, as the pickles before the shared pipeline hold
+        scaler = RobustScaler().fit(np.array([[30, 25, 60, 90], [50, 35, 80, 150], [70, 45, 100, 210]], dtype=float))
+        model = self.Recorder()
+        evaluation.evaluate_diabetes(sheet, model, scaler)
+        # BMI 0 reads as 10 and glucose 600 as 400, as in the prediction form;
+        # the old loop scaled the raw values
+        expected = scaler.transform(np.array([[45, 10, 80, 120], [45, 31, 80, 400]], dtype=float))
+        np.testing.assert_allclose(model.X, expected)
@@ -0,0 +1,201 @@
+"""
+Per-patient time series of lab values and risk probabilities for charts.
+
+    series(patient_id, ["creatinine", "diabetes"], bucket="month", points=300)
+
+The readings come from at most two queries over one patient's rows: lab
+values from LabObservation in (patient, feature, observed_at) index order,
+risk probabilities from Prediction. Only approved predictions count, as
+in the patient's own history. With a bucket ("day", "week", "month") each
+period becomes one point, the mean, with its minimum and maximum; without
+one every reading is a point. Periods are grouped in one pass over the
+ordered readings rather than with a database date-truncation, which
+SQLite evaluates through a Python function per row and which was slower
+than the grouping itself.
+
+Series longer than the point budget are downsampled with
+Largest-Triangle-Three-Buckets, which keeps the peaks and troughs a chart
+would show rather than every n-th point, so the response size (and the
+browser's drawing time) is bounded whatever the length of the history.
+Values are returned as parallel arrays of epoch seconds and numbers.
+"""
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from django.utils import timezone
+
+from .models import LabObservation, Prediction
+from .observations import FEATURES
+
+# Series name -> Prediction field (percent)
+PROBABILITIES = {
+    'diabetes': ("Diabetes risk", "diabetes_probability"),
+    'kidney': ("Kidney risk", "kidney_probability"),
+}
+
+BUCKETS = ("day", "week", "month")
+DEFAULT_SERIES = ("diabetes", "kidney", "glucose", "creatinine")
+DEFAULT_POINTS = 300
+MAX_POINTS = 2000
+
+# Decimals kept in the JSON
+PRECISION = 2
+
+
+def lttb(t, v, threshold):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept; the points between are
+    split into ``threshold - 2`` buckets and from each the point forming
+    the largest triangle with the previously kept point and the average
+    of the next bucket is kept.
+
+    Args:
+        t: x values, ascending
+        v: y values
+        threshold: points to keep
+
+    Returns:
+        list: ascending indices into t and v
+    """
+    n = len(t)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    kept = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+
+        # Average point of the next bucket (the last point for the last bucket)
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        if next_start >= n - 1:
+            avg_t, avg_v = t[n - 1], v[n - 1]
+        else:
+            size = next_end - next_start
+            avg_t = sum(t[next_start:next_end]) / size
+            avg_v = sum(v[next_start:next_end]) / size
+
+        at, av = t[a], v[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((at - avg_t) * (v[j] - av) - (at - t[j]) * (avg_v - av))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    kept.append(n - 1)
+    return kept
+
+
+def _readings(patient_id, names):
+    """
+    {name: [(datetime, value), ...]} oldest first, in at most two queries:
+    one over the patient's predictions for the probabilities, one over
+    their observations for the labs.
+    """
+    readings = {name: [] for name in names}
+    probabilities = [name for name in names if name in PROBABILITIES]
+    if probabilities:
+        fields = [PROBABILITIES[name][1] for name in probabilities]
+        rows = (
+            Prediction.objects.filter(patient_id=patient_id, approval_status="Approved")
+            .order_by("created_at").values_list("created_at", *fields)
+        )
+        for created_at, *values in rows:
+            for name, value in zip(probabilities, values):
+                if value is not None:
+                    readings[name].append((created_at, value))
+    labs = [name for name in names if name not in PROBABILITIES]
+    if labs:
+        rows = (
+            LabObservation.objects.filter(
+                patient_id=patient_id, feature__in=labs, prediction__approval_status="Approved"
+            )
+            .order_by("feature", "observed_at").values_list("feature", "observed_at", "value")
+        )
+        for feature, observed_at, value in rows:
+            readings[feature].append((observed_at, value))
+    return readings
+
+
+def _period_start(day, bucket):
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def bucketed(readings, bucket):
+    """
+    Mean, minimum and maximum of readings per day, week (from Monday) or
+    month in the current time zone.
+
+    Args:
+        readings: [(datetime, value), ...] oldest first
+        bucket: "day", "week" or "month"
+
+    Returns:
+        tuple: lists (period start in epoch seconds, mean, minimum, maximum)
+    """
+    zone = timezone.get_current_timezone()
+    t, mean, low, high = [], [], [], []
+    periods = groupby(readings, key=lambda reading: _period_start(reading[0].astimezone(zone).date(), bucket))
+    for start, group in periods:
+        values = [value for _, value in group]
+        t.append(int(datetime.combine(start, datetime.min.time(), tzinfo=zone).timestamp()))
+        mean.append(sum(values) / len(values))
+        low.append(min(values))
+        high.append(max(values))
+    return t, mean, low, high
+
+
+def series(patient_id, names=DEFAULT_SERIES, bucket=None, points=DEFAULT_POINTS):
+    """
+    Chart data of a patient.
+
+    Args:
+        patient_id: Patient id
+        names: Series names, lab features (see observations.FEATURES) or
+            "diabetes"/"kidney" for risk probabilities
+        bucket: None for every reading, or "day", "week", "month"
+        points: Point budget per series (LTTB above it)
+
+    Returns:
+        dict: {name: {"label", "unit", "count", "t", "v"[, "lo", "hi"]}},
+            "count" being the number of points before downsampling
+
+    Raises:
+        ValueError: on an unknown series or bucket
+    """
+    if bucket is not None and bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket {bucket!r}; use one of {', '.join(BUCKETS)}")
+    unknown = [name for name in names if name not in PROBABILITIES and name not in FEATURES]
+    if unknown:
+        raise ValueError(f"Unknown series {unknown[0]!r}; known: {', '.join([*PROBABILITIES, *FEATURES])}")
+    points = max(3, min(int(points), MAX_POINTS))
+
+    result = {}
+    for name, readings in _readings(patient_id, list(dict.fromkeys(names))).items():
+        label, unit = (PROBABILITIES[name][0], "%") if name in PROBABILITIES else FEATURES[name]
+        if bucket is None:
+            t = [int(moment.timestamp()) for moment, _ in readings]
+            v = [value for _, value in readings]
+            low = high = None
+        else:
+            t, v, low, high = bucketed(readings, bucket)
+        kept = lttb(t, v, points)
+        entry = {
+            "label": label, "unit": unit, "count": len(t),
+            "t": [t[i] for i in kept],
+            "v": [round(v[i], PRECISION) for i in kept],
+        }
+        if low is not None:
+            entry["lo"] = [round(low[i], PRECISION) for i in kept]
+            entry["hi"] = [round(high[i], PRECISION) for i in kept]
+        result[name] = entry
+    return result
@@ -0,0 +1,441 @@
+"""
+Training pipeline shared by ``manage.py train``.
+
+Loads a cached disease split (predictions.datasets), evaluates the
+candidate models with stratified k-fold cross-validation and refits the
+winner on the training split. Every (candidate, hyperparameters, fold) fit
+is an independent joblib task, so candidates and folds run in parallel
+across all cores instead of one model after another. With
+``halving=True`` each candidate's grid is searched by successive halving:
+all configurations start on a small subsample and only the best third
+advance to three times the rows.
+"""
+import math
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .datasets import load_split
+from .preprocessing import SPECS, Preprocessor
+
+ML_DIR = Path(__file__).resolve().parent / "ml"
+
+DISEASES = {
+    'diabetes': {
+        'model_file': "diabetes_model.pkl",
+        'scaler_file': "diab_scaler.pkl",
+        'smote': True,
+    },
+    'kidney': {
+        'model_file': "kidney_model.pkl",
+        'scaler_file': "kid_scaler.pkl",
+        'smote': False,
+    },
+}
+
+# Rows per configuration in the first successive-halving round
+HALVING_MIN_RESOURCES = 60
+
+
+def candidates(random_state=42):
+    """
+    Candidate estimators with their hyperparameter grids.
+
+    The first value of every grid is the configuration the training scripts
+    have always used, so a search without halving evaluates just that one.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.svm import SVC
+    from sklearn.tree import DecisionTreeClassifier
+
+    return {
+        "Logistic Regression": (
+            LogisticRegression(random_state=random_state, max_iter=1000),
+            {'C': [1.0, 0.1, 10.0]},
+        ),
+        "K-Nearest Neighbors": (
+            KNeighborsClassifier(n_neighbors=3),
+            {'n_neighbors': [3, 5, 11, 21], 'weights': ['uniform', 'distance']},
+        ),
+        "Decision Tree": (
+            DecisionTreeClassifier(random_state=random_state),
+            {'max_depth': [None, 4, 8], 'min_samples_leaf': [1, 5]},
+        ),
+        "Random Forest": (
+            RandomForestClassifier(random_state=random_state),
+            {'n_estimators': [100, 300], 'max_depth': [None, 8], 'min_samples_leaf': [1, 3]},
+        ),
+        "Support Vector Machine": (
+            SVC(random_state=random_state, probability=True),
+            {'C': [1.0, 0.3, 3.0], 'gamma': ['scale', 0.1]},
+        ),
+    }
+
+
+def _configurations(grid, search):
+    """All (params) combinations of ``grid``, or only the default one."""
+    from sklearn.model_selection import ParameterGrid
+
+    if not search:
+        return [{name: values[0] for name, values in grid.items()}]
+    return list(ParameterGrid(grid))
+
+
+def _resample(X, y, smote, random_state):
+    if not smote:
+        return X, y
+    try:
+        from imblearn.over_sampling import SMOTE
+    except ImportError:
+        return X, y
+    return SMOTE(random_state=random_state).fit_resample(X, y)
+
+
+def fit_model(disease, estimator, params, X, y, smote=False, random_state=42):
+    """
+    Fit the disease Preprocessor and a clone of ``estimator`` on raw (X, y).
+
+    SMOTE, when requested, is applied to the cleaned rows given here only
+    (i.e. inside each training fold), so synthetic samples never leak into
+    evaluation.
+
+    Returns:
+        tuple: (fitted model, fitted Preprocessor)
+    """
+    from sklearn.base import clone
+
+    preprocessor = Preprocessor.for_disease(disease).fit_impute(X)
+    X_clean, y = _resample(preprocessor.clean(X), np.asarray(y), smote, random_state)
+    preprocessor.fit_scale(X_clean)
+    model = clone(estimator).set_params(**params)
+    model.fit((X_clean - preprocessor.center_) / preprocessor.scale_, y)
+    return model, preprocessor
+
+
+def _score_fold(disease, estimator, params, X, y, train_idx, test_idx, scoring, smote, random_state):
+    from sklearn.metrics import get_scorer
+
+    model, preprocessor = fit_model(
+        disease, estimator, params, X.iloc[train_idx], y.iloc[train_idx], smote, random_state
+    )
+    return get_scorer(scoring)(model, preprocessor.transform(X.iloc[test_idx]), y.iloc[test_idx])
+
+
+def _evaluate(disease, configs, X, y, folds, scoring, smote, n_jobs, random_state):
+    """
+    Cross-validate every configuration in one flat parallel batch.
+
+    Returns:
+        list: mean CV score per configuration, in order
+    """
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import StratifiedKFold
+
+    cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=random_state)
+    splits = list(cv.split(X, y))
+
+    scores = Parallel(n_jobs=n_jobs)(
+        delayed(_score_fold)(disease, estimator, params, X, y, train_idx, test_idx,
+                             scoring, smote, random_state)
+        for _, estimator, params in configs
+        for train_idx, test_idx in splits
+    )
+    scores = np.asarray(scores, dtype=np.float64).reshape(len(configs), folds)
+    return scores.mean(axis=1)
+
+
+def _subsample(X, y, n_rows, random_state):
+    if n_rows >= len(X):
+        return X, y
+    from sklearn.model_selection import train_test_split
+
+    X_sub, _, y_sub, _ = train_test_split(
+        X, y, train_size=n_rows, stratify=y, random_state=random_state
+    )
+    return X_sub, y_sub
+
+
+def search(disease, X, y, search_grids=False, halving=False, folds=5, scoring="accuracy",
+           smote=False, n_jobs=-1, factor=3, random_state=42, log=print):
+    """
+    Cross-validate the candidate models and return the best configuration.
+
+    Args:
+        disease: Key of predictions.preprocessing.SPECS
+        X, y: Raw training rows (the hold-out split is excluded by the caller)
+        search_grids: Evaluate each candidate's full hyperparameter grid
+        halving: Search the grids by successive halving (implies search_grids)
+        folds: Stratified k-fold splits
+        scoring: sklearn scorer name
+        smote: Oversample the minority class inside each training fold
+        n_jobs: joblib workers; every (configuration, fold) pair is one task
+        factor: Successive-halving elimination factor
+
+    Returns:
+        dict: name, estimator, params, cv_score, the full leaderboard and
+            each candidate's best (params, score, rows), taken from the
+            last round it took part in
+    """
+    configs = [
+        (name, estimator, params)
+        for name, (estimator, grid) in candidates(random_state).items()
+        for params in _configurations(grid, search_grids or halving)
+    ]
+    leaderboard = []
+    per_candidate = {}
+
+    if halving:
+        n_rounds = max(1, math.ceil(math.log(len(configs), factor)))
+        n_rows = max(HALVING_MIN_RESOURCES * folds, len(X) // factor ** (n_rounds - 1))
+        round_no = 0
+        while True:
+            X_round, y_round = _subsample(X, y, n_rows, random_state)
+            scores = _evaluate(disease, configs, X_round, y_round, folds, scoring, smote, n_jobs, random_state)
+            ranked = sorted(zip(scores, range(len(configs))), key=lambda item: -item[0])
+            log(f"   round {round_no}: {len(configs)} configurations on {len(X_round)} rows, "
+                f"best {scoring}={ranked[0][0]:.4f}")
+            leaderboard = [(configs[i][0], configs[i][2], float(s), len(X_round)) for s, i in ranked]
+            round_best = {}
+            for name, params, score, rows in leaderboard:
+                round_best.setdefault(name, (params, score, rows))
+            per_candidate.update(round_best)
+            if len(configs) == 1 or n_rows >= len(X):
+                break
+            configs = [configs[i] for _, i in ranked[:max(1, len(configs) // factor)]]
+            n_rows = min(len(X), n_rows * factor)
+            round_no += 1
+    else:
+        scores = _evaluate(disease, configs, X, y, folds, scoring, smote, n_jobs, random_state)
+        leaderboard = sorted(
+            ((name, params, float(score), len(X)) for (name, _, params), score in zip(configs, scores)),
+            key=lambda item: -item[2],
+        )
+        for name, params, score, rows in leaderboard:
+            per_candidate.setdefault(name, (params, score, rows))
+
+    best_name, best_params, best_score, _ = leaderboard[0]
+    estimators = {name: estimator for name, estimator, _ in configs}
+    return {
+        'name': best_name,
+        'estimator': estimators[best_name],
+        'params': best_params,
+        'cv_score': best_score,
+        'leaderboard': leaderboard,
+        'per_candidate': per_candidate,
+    }
+
+
+def benchmark_candidates(disease, best, X_train, y_train, X_test, y_test, smote=False,
+                         random_state=42, log=print):
+    """
+    Fit every candidate's best configuration and measure its serving cost.
+
+    Returns:
+        tuple: ({name: benchmark dict with params, score (CV), accuracy and
+            roc_auc on the hold-out split}, {name: (model, preprocessor)})
+    """
+    from sklearn.metrics import accuracy_score, roc_auc_score
+
+    from .benchmark import benchmark_model
+    from .importance import stratified_sample
+
+    estimators = candidates(random_state)
+    results, fitted = {}, {}
+    for name, (params, score, _) in best['per_candidate'].items():
+        model, preprocessor = fit_model(
+            disease, estimators[name][0], params, X_train, y_train, smote, random_state
+        )
+        X_test_scaled = preprocessor.transform(X_test)
+        background = stratified_sample(preprocessor.transform(X_train), y_train, 50)
+        results[name] = {
+            'params': params,
+            'score': score,
+            'accuracy': float(accuracy_score(y_test, model.predict(X_test_scaled))),
+            'roc_auc': float(roc_auc_score(y_test, model.predict_proba(X_test_scaled)[:, 1])),
+            **benchmark_model(disease, model, preprocessor, X_test, background=background),
+        }
+        fitted[name] = (model, preprocessor)
+        log(f"   benchmarked {name}: p99 {results[name]['p99_ms']:.2f} ms")
+    return results, fitted
+
+
+def train(disease, ml_dir=ML_DIR, test_size=0.2, save=True, log=print, benchmark=False,
+          latency_budget_ms=None, distill=False, publish_dir=None, **search_kwargs):
+    """
+    Run the full pipeline for ``disease``: load, search, refit, evaluate on
+    the hold-out split and (optionally) save pickles, importance and bundle.
+
+    Args:
+        benchmark: Measure every candidate's serving cost (see
+            predictions.benchmark) and save the table next to the bundle
+        latency_budget_ms: Deploy the best-scoring candidate whose p99
+            single-row latency fits the budget (implies ``benchmark``)
+        distill: Distil the chosen model into a compact student (see
+            predictions.distillation) and deploy the student if it is
+            faithful enough and clearly cheaper to serve; the teacher is
+            kept next to it for audit, and the benchmark records the student
+        publish_dir: Write the artifacts here instead of ``ml_dir`` (e.g.
+            the registry's shadow slot); the data is still read from ``ml_dir``
+
+    Returns:
+        dict: Summary with the chosen model, CV and hold-out scores, timings,
+            the benchmark table and distillation report (or None) and the
+            bundle version (None when not saved or not bundleable)
+    """
+    from sklearn.metrics import accuracy_score, roc_auc_score
+    config = DISEASES[disease]
+    started = time.perf_counter()
+
+    split = load_split(disease, test_size=test_size, random_state=15, stratify=True, ml_dir=ml_dir)
+    X_train, X_test, y_train, y_test = split.frames()
+    log(f"   {len(X_train) + len(X_test)} rows after cleaning (cached: {split.path.name}), "
+        f"features: {split.features}")
+
+    search_kwargs.setdefault('smote', config['smote'])
+    best = search(disease, X_train, y_train, log=log, **search_kwargs)
+    search_time = time.perf_counter() - started
+
+    random_state = search_kwargs.get('random_state', 42)
+    benchmarks = frontier = None
+    if benchmark or latency_budget_ms is not None:
+        from .benchmark import choose, pareto_frontier
+
+        benchmarks, fitted = benchmark_candidates(
+            disease, best, X_train, y_train, X_test, y_test,
+            smote=search_kwargs['smote'], random_state=random_state, log=log,
+        )
+        frontier = pareto_frontier(benchmarks)
+        if latency_budget_ms is not None:
+            chosen = choose(benchmarks, latency_budget_ms)
+            if chosen is None:
+                log(f"   no candidate meets p99 <= {latency_budget_ms} ms; keeping {best['name']}")
+            elif chosen != best['name']:
+                log(f"   {best['name']} exceeds the latency budget; deploying {chosen}")
+                best = {**best, 'name': chosen, 'estimator': candidates(random_state)[chosen][0],
+                        'params': benchmarks[chosen]['params'], 'cv_score': benchmarks[chosen]['score']}
+        model, preprocessor = fitted[best['name']]
+    else:
+        model, preprocessor = fit_model(
+            disease, best['estimator'], best['params'], X_train, y_train,
+            smote=search_kwargs['smote'], random_state=random_state,
+        )
+    X_test_scaled = preprocessor.transform(X_test)
+    proba = model.predict_proba(X_test_scaled)[:, 1]
+    metrics = {
+        'model': best['name'],
+        'params': {k: v for k, v in best['params'].items()},
+        'cv_' + search_kwargs.get('scoring', "accuracy"): best['cv_score'],
+        'cv_folds': search_kwargs.get('folds', 5),
+        'accuracy': float(accuracy_score(y_test, model.predict(X_test_scaled))),
+        'roc_auc': float(roc_auc_score(y_test, proba)),
+        'train_rows': int(len(X_train)),
+        'test_rows': int(len(X_test)),
+    }
+
+    teacher = distillation = None
+    if distill:
+        from . import distillation as distiller
+
+        distillation = distiller.distill(
+            disease, model, preprocessor, X_train, X_test, y_test, random_state=random_state, log=log
+        )
+        selected = distillation['selected']
+        if selected:
+            teacher, model = model, distillation['models'][selected]
+            student = distillation['students'][selected]
+            metrics['teacher'] = {key: metrics.pop(key) for key in ('model', 'params', 'accuracy', 'roc_auc')}
+            metrics.update({
+                'model': f"{selected} (distilled)",
+                'accuracy': student['accuracy'],
+                'roc_auc': student['roc_auc'],
+                'agreement': student['agreement'],
+                'proba_mae': student['proba_mae'],
+            })
+        else:
+            log("   no student is faithful enough and cheaper to serve; deploying the teacher")
+
+    version = None
+    if save:
+        out_dir = publish_dir or ml_dir
+        extra = {}
+        if benchmarks is not None:
+            from .benchmark import write_results
+
+            deployed, served = best['name'], benchmarks[best['name']]
+            if teacher is not None:
+                # The student is what gets served; list it beside the candidates
+                deployed, served = metrics['model'], distillation['students'][distillation['selected']]
+            write_results(disease, {**benchmarks, deployed: served}, frontier, deployed, latency_budget_ms, out_dir)
+            extra['benchmark'] = {k: v for k, v in served.items() if k != 'params'}
+        if teacher is not None:
+            import joblib
+
+            from .bundle import file_hash
+            from .distillation import teacher_path
+
+            path = teacher_path(disease, out_dir)
+            joblib.dump(teacher, path)
+            print(f"   [OK] Teacher kept for audit: {path}")
+            extra['distillation'] = {
+                'student': distillation['selected'],
+                'teacher': metrics['teacher']['model'],
+                'teacher_file': path.name,
+                'teacher_hash': file_hash(path),
+                'teacher_latency': distillation['teacher'],
+                'student_fidelity': distillation['students'][distillation['selected']],
+            }
+        version = save_model(disease, model, preprocessor, X_train, y_train, metrics, out_dir,
+                             training_data_path=Path(ml_dir) / SPECS[disease]['csv'],
+                             extra=extra or None)
+
+    return {
+        'best': best,
+        'metrics': metrics,
+        'benchmarks': benchmarks,
+        'frontier': frontier,
+        'distillation': distillation,
+        'search_seconds': search_time,
+        'total_seconds': time.perf_counter() - started,
+        'version': version,
+    }
+
+
+def save_model(disease, model, preprocessor, X_train, y_train, metrics, ml_dir=ML_DIR,
+               training_data_path=None, extra=None):
+    """
+    Write the pickles, global importance and model bundle for ``disease``.
+
+    The Preprocessor is pickled in place of the old scaler, so the pickle
+    fallback serves the same transform as the bundle. ``X_train`` may be a
+    sample of the training rows (the streaming path passes its reservoir);
+    ``training_data_path`` defaults to the disease CSV in ``ml_dir``;
+    ``extra`` is added to the bundle manifest.
+    """
+    import joblib
+
+    from .bundle import build_bundle
+    from .importance import build_global_importance, stratified_sample
+
+    config = DISEASES[disease]
+    model_path = Path(ml_dir) / config['model_file']
+    joblib.dump(model, model_path)
+    joblib.dump(preprocessor, Path(ml_dir) / config['scaler_file'])
+    print(f"   [OK] Saved: {model_path}")
+
+    X_scaled = preprocessor.transform(X_train)
+    build_global_importance(
+        disease, model, X_scaled, y_train, list(X_train.columns),
+        model_path=model_path, ml_dir=ml_dir,
+    )
+    return build_bundle(
+        disease, model, preprocessor, preprocessor.features,
+        background=stratified_sample(X_scaled, y_train, 50),
+        metrics=metrics,
+        model_path=model_path,
+        training_data_path=training_data_path or Path(ml_dir) / SPECS[disease]['csv'],
+        ml_dir=ml_dir,
+        extra=extra,
+    )
@@ -0,0 +1,159 @@
+"""
+Incremental risk-trend statistics per patient and disease.
+
+Whether a patient's risk is accelerating used to mean loading their whole
+history. RiskTrend keeps a fixed handful of numbers per (patient,
+disease) instead, and each newly approved prediction is folded in with
+``fold``, which touches only those numbers:
+
+    count       approved values seen
+    mean        running mean (incremental update, no sum kept)
+    slope       exponentially weighted mean of the change between
+                consecutive values, in percentage points per assessment;
+                recent changes weigh most (TREND_ALPHA)
+    last_delta  change from the previous value
+    max_value   highest value
+
+Values must be folded in the order the predictions were made. Approvals
+usually come in that order; a prediction approved after a newer one is not
+folded but its patient's trend is recomputed from the approved history.
+Rejecting an approved prediction, editing or deleting predictions in the
+admin recompute the patient's trends too (``recompute``), so live rows
+always match ``manage.py rebuild_risk_trends``, which recomputes every row
+in creation order in one streaming pass.
+"""
+from django.db import transaction
+
+from .models import Prediction, RiskTrend
+
+# Disease -> Prediction field holding its probability (percent)
+DISEASES = {
+    'diabetes': "diabetes_probability",
+    'kidney': "kidney_probability",
+}
+
+# Weight of the newest change in the slope; 0.3 means the last few
+# assessments dominate while one outlier moves it only part of the way
+TREND_ALPHA = 0.3
+
+# Slope (points per assessment) above which the trend reads as rising
+RISING = 2.0
+
+# RiskTrend fields fold maintains
+STATS = ("count", "mean", "slope", "last_value", "last_delta", "max_value", "last_at")
+
+
+def fold(trend, value, at):
+    """
+    Add one value to a RiskTrend in place, in O(1).
+
+    Args:
+        trend: RiskTrend (saved or not)
+        value: Probability in percent
+        at: When the value was observed (the prediction's created_at)
+    """
+    if trend.count:
+        delta = value - trend.last_value
+        # The first change seeds the slope rather than being damped from zero
+        trend.slope = delta if trend.count == 1 else TREND_ALPHA * delta + (1 - TREND_ALPHA) * trend.slope
+        trend.last_delta = delta
+        trend.max_value = max(trend.max_value, value)
+    else:
+        trend.max_value = value
+    trend.count += 1
+    trend.mean += (value - trend.mean) / trend.count
+    trend.last_value = value
+    trend.last_at = at
+
+
+def history(patient_id, disease):
+    """An unsaved RiskTrend folded from the patient's approved predictions in creation order."""
+    field = DISEASES[disease]
+    trend = RiskTrend(patient_id=patient_id, disease=disease)
+    rows = (
+        Prediction.objects.filter(patient_id=patient_id, approval_status="Approved", **{f"{field}__isnull": False})
+        .order_by("created_at", "id").values_list("created_at", field)
+    )
+    for created_at, value in rows:
+        fold(trend, value, created_at)
+    return trend
+
+
+def record(prediction):
+    """
+    Fold a newly approved prediction into its patient's trends.
+
+    Call once, when a prediction becomes approved, inside the transaction
+    that approves it and after saving it. A prediction older than the
+    trend's last value is not folded out of order; the trend is recomputed
+    from the history instead.
+    """
+    with transaction.atomic():
+        for disease, field in DISEASES.items():
+            value = getattr(prediction, field)
+            if value is None:
+                continue
+            trend, _ = RiskTrend.objects.select_for_update().get_or_create(
+                patient_id=prediction.patient_id, disease=disease
+            )
+            if trend.last_at is not None and prediction.created_at <= trend.last_at:
+                rebuilt = history(prediction.patient_id, disease)
+                for name in STATS:
+                    setattr(trend, name, getattr(rebuilt, name))
+            else:
+                fold(trend, value, prediction.created_at)
+            trend.save()
+
+
+def recompute(patient_ids):
+    """
+    Recompute patients' trends from their approved history, for when an
+    approved value goes away (rejected, edited or deleted). Trends left
+    with no approved values are removed.
+
+    Args:
+        patient_ids: Ids of the patients whose trends to recompute
+    """
+    with transaction.atomic():
+        for patient_id in patient_ids:
+            for disease in DISEASES:
+                trend = history(patient_id, disease)
+                if trend.count:
+                    RiskTrend.objects.update_or_create(
+                        patient_id=patient_id, disease=disease,
+                        defaults={name: getattr(trend, name) for name in STATS},
+                    )
+                else:
+                    RiskTrend.objects.filter(patient_id=patient_id, disease=disease).delete()
+
+
+def direction(trend):
+    """"rising", "falling" or "stable", from the slope."""
+    if trend.count < 2 or abs(trend.slope) < RISING:
+        return "stable"
+    return "rising" if trend.slope > 0 else "falling"
+
+
+def summary(prediction):
+    """
+    Trend rows for the review page: per disease the patient's stored trend
+    (None before the first approval), its direction, and how far this
+    prediction's value is from the last approved one.
+    """
+    trends = {t.disease: t for t in RiskTrend.objects.filter(patient_id=prediction.patient_id)}
+    rows = []
+    for disease, field in DISEASES.items():
+        trend = trends.get(disease)
+        value = getattr(prediction, field)
+        change = None
+        # An approved prediction is already the trend's last value
+        pending = prediction.approval_status != "Approved"
+        if pending and trend is not None and trend.last_value is not None and value is not None:
+            change = value - trend.last_value
+        rows.append({
+            "disease": dict(RiskTrend.DISEASE_CHOICES)[disease],
+            "trend": trend,
+            "direction": direction(trend) if trend else "",
+            "change": change,
+        })
+    return rows
@@ -0,0 +1,184 @@
+"""
+Unit normalization for lab inputs.
+
+The models are trained on US conventional units (mg/dL, g/dL, mEq/L), but
+lab panels and imported sheets often use SI units. Every analyte declares
+its model unit, the units it can be converted from and, for
+auto-detection, which unit a reading most likely is given its magnitude:
+
+    normalize('creatinine', 1.1)                  # declared model unit
+    normalize('creatinine', 97, unit='umol/L')    # explicit declaration
+    normalize('glucose', values, unit='auto')     # detect per value
+
+``normalize`` works the same on a scalar (one web request) and on a NumPy
+array or pandas column (a whole batch), with no per-row Python. Detection
+is confidence-scored: 1.0 when the value is only plausible in the detected
+unit, 0.5 when it is plausible in two units (e.g. a creatinine of 15), and
+0.0 when it is implausible in every unit.
+
+numpy is bound lazily because the views import this module at startup.
+"""
+from collections import namedtuple
+
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+AUTO = "auto"
+
+
+class Analyte:
+    """
+    Unit declarations for one lab value.
+
+    Args:
+        name: Analyte key (the web form field name)
+        unit: Model unit, the one the training data uses
+        factors: {unit: multiplier to the model unit}
+        plausible: {unit: (low, high)} range a real reading can take in
+            that unit, used to score detections
+        detect: [(upper bound, unit[, inclusive]), ...] ascending; a value
+            below the bound is read as that unit, one equal to it as the
+            next unless ``inclusive`` is true. Only the model unit when
+            magnitudes cannot tell the units apart.
+    """
+
+    def __init__(self, name, unit, factors, plausible, detect=None):
+        self.name = name
+        self.unit = unit
+        self.factors = {unit: 1.0, **factors}
+        self.plausible = plausible
+        detect = detect or [(float('inf'), unit)]
+        self.bounds = [entry[0] for entry in detect]
+        self.detect_units = [entry[1] for entry in detect]
+        # Bins that also take a value equal to their bound
+        self.inclusive = [i for i, entry in enumerate(detect) if len(entry) > 2 and entry[2]]
+
+    @property
+    def units(self):
+        return list(self.factors)
+
+
+ANALYTES = {a.name: a for a in [
+    # Bounds follow the evaluation script's original rules: glucose below
+    # 50 is mmol/L, creatinine above 20 is umol/L
+    Analyte(
+        'glucose', "mg/dL", {"mmol/L": 18.0182},
+        plausible={"mg/dL": (20, 1100), "mmol/L": (1, 60)},
+        detect=[(50, "mmol/L"), (float('inf'), "mg/dL")],
+    ),
+    Analyte(
+        'creatinine', "mg/dL", {"umol/L": 1 / 88.4},
+        plausible={"mg/dL": (0.1, 25), "umol/L": (10, 2500)},
+        detect=[(20, "mg/dL", True), (float('inf'), "umol/L")],
+    ),
+    # The kidney model's "urea" is blood urea nitrogen; 1 mmol/L urea
+    # corresponds to 2.8 mg/dL BUN. Normal ranges overlap too much to guess.
+    Analyte(
+        'urea', "mg/dL", {"mmol/L": 2.8},
+        plausible={"mg/dL": (2, 400), "mmol/L": (0.5, 150)},
+    ),
+    Analyte(
+        'hemoglobin', "g/dL", {"g/L": 0.1, "mmol/L": 1.611},
+        plausible={"g/dL": (2, 25), "g/L": (20, 250)},
+        detect=[(30, "g/dL"), (float('inf'), "g/L")],
+    ),
+    Analyte('potassium', "mEq/L", {"mmol/L": 1.0}, plausible={"mEq/L": (1, 10)}),
+    Analyte('sodium', "mEq/L", {"mmol/L": 1.0}, plausible={"mEq/L": (90, 200)}),
+]}
+
+Normalized = namedtuple('Normalized', ['value', 'unit', 'confidence'])
+
+
+def _analyte(name):
+    try:
+        return ANALYTES[name]
+    except KeyError:
+        raise ValueError(f"Unknown analyte {name!r}") from None
+
+
+def convert(name, values, unit):
+    """Convert ``values`` declared in ``unit`` to the model unit of ``name``."""
+    analyte = _analyte(name)
+    if unit not in analyte.factors:
+        raise ValueError(f"Unknown unit {unit!r} for {name} (expected one of {analyte.units})")
+    factor = analyte.factors[unit]
+    return values * factor if factor != 1.0 else values
+
+
+def detect(name, values):
+    """
+    Guess the unit of every value from its magnitude.
+
+    Returns:
+        tuple: (unit index array into ``ANALYTES[name].detect_units``,
+            confidence array); NaN values get index 0 and confidence 0
+    """
+    analyte = _analyte(name)
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    index = np.searchsorted(analyte.bounds, np.where(missing, -np.inf, values), side='right')
+    for i in analyte.inclusive:
+        index = np.where(values == analyte.bounds[i], i, index)
+    index = np.minimum(index, len(analyte.bounds) - 1)
+
+    # How many candidate units the value is plausible in, and whether the
+    # detected one is among them
+    n_plausible = np.zeros(values.shape)
+    detected_plausible = np.zeros(values.shape, dtype=bool)
+    for i, unit in enumerate(analyte.detect_units):
+        low, high = analyte.plausible.get(unit, (-np.inf, np.inf))
+        ok = (values >= low) & (values <= high)
+        n_plausible += ok
+        detected_plausible |= ok & (index == i)
+
+    confidence = np.where(detected_plausible, 1.0 / np.maximum(n_plausible, 1), 0.0)
+    return index, np.where(missing, 0.0, confidence)
+
+
+def normalize(name, values, unit=None, per_value=True):
+    """
+    Convert lab values to the unit the models expect.
+
+    Args:
+        name: Analyte key of ``ANALYTES``
+        values: Scalar, array or pandas column; NaN/None stay NaN
+        unit: Declared unit, ``"auto"`` to detect it, or None for the model
+            unit (no conversion)
+        per_value: With ``"auto"``, detect each value's unit separately
+            (mixed sheets); otherwise use the unit most of the column
+            agrees on, weighted by confidence
+
+    Returns:
+        Normalized(value, unit, confidence): converted values (float for a
+            scalar input), the unit used (array of units when detected per
+            value) and the detection confidence (1.0 when declared)
+    """
+    analyte = _analyte(name)
+    if values is None:
+        values = np.nan
+    scalar = np.ndim(values) == 0
+    values = np.asarray(values, dtype=np.float64)
+
+    if unit != AUTO:
+        unit = unit or analyte.unit
+        converted = convert(name, values, unit)
+        confidence = np.where(np.isnan(values), 0.0, 1.0)
+        units = unit
+    else:
+        index, confidence = detect(name, values)
+        factors = np.array([analyte.factors[u] for u in analyte.detect_units])
+        if not per_value and values.size:
+            votes = np.bincount(index.ravel(), weights=confidence.ravel(), minlength=len(factors))
+            best = int(np.argmax(votes))
+            observed = max(int((~np.isnan(values)).sum()), 1)
+            index = np.full(values.shape, best)
+            confidence = np.where(np.isnan(values), 0.0, votes[best] / observed)
+        converted = values * factors[index]
+        units = np.asarray(analyte.detect_units, dtype=object)[index]
+
+    if scalar:
+        return Normalized(
+            float(converted), units if isinstance(units, str) else str(units), float(confidence)
+        )
+    return Normalized(converted, units, confidence)
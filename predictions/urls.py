@@ -4,6 +4,9 @@ from . import views
 urlpatterns = [
     path("create/<int:patient_id>/", views.create_prediction, name="create_prediction"),
     path("list/", views.prediction_list, name="prediction_list"),
+    path("cohort/", views.cohort_search, name="cohort_search"),
+    path("patient/<int:patient_id>/series/", views.patient_series, name="patient_series"),
     path("<int:id>/", views.prediction_detail, name="prediction_detail"),
     path("<int:id>/review/", views.review_prediction, name="review_prediction"),
+    path("metrics/", views.metrics_status, name="prediction_metrics"),
 ]
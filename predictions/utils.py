@@ -1,24 +1,17 @@
 """
 Utility functions for ML predictions and explainability
 """
-import os
-import numpy as np
-import joblib
-from django.conf import settings
-from pathlib import Path
+from . import registry
 
 
 def load_models():
     """Load both diabetes and kidney disease models and their scalers"""
-    ml_path = os.path.join(settings.BASE_DIR, "predictions/ml")
-    
-    diabetes_model = joblib.load(os.path.join(ml_path, "diabetes_model.pkl"))
-    diabetes_scaler = joblib.load(os.path.join(ml_path, "diab_scaler.pkl"))
-    
-    kidney_model = joblib.load(os.path.join(ml_path, "kidney_model.pkl"))
-    kidney_scaler = joblib.load(os.path.join(ml_path, "kid_scaler.pkl"))
-    
-    return diabetes_model, diabetes_scaler, kidney_model, kidney_scaler
+    return registry.get_models()
+
+
+def load_model_versions():
+    """Versions of the models returned by load_models(), keyed by disease"""
+    return registry.get_model_versions()
 
 
 def calculate_risk_level(probability):
@@ -1,13 +1,26 @@
 import os
-import numpy as np
-import joblib
+import time
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.utils import timezone
-from .models import Prediction, PredictionFeature
+from .models import CKD_STAGE_CHOICES, Prediction, PredictionFeature
 from accounts.models import Patient, Doctor
-from .utils import load_models, calculate_risk_level
-from recommendations.engine import generate_recommendation
+from .utils import load_models, load_model_versions, calculate_risk_level
+from .explanations import ensure_explanations, schedule_explanations, explanation_view_stats
+from .shadow import schedule_shadow
+from . import observations, patient_state, timeseries, trends
+from .lazy import lazy_import
+from . import metrics, units
+
+np = lazy_import("numpy")
+from recommendations.engine import build_recommendation, memo_stats
+from recommendations.batch import egfr_fields, engine_features
+from recommendations.rendering import normalize, recommendation_html
+
+# Patients listed per cohort search (the total is counted in SQL)
+COHORT_PAGE_SIZE = 200
 
 
 def parse_float(val):
@@ -20,6 +33,45 @@ def parse_float(val):
         return None
 
 
+def parse_lab(post, field):
+    """
+    Parse a lab value and convert it to the unit the models expect.
+
+    The unit comes from the optional ``<field>_unit`` input (a unit from
+    predictions.units or "auto"); without one the value is taken to be in
+    the model unit, as the form labels state.
+    """
+    value = parse_float(post.get(field))
+    unit = post.get(f"{field}_unit") or None
+    if value is None or unit is None:
+        return value
+    try:
+        result = units.normalize(field, value, unit)
+    except ValueError as e:
+        print(f"WARNING: {e}; using {field} as entered")
+        return value
+    return result.value
+
+
+def posted_recommendation(post, prediction):
+    """
+    The recommendation_text to store when a doctor approves.
+
+    The review editor is pre-filled with the current rendering, so posting
+    it back unchanged keeps the stored value (usually None, so the page
+    keeps rendering recommendation_data); only an edited text is stored.
+    The editor reports edits in ``recommendation_edited``; without it (no
+    JavaScript) the text is compared with the rendering.
+    """
+    text = post.get('recommendation_text')
+    edited = post.get('recommendation_edited')
+    if text is None or edited == "0":
+        return prediction.recommendation_text
+    if not edited and normalize(text) == normalize(recommendation_html(prediction)):
+        return prediction.recommendation_text
+    return text
+
+
 @login_required
 def create_prediction(request, patient_id):
     """Doctor creates a new prediction for a specific patient"""
@@ -38,7 +90,7 @@ def create_prediction(request, patient_id):
             # Diabetes Inputs
             age = parse_float(request.POST.get('age'))
             bmi = parse_float(request.POST.get('bmi'))
-            glucose = parse_float(request.POST.get('glucose'))
+            glucose = parse_lab(request.POST, 'glucose')
             
             bp_diabetes_raw = request.POST.get('blood_pressure', '')
             bp_systolic = None
@@ -57,11 +109,11 @@ def create_prediction(request, patient_id):
                     pass
             
             # Kidney Inputs
-            creatinine = parse_float(request.POST.get('creatinine'))
-            potassium = parse_float(request.POST.get('potassium'))
-            hemoglobin = parse_float(request.POST.get('hemoglobin'))
-            sodium = parse_float(request.POST.get('sodium'))
-            urea = parse_float(request.POST.get('urea'))
+            creatinine = parse_lab(request.POST, 'creatinine')
+            potassium = parse_lab(request.POST, 'potassium')
+            hemoglobin = parse_lab(request.POST, 'hemoglobin')
+            sodium = parse_lab(request.POST, 'sodium')
+            urea = parse_lab(request.POST, 'urea')
             albumin_val = parse_float(request.POST.get('albumin')) 
             
             rbc_raw = request.POST.get('rbc', '') # Categorical
@@ -98,39 +150,42 @@ def create_prediction(request, patient_id):
             # We ONLY save features that were actually provided and valid
             diabetes_features_to_save = {}
             kidney_features_to_save = {}
+            # Raw inputs and production latency of each scored model, for
+            # the shadow candidate (see predictions.shadow)
+            shadow_inputs = {}
 
             # Load Models
             print("DEBUG: Loading models...")
             diabetes_model, diabetes_scaler, kidney_model, kidney_scaler = load_models()
+            model_versions = load_model_versions()
+            diabetes_version = None
+            kidney_version = None
             print("DEBUG: Models loaded.")
 
             # --- DIABETES PREDICTION ---
             # Check Requirements: Age, BMI, Glucose, BP_Diastolic
             if age is not None and bmi is not None and glucose is not None and bp_diastolic is not None:
-                # Validation / Clamping (mg/dL units - matching training data)
-                d_age = max(21, min(100, age))
-                d_bmi = max(10, min(70, bmi)) # Relaxed BMI
-                d_glucose = max(70, min(400, glucose)) # Glucose in mg/dL (no conversion needed)
-                # BP is Diastolic now. Typical range 40-130. 
-                # Training data has values like 72, 66, 64. Clip to reasonable range.
-                d_bp = max(40, min(130, bp_diastolic))
-                
-                diabetes_input = [d_age, d_bmi, d_bp, d_glucose]
-                
-                # Save values for display (already in correct units)
-                diabetes_features_to_save = {
-                    'Age': d_age, 'BMI': d_bmi, 'BloodPressure': d_bp, 'Glucose': d_glucose
-                }
-                
+                # Imputation, clipping to the training ranges and scaling all
+                # come from the shared pipeline (predictions.preprocessing)
+                started = time.perf_counter()
+                diabetes_inputs = {'Age': age, 'BMI': bmi, 'BloodPressure': bp_diastolic, 'Glucose': glucose}
+                diabetes_features_to_save = dict(diabetes_inputs)
+
                 try:
-                    diabetes_input_array = np.asarray([diabetes_input], dtype=np.float64)
-                    diabetes_input_scaled = diabetes_scaler.transform(diabetes_input_array)
-                    
+                    # Entered zeros are clipped like any out-of-range value
+                    d_clean, diabetes_input_scaled = diabetes_scaler.transform(
+                        diabetes_inputs, return_clean=True, zero_as_missing=False
+                    )
+                    # Save values for display (already in correct units)
+                    diabetes_features_to_save = dict(zip(diabetes_scaler.features, d_clean[0].tolist()))
+
                     diabetes_prob = float(diabetes_model.predict_proba(diabetes_input_scaled)[0][1] * 100)
                     if diabetes_prob > 95.0: diabetes_prob = 95.0
                     
                     diabetes_label = int(diabetes_model.predict(diabetes_input_scaled)[0])
                     diabetes_risk = calculate_risk_level(diabetes_prob / 100.0)
+                    diabetes_version = model_versions['diabetes']
+                    shadow_inputs['diabetes'] = (diabetes_inputs, (time.perf_counter() - started) * 1000)
                     print(f"DEBUG: Diabetes Risk: {diabetes_risk}")
                 except Exception as e:
                     print(f"ERROR: Diabetes Model Failed: {e}")
@@ -150,40 +205,32 @@ def create_prediction(request, patient_id):
             if (creatinine is not None and potassium is not None and hemoglobin is not None and 
                 sodium is not None and kidney_bp is not None and urea is not None and albumin_val is not None):
                 
-                # Validation / Clamping (mg/dL units - matching training data)
-                k_creatinine = max(0.4, min(15, creatinine))  # mg/dL (no conversion needed)
-                k_potassium = max(2.0, min(7.0, potassium))   # mEq/L
-                k_hemoglobin = max(4.0, min(20, hemoglobin))  # g/dL
-                k_sodium = max(100, min(180, sodium))         # mEq/L
-                k_bp = max(50, min(180, kidney_bp))           # mmHg
-                k_urea = max(5, min(400, urea))               # mg/dL (no conversion needed)
-                k_albumin = max(0, min(5, albumin_val))
-                
-                import pandas as pd
-                kidney_df = pd.DataFrame({
-                    'Creatinine': [k_creatinine],      # Already in mg/dL
-                    'Pottasium': [k_potassium],
-                    'Hemoglobin': [k_hemoglobin],
-                    'Sodium': [k_sodium],
-                    'Blood Pressure': [k_bp],
-                    'Red Blood Cell': [rbc_val],
-                    'Urea': [k_urea],                  # Already in mg/dL
-                    'Albumin': [k_albumin]
-                })
-                
-                kidney_features_to_save = {
-                    'Creatinine': k_creatinine, 'Pottasium': k_potassium, 'Hemoglobin': k_hemoglobin,
-                    'Sodium': k_sodium, 'Blood Pressure': k_bp, 'Red Blood Cell': rbc_val,
-                    'Urea': k_urea, 'Albumin': k_albumin
+                started = time.perf_counter()
+                kidney_inputs = {
+                    'Creatinine': creatinine,      # mg/dL
+                    'Pottasium': potassium,
+                    'Hemoglobin': hemoglobin,
+                    'Sodium': sodium,
+                    'Blood Pressure': kidney_bp,
+                    'Red Blood Cell': rbc_val,
+                    'Urea': urea,                  # mg/dL
+                    'Albumin': albumin_val,
                 }
-                
+                kidney_features_to_save = dict(kidney_inputs)
+
                 try:
-                    kidney_input_scaled = kidney_scaler.transform(kidney_df)
+                    k_clean, kidney_input_scaled = kidney_scaler.transform(
+                        kidney_inputs, return_clean=True, zero_as_missing=False
+                    )
+                    kidney_features_to_save = dict(zip(kidney_scaler.features, k_clean[0].tolist()))
+
                     kidney_prob = float(kidney_model.predict_proba(kidney_input_scaled)[0][1] * 100)
                     if kidney_prob > 95.0: kidney_prob = 95.0
                     
                     kidney_label = int(kidney_prob >= 50.0)
                     kidney_risk = calculate_risk_level(kidney_prob / 100.0)
+                    kidney_version = model_versions['kidney']
+                    shadow_inputs['kidney'] = (kidney_inputs, (time.perf_counter() - started) * 1000)
                     print(f"DEBUG: Kidney Risk: {kidney_risk}")
                 except Exception as e:
                     print(f"ERROR: Kidney Model Failed: {e}")
@@ -199,142 +246,78 @@ def create_prediction(request, patient_id):
                 if albumin_val is not None: kidney_features_to_save['Albumin'] = albumin_val
                 # RBC is always valid default
 
-            # Create prediction object
-            prediction = Prediction.objects.create(
-                patient=patient,
-                doctor=doctor,
-                diabetes_probability=diabetes_prob,
-                diabetes_label=diabetes_label,
-                diabetes_risk=diabetes_risk[0:20], # Safety truncate to max_length=20
-                kidney_probability=kidney_prob,
-                kidney_label=kidney_label,
-                kidney_risk=kidney_risk[0:20], # Safety truncate to max_length=20
-                approval_status="Pending"
-            )
-            
-            # --- Explainability & Recommendations ---
-            # Only run if we have a valid risk calculated (not Insufficient Data or Error)
-            
-            d_explanation = ""
-            k_explanation = ""
-            d_shap_details = {}
-            k_shap_details = {}
+            # The prediction, its features, observations and the patient's
+            # state are written together; explanations and shadow scoring
+            # only start once they are committed
+            with transaction.atomic():
+                # Create prediction object
+                prediction = Prediction.objects.create(
+                    patient=patient,
+                    doctor=doctor,
+                    diabetes_probability=diabetes_prob,
+                    diabetes_label=diabetes_label,
+                    diabetes_risk=diabetes_risk[0:20], # Safety truncate to max_length=20
+                    kidney_probability=kidney_prob,
+                    kidney_label=kidney_label,
+                    kidney_risk=kidney_risk[0:20], # Safety truncate to max_length=20
+                    diabetes_model_version=diabetes_version,
+                    kidney_model_version=kidney_version,
+                    approval_status="Pending"
+                )
             
-            if diabetes_risk not in ["Insufficient Data", "Error"]:
-                try:
-                    from .explainability import generate_patient_shap
-                    import pandas as pd
-                    
-                    # Background data loading (abbreviated for brevity, assuming similar to before but cached/handled)
-                    # For now passing None to skip expensive BG loading if not critical, or reload if needed.
-                    # Re-implementing simplified BG load to prevent regression
-                    try:
-                        diabetes_bg = pd.read_csv('predictions/ml/diabetes.csv')
-                        diabetes_bg = diabetes_bg[['Age', 'BMI', 'BloodPressure', 'Glucose']].iloc[:50]
-                        diabetes_bg_scaled = diabetes_scaler.transform(diabetes_bg)
-                    except:
-                        diabetes_bg_scaled = None
-                        
-                    d_feat_names = ['Age', 'BMI', 'BloodPressure', 'Glucose']
-                    
-                    d_shap_path, d_explanation, d_shap_details = generate_patient_shap(
-                        diabetes_model, diabetes_scaler, diabetes_input, d_feat_names, 
-                        prediction.id, 'diabetes', risk_level=diabetes_risk, background_data=diabetes_bg_scaled
-                    )
-                    prediction.diabetes_shap_image = d_shap_path
-                except Exception as e:
-                    print(f"Error Diabetes Explainability: {e}")
+                # --- Explainability & Recommendations ---
+                # SHAP explanations are built according to EXPLANATION_MODE
+                # (see explanations.schedule_explanations below)
 
-            if kidney_risk not in ["Insufficient Data", "Error"]:
-                try:
-                    from .explainability import generate_patient_shap
-                    import pandas as pd
-                    
-                    try:
-                        df1 = pd.read_csv('predictions/ml/kidney.csv')
-                        rename_map = {
-                            'Bp': 'Blood Pressure', 'Sg': 'Specific Gravity', 'Al': 'Albumin', 'Su': 'Sugar',
-                            'Rbc': 'Red Blood Cell', 'Bu': 'Urea', 'Sc': 'Creatinine', 'Sod': 'Sodium',
-                            'Pot': 'Pottasium', 'Hemo': 'Hemoglobin', 'Wbcc': 'White Blood Cell Count',
-                            'Rbcc': 'Red Blood Cell Count', 'Htn': 'Hypertension', 'Class': 'Predicted Class'
-                        }
-                        df1.rename(columns=rename_map, inplace=True)
-                        required_cols = ['Creatinine', 'Pottasium', 'Hemoglobin', 'Sodium', 'Blood Pressure', 'Red Blood Cell', 'Urea', 'Albumin']
-                        kidney_bg_raw = df1[required_cols].iloc[:50]
-                        kidney_bg = kidney_scaler.transform(kidney_bg_raw)
-                    except:
-                        kidney_bg = None
-
-                    k_feat_names = ['Creatinine', 'Pottasium', 'Hemoglobin', 'Sodium', 'Blood Pressure', 'Red Blood Cell', 'Urea', 'Albumin']
-                    
-                    # Reconstruct input array (all values already in correct units)
-                    k_input_vals = [k_creatinine, k_potassium, k_hemoglobin, k_sodium, k_bp, rbc_val, k_urea, k_albumin]
-                    
-                    k_shap_path, k_explanation, k_shap_details = generate_patient_shap(
-                        kidney_model, kidney_scaler, k_input_vals, k_feat_names, 
-                        prediction.id, 'kidney', risk_level=kidney_risk, background_data=kidney_bg
+                # Save Features
+                for name, val in diabetes_features_to_save.items():
+                    PredictionFeature.objects.create(
+                        prediction=prediction, feature_name=f"Diabetes_{name}", feature_value=str(val), shap_value=0.0
+                    )
+                for name, val in kidney_features_to_save.items():
+                    PredictionFeature.objects.create(
+                        prediction=prediction, feature_name=f"Kidney_{name}", feature_value=str(val), shap_value=0.0
                     )
-                    prediction.kidney_shap_image = k_shap_path
-                except Exception as e:
-                    print(f"Error Kidney Explainability: {e}")
-
-
-            # Save Explanations
-            prediction.diabetes_explanation = d_explanation
-            prediction.kidney_explanation = k_explanation
-
-            # Save Features
-            for name, val in diabetes_features_to_save.items():
-                PredictionFeature.objects.create(
-                    prediction=prediction, feature_name=f"Diabetes_{name}", feature_value=str(val), shap_value=0.0
-                )
-            for name, val in kidney_features_to_save.items():
-                PredictionFeature.objects.create(
-                    prediction=prediction, feature_name=f"Kidney_{name}", feature_value=str(val), shap_value=0.0
-                )
             
-            # Use Recommendations Engine
-            try:
-                features_dict = {}
-                features_dict.update(diabetes_features_to_save)
-                features_dict.update(kidney_features_to_save)
-                # Map keys to match engine expectation if needed (engine uses same keys usually)
-                
-                # Engine fallback if Insufficient Data?
-                # The engine likely expects valid inputs.
-                # We should only call engine if we have minimal data.
-                # Or pass what we have and let engine handle?
-                # Safe approach: Only call if at least one risk is calculated.
+                # Use Recommendations Engine
+                try:
+                    # Engine fallback if Insufficient Data?
+                    # The engine likely expects valid inputs.
+                    # We should only call engine if we have minimal data.
+                    # Or pass what we have and let engine handle?
+                    # Safe approach: Only call if at least one risk is calculated.
                 
-                if diabetes_features_to_save or kidney_features_to_save:
-                     shap_summary = {
-                        'diabetes_top_features': d_shap_details.get('top_positive', [])[:3],
-                        'kidney_top_features': k_shap_details.get('top_positive', [])[:3]
-                    }
-                     
-                     # Need to normalize keys for recommendation engine?
-                     # Engine uses: Age, BMI, Glucose, BP_Systolic, Creatinine...
-                     # My keys: Age, BMI, Glucose, BloodPressure...
-                     # Map 'BloodPressure' -> 'BP_Systolic'
-                     eng_features = features_dict.copy()
-                     if 'BloodPressure' in eng_features:
-                         eng_features['BP_Systolic'] = eng_features.pop('BloodPressure')
-                     if 'Blood Pressure' in eng_features:
-                         # Kidney BP
-                         if 'BP_Systolic' not in eng_features: # Use kidney BP if diabetes BP missing
-                             eng_features['BP_Systolic'] = eng_features.pop('Blood Pressure')
-                     
-                     rec_text, d_interp, k_interp = generate_recommendation(
-                        prediction, eng_features, shap_summary=shap_summary
-                     )
-                     prediction.recommendation_text = rec_text
-                     if d_interp: prediction.diabetes_explanation = f"{d_interp} {d_explanation}"
-                     if k_interp: prediction.kidney_explanation = f"{k_interp} {k_explanation}"
+                    if diabetes_features_to_save or kidney_features_to_save:
+                         # Engine keys: 'BloodPressure' -> 'BP_Systolic' (shared with
+                         # manage.py regenerate_recommendations)
+                         eng_features = engine_features(diabetes_features_to_save, kidney_features_to_save)
+
+                         # Stored as item codes and values, rendered on display
+                         # (SHAP details are not ready yet; they are built later by
+                         # schedule_explanations)
+                         rec_data, d_interp, k_interp = build_recommendation(prediction, eng_features)
+                         prediction.recommendation_data = rec_data
+                         if d_interp: prediction.diabetes_explanation = d_interp
+                         if k_interp: prediction.kidney_explanation = k_interp
             
-            except Exception as e:
-                print(f"Error generating recommendation: {e}")
+                except Exception as e:
+                    print(f"Error generating recommendation: {e}")
 
-            prediction.save()
+                # eGFR and CKD stage for cohort filtering, as the engine derives them
+                prediction.egfr, prediction.ckd_stage = egfr_fields(
+                    kidney_features_to_save.get('Creatinine'),
+                    diabetes_features_to_save.get('Age', patient.age or 50),
+                    patient.gender,
+                )
+                prediction.save()
+                # Typed copies of the saved labs for the cohort search
+                observations.record(prediction, {
+                    **{f"Diabetes_{name}": val for name, val in diabetes_features_to_save.items()},
+                    **{f"Kidney_{name}": val for name, val in kidney_features_to_save.items()},
+                })
+                patient_state.refresh(patient.id)
+                transaction.on_commit(lambda: schedule_explanations(prediction))
+                transaction.on_commit(lambda: schedule_shadow(prediction, shadow_inputs))
             return redirect('review_prediction', id=prediction.id)
             
         except Exception as e:
@@ -366,7 +349,7 @@ def review_prediction(request, id):
             prediction.approval_status = "Approved"
             prediction.approved_at = timezone.now()
             prediction.reviewed_at = timezone.now()
-            prediction.recommendation_text = request.POST.get('recommendation_text', prediction.recommendation_text)
+            prediction.recommendation_text = posted_recommendation(request.POST, prediction)
             prediction.doctor_notes = request.POST.get('doctor_notes', '')
             
             try:
@@ -374,7 +357,16 @@ def review_prediction(request, id):
             except Doctor.DoesNotExist:
                 pass
             
-            prediction.save()
+            with transaction.atomic():
+                # Conditional UPDATE: of two concurrent approvals only one
+                # changes the row, and only that one folds it into the trends
+                newly_approved = Prediction.objects.filter(id=prediction.id).exclude(
+                    approval_status="Approved"
+                ).update(approval_status="Approved") == 1
+                prediction.save()
+                patient_state.refresh(prediction.patient_id)
+                if newly_approved:
+                    trends.record(prediction)
             return redirect('doctor_dashboard')
             
         elif action == 'reject':
@@ -387,14 +379,24 @@ def review_prediction(request, id):
             except Doctor.DoesNotExist:
                 pass
             
-            prediction.save()
+            with transaction.atomic():
+                # Rejecting an approved prediction takes its values out of the trends
+                was_approved = Prediction.objects.filter(
+                    id=prediction.id, approval_status="Approved"
+                ).update(approval_status="Rejected") == 1
+                prediction.save()
+                patient_state.refresh(prediction.patient_id)
+                if was_approved:
+                    trends.recompute([prediction.patient_id])
             return redirect('doctor_dashboard')
     
+    ensure_explanations(prediction, viewed=True)
     features = PredictionFeature.objects.filter(prediction=prediction)
     
     return render(request, "predictions/review_prediction.html", {
         "prediction": prediction,
-        "features": features
+        "features": features,
+        "risk_trends": trends.summary(prediction),
     })
 
 
@@ -402,6 +404,7 @@ def review_prediction(request, id):
 def prediction_detail(request, id):
     """Patient views approved prediction details"""
     prediction = get_object_or_404(Prediction, id=id)
+    ensure_explanations(prediction, viewed=True)
     features = PredictionFeature.objects.filter(prediction=prediction)
     
     if hasattr(request.user, 'doctor'):
@@ -426,7 +429,81 @@ def prediction_list(request):
         predictions = Prediction.objects.filter(doctor=request.user.doctor).order_by('-created_at')
     else:
         predictions = Prediction.objects.none()
+
+    # ?ckd_stage=G3a uses the stored, indexed stage (no eGFR recomputation)
+    ckd_stages = [stage for stage, _ in CKD_STAGE_CHOICES]
+    ckd_stage = request.GET.get('ckd_stage', '')
+    if ckd_stage in ckd_stages:
+        predictions = predictions.filter(ckd_stage=ckd_stage)
     
     return render(request, "predictions/prediction_list.html", {
-        "predictions": predictions
+        "predictions": predictions,
+        "ckd_stages": ckd_stages,
+        "ckd_stage": ckd_stage,
+    })
+
+
+@login_required
+def cohort_search(request):
+    """Doctors find patients by their latest lab values (predictions.observations)"""
+    if not hasattr(request.user, 'doctor') and not request.user.is_superuser:
+        return render(request, "dashboard/not_doctor.html")
+
+    query = request.GET.get('q', '').strip()
+    latest = request.GET.get('scope', 'latest') != 'any'
+    context = {"query": query, "latest": latest, "features": observations.FEATURES}
+    if query:
+        try:
+            conditions = observations.parse(query)
+        except ValueError as e:
+            context["error"] = str(e)
+        else:
+            patients = observations.cohort(conditions, latest=latest).select_related('user').order_by('id')
+            page = list(patients[:COHORT_PAGE_SIZE])
+            shown = list(dict.fromkeys(c.feature for c in conditions))
+            values = observations.latest_values([p.id for p in page], shown)
+            context.update({
+                "count": patients.count(),
+                "columns": [observations.FEATURES[f] for f in shown],
+                "rows": [(p, [values.get(p.id, {}).get(f) for f in shown]) for p in page],
+            })
+    return render(request, "predictions/cohort_search.html", context)
+
+
+@login_required
+def patient_series(request, patient_id):
+    """Lab and risk time series of a patient as compact JSON (predictions.timeseries)"""
+    patient = get_object_or_404(Patient, id=patient_id)
+    is_own = hasattr(request.user, 'patient') and request.user.patient.id == patient.id
+    if not (is_own or hasattr(request.user, 'doctor') or request.user.is_superuser):
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    # ?series=creatinine,diabetes&bucket=week&points=300
+    names = [name for name in request.GET.get('series', '').split(',') if name] or timeseries.DEFAULT_SERIES
+    bucket = request.GET.get('bucket', 'raw')
+    try:
+        data = timeseries.series(
+            patient.id, names,
+            bucket=None if bucket == 'raw' else bucket,
+            points=int(request.GET.get('points', timeseries.DEFAULT_POINTS)),
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(
+        {"patient": patient.id, "bucket": bucket, "series": data},
+        json_dumps_params={"separators": (",", ":")},
+    )
+
+
+@login_required
+def metrics_status(request):
+    """Admin-only JSON snapshot of this worker's pipeline metrics"""
+    if not request.user.is_superuser:
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    return JsonResponse({
+        "metrics": metrics.snapshot(),
+        "explanations": explanation_view_stats(),
+        "recommendations": memo_stats(),
     })
@@ -0,0 +1,132 @@
+"""
+Recommendation building for many predictions at once.
+
+``engine_features`` is the single mapping from model inputs to the engine's
+feature names, shared by ``create_prediction`` and
+``manage.py regenerate_recommendations`` so regenerated data is exactly
+what the view would have written. ``build`` works on plain rows instead of
+model instances. ``egfr_fields`` likewise derives the stored eGFR for the
+view (one prediction) and ``manage.py derive_clinical`` (arrays). This
+module has no Django dependency, so a process pool can import it without
+settings.
+"""
+from types import SimpleNamespace
+
+from predictions.lazy import lazy_import
+
+from . import clinical
+from .engine import AGE_RANGE, CREATININE_RANGE, build_recommendation, calculate_egfr, validate_clamp
+
+np = lazy_import("numpy")
+
+# PredictionFeature.feature_name prefixes written by create_prediction
+DIABETES_PREFIX = "Diabetes_"
+KIDNEY_PREFIX = "Kidney_"
+
+
+def engine_features(diabetes_features, kidney_features):
+    """
+    Merge the saved diabetes and kidney inputs into the engine's features.
+
+    The engine reads systolic pressure as ``BP_Systolic``: the diabetes
+    form's pressure is used, else the kidney form's.
+    """
+    features = {**diabetes_features, **kidney_features}
+    if 'BloodPressure' in features:
+        features['BP_Systolic'] = features.pop('BloodPressure')
+    if 'Blood Pressure' in features and 'BP_Systolic' not in features:
+        features['BP_Systolic'] = features.pop('Blood Pressure')
+    return features
+
+
+def egfr_fields(creatinine, age, gender):
+    """
+    ``Prediction.egfr`` and ``Prediction.ckd_stage`` of one prediction or arrays.
+
+    Inputs are clamped as the engine clamps them, so the stored eGFR is the
+    one the recommendation's vitals table shows.
+
+    Args:
+        creatinine: mg/dL; None (NaN in arrays) where it was not measured
+        age: Years, as the engine reads it: the form's age, else the
+            patient's, else 50
+        gender: Patient gender values
+
+    Returns:
+        tuple: (eGFR, CKD stage); None (NaN) and "" where creatinine was not
+            measured
+    """
+    if not hasattr(creatinine, '__len__'):
+        if creatinine is None:
+            return None, ""
+        egfr = calculate_egfr(
+            validate_clamp(creatinine, *CREATININE_RANGE), validate_clamp(age, *AGE_RANGE), gender
+        )
+        return egfr, clinical.ckd_stage(egfr)
+
+    creatinine = np.asarray(creatinine, dtype=float)
+    egfr = clinical.egfr(
+        np.clip(creatinine, *CREATININE_RANGE),
+        np.clip(np.asarray(age, dtype=float), *AGE_RANGE),
+        clinical.is_female(gender),
+    )
+    egfr[np.isnan(creatinine)] = np.nan
+    return egfr, clinical.ckd_stage(egfr)
+
+
+def split_stored(stored):
+    """
+    Rebuild the view's diabetes and kidney input dicts from stored features.
+
+    Args:
+        stored: {feature_name: feature_value} of one prediction's
+            PredictionFeature rows
+
+    Returns:
+        tuple: (diabetes dict, kidney dict) of float values
+    """
+    diabetes, kidney = {}, {}
+    for name, value in stored.items():
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if name.startswith(DIABETES_PREFIX):
+            diabetes[name[len(DIABETES_PREFIX):]] = value
+        elif name.startswith(KIDNEY_PREFIX):
+            kidney[name[len(KIDNEY_PREFIX):]] = value
+    return diabetes, kidney
+
+
+def build(rows):
+    """
+    Rebuild the recommendation data of a batch of predictions.
+
+    Args:
+        rows: (prediction id, diabetes risk, kidney risk, patient age,
+            patient gender, {feature_name: feature_value}) tuples
+
+    Returns:
+        list: (prediction id, data) pairs; data is None when the prediction
+            has no saved inputs (the view writes no recommendation then) or
+            the engine failed
+    """
+    results = []
+    for prediction_id, diabetes_risk, kidney_risk, age, gender, stored in rows:
+        diabetes, kidney = split_stored(stored)
+        if not diabetes and not kidney:
+            results.append((prediction_id, None))
+            continue
+
+        prediction = SimpleNamespace(
+            diabetes_risk=diabetes_risk,
+            kidney_risk=kidney_risk,
+            patient=SimpleNamespace(age=age, gender=gender),
+        )
+        try:
+            data, _, _ = build_recommendation(prediction, engine_features(diabetes, kidney))
+        except Exception as e:
+            print(f"Error generating recommendation for prediction {prediction_id}: {e}")
+            data = None
+        results.append((prediction_id, data))
+    return results
@@ -0,0 +1,127 @@
+"""
+Clinical derivations for one patient or a whole cohort.
+
+eGFR (CKD-EPI 2021, race-free), CKD stage, BMI category, blood pressure
+stage and fasting glucose band. Every function takes scalars or arrays:
+
+    egfr(1.2, 54, female=True)                        # one patient -> float
+    egfr(creatinine, ages, female=is_female(genders)) # NumPy arrays -> array
+    ckd_stage(egfrs)                                  # -> array of "G1".."G5"
+
+Arrays are computed with NumPy in one pass, with no per-row Python, for
+cohort jobs (``manage.py derive_clinical``). Scalars go through the same
+formula and the same cut points with plain floats, because NumPy's per-call
+overhead is larger than the whole recommendation engine call that derives
+one patient's eGFR. Both paths give identical results.
+
+Values that cannot be derived (a missing or non-positive creatinine, a
+missing reading) give NaN, or "" for the categorical bands.
+
+numpy is bound lazily because the views import the engine at startup.
+"""
+from bisect import bisect_right
+from math import isnan
+
+from predictions.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+# CKD-EPI 2021 coefficients: female -> (kappa, alpha, sex factor)
+CKD_EPI_2021 = {
+    True: (0.7, -0.329, 1.012),
+    False: (0.9, -0.411, 1.0),
+}
+
+# Cut points (a value equal to a bound falls in the upper band) and the
+# labels of the bands below, between and above them
+EGFR_BOUNDS = (15, 30, 45, 60, 90)  # mL/min/1.73m², KDIGO G categories
+CKD_STAGES = ("G5", "G4", "G3b", "G3a", "G2", "G1")
+
+BMI_BOUNDS = (18.5, 25, 30)  # kg/m²
+BMI_CATEGORIES = ("Underweight", "Normal", "Overweight", "Obese")
+
+# The forms keep the diastolic reading, so stages use the ACC/AHA diastolic cut
+# points (Elevated is defined by systolic pressure alone)
+DIASTOLIC_BOUNDS = (60, 80, 90, 120)  # mmHg
+BP_STAGES = ("Low", "Normal", "Stage 1", "Stage 2", "Crisis")
+
+GLUCOSE_BOUNDS = (70, 100, 126)  # mg/dL, fasting
+GLUCOSE_BANDS = ("Low", "Normal", "Prediabetes", "Diabetes")
+
+
+def _is_scalar(*values):
+    # Strings, numbers and NumPy scalars; not lists, arrays or Series
+    return all(isinstance(value, str) or not hasattr(value, '__len__') for value in values)
+
+
+def _ckd_epi(scr, age, kappa, alpha, factor, minimum, maximum):
+    return 142 * minimum(scr / kappa, 1) ** alpha * maximum(scr / kappa, 1) ** -1.200 * 0.9938 ** age * factor
+
+
+def is_female(gender):
+    """Whether a stored gender value ("Female", "f", ...) is female."""
+    if _is_scalar(gender):
+        return isinstance(gender, str) and gender.lower().startswith('f')
+    genders = np.asarray(gender, dtype=object)
+    return np.char.startswith(np.char.lower(genders.astype(str)), 'f') & (genders != None)  # noqa: E711
+
+
+def egfr(creatinine, age, female):
+    """
+    eGFR by CKD-EPI 2021 (race-free), rounded to 0.1.
+
+    Args:
+        creatinine: Serum creatinine in mg/dL
+        age: Age in years
+        female: Sex as booleans (see ``is_female``)
+
+    Returns:
+        float or ndarray: mL/min/1.73m²; NaN where creatinine is not positive
+    """
+    if _is_scalar(creatinine, age, female):
+        scr, age = float(creatinine), float(age)
+        if not scr > 0:
+            return float('nan')
+        kappa, alpha, factor = CKD_EPI_2021[bool(female)]
+        return round(_ckd_epi(scr, age, kappa, alpha, factor, min, max), 1)
+
+    scr = np.asarray(creatinine, dtype=float)
+    age = np.asarray(age, dtype=float)
+    female = np.asarray(female, dtype=bool)
+    kappa, alpha, factor = (
+        np.where(female, CKD_EPI_2021[True][i], CKD_EPI_2021[False][i]) for i in range(3)
+    )
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        value = _ckd_epi(scr, age, kappa, alpha, factor, np.minimum, np.maximum)
+    return np.round(np.where(scr > 0, value, np.nan), 1)
+
+
+def _band(values, bounds, labels):
+    if _is_scalar(values):
+        if values is None or isnan(float(values)):
+            return ""
+        return labels[bisect_right(bounds, float(values))]
+    values = np.asarray(values, dtype=float)
+    bands = np.asarray(labels, dtype=object)[np.searchsorted(bounds, values, side='right')]
+    bands[np.isnan(values)] = ""
+    return bands
+
+
+def ckd_stage(egfr_values):
+    """KDIGO GFR category ("G1" to "G5") of eGFR values."""
+    return _band(egfr_values, EGFR_BOUNDS, CKD_STAGES)
+
+
+def bmi_category(bmi):
+    """WHO adult BMI category of BMI values."""
+    return _band(bmi, BMI_BOUNDS, BMI_CATEGORIES)
+
+
+def bp_stage(diastolic):
+    """Blood pressure stage of diastolic readings."""
+    return _band(diastolic, DIASTOLIC_BOUNDS, BP_STAGES)
+
+
+def glucose_band(glucose):
+    """ADA fasting plasma glucose band of glucose values."""
+    return _band(glucose, GLUCOSE_BOUNDS, GLUCOSE_BANDS)
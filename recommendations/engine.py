@@ -1,34 +1,73 @@
-import numpy as np
-from datetime import date
+"""
+Table-driven recommendation engine.
+
+The advice for a prediction depends on its diabetes risk, kidney risk and
+eGFR band, plus a few alert predicates on individual values. The rules are
+data:
+
+* ``ITEMS`` -- the text of every advice item, by code;
+* ``SUMMARY_RULES``, ``DIET_RULES``, ``ACTIVITY_RULES``, ``NOTES_RULES`` --
+  ordered ``(diabetes risk, kidney risk, eGFR band, outcome)`` rules where
+  ``ANY`` matches everything and the first match wins;
+* ``ALERTS`` -- ``(section, item code, value, comparison, threshold)``
+  items appended when the patient's value crosses the threshold;
+* ``METRICS`` -- reference ranges of the vitals/labs table.
+
+At import the item codes of every section are resolved for each of the
+``len(LEVELS) ** 2 * len(EGFR_BANDS)`` keys. With the alert flags added,
+the sections are memoized per process (``sections``, hit rate in
+``memo_stats``), so a call is the alert comparisons, one dict lookup and
+the metrics values. Risk values other than Low/Medium/High ("Insufficient
+Data", "Error") share the ``OTHER`` key. ``RULES_VERSION`` is a digest of
+the tables and is stored with every recommendation.
+
+``build_recommendation`` returns codes and values, not markup; that
+structure is what ``Prediction.recommendation_data`` stores, and
+recommendations.rendering renders it through a cached template. Only the
+rendering needs Django. recommendations.tests.reference holds the
+original branch-by-branch engine the tables are tested against.
+"""
+import hashlib
+import json
+import operator
+from itertools import product
+from math import isnan
+
+from predictions import metrics
+
+from . import clinical
+
+# Version of the recommendation_data structure
+FORMAT = 1
+
+LOW, MEDIUM, HIGH = "Low", "Medium", "High"
+OTHER = "Other"
+LEVELS = (LOW, MEDIUM, HIGH, OTHER)
+
+# eGFR below 15 mL/min/1.73m² (CKD stage G5) switches to dialysis-aware advice
+EGFR_FAILURE = 15
+G5, ABOVE_G5 = "G5", "G1-G4"
+EGFR_BANDS = (G5, ABOVE_G5)
+
+ANY = None
+
+# Plausible ranges inputs are clamped to before the rules see them
+AGE_RANGE = (18, 100)  # years
+CREATININE_RANGE = (0, 20)  # mg/dL
+
 
 def calculate_egfr(creatinine, age, gender):
     """
     Calculate eGFR using CKD-EPI 2021 (Race-free) equation.
+
+    One patient's value from recommendations.clinical.egfr; None when an
+    input is missing or invalid.
     """
     try:
-        scr = float(creatinine)
-        age = float(age)
-        
-        if gender.lower().startswith('f'):
-            kappa = 0.7
-            alpha = -0.329
-            gender_factor = 1.012
-        else:
-            kappa = 0.9
-            alpha = -0.411
-            gender_factor = 1.0
-            
-        # eGFR calc expects Creatinine in mg/dL usually.
-        # Input is already in mg/dL from the form.
-        scr_mg = scr
-        
-        egfr = 142 * ((min(scr_mg / kappa, 1)) ** alpha) * \
-               ((max(scr_mg / kappa, 1)) ** -1.200) * \
-               (0.9938 ** age) * gender_factor
-               
-        return round(egfr, 1)
+        value = clinical.egfr(float(creatinine), float(age), gender.lower().startswith('f'))
     except Exception:
         return None
+    return None if isnan(value) else value
 
 def validate_clamp(value, min_val, max_val):
     """Clamp values to biologically plausible ranges."""
@@ -38,377 +77,385 @@ def validate_clamp(value, min_val, max_val):
     except (ValueError, TypeError):
         return min_val
 
-def generate_recommendation(prediction, features, shap_summary=None):
+
+# --- Rules --------------------------------------------------------------------
+
+ITEMS = {
+    # Condition summaries
+    'summary.stable': "Your results show normal kidney function and low diabetes risk.",
+    'summary.early_diabetes': "Early changes suggest increased diabetes risk, while kidney function remains stable.",
+    'summary.diabetes_kidney_threat': "High diabetes risk may affect long-term kidney health if unmanaged.",
+    'summary.reduced_kidney': "Kidney function is reduced but not at dialysis stage.",
+    'summary.dialysis': "Advanced kidney disease requires specialized dialysis-aware care.",
+    'summary.pre_dialysis': "Advanced kidney disease requires specialized pre-dialysis care.",
+    'summary.combined': "This combination requires close medical supervision from both kidney and diabetes specialists.",
+    'summary.mixed': "Your results indicate multiple areas requiring clinical attention.",
+
+    # Diet
+    'diet.balanced_meals': "Eat balanced meals with vegetables, fruits, whole grains",
+    'diet.less_salt_cooking': "Use less salt during cooking",
+    'diet.drink_water': "Drink water regularly unless advised otherwise",
+    'diet.reduce_sugary': "Reduce sugary drinks and desserts",
+    'diet.whole_grains': "Choose whole grains over white rice or bread",
+    'diet.limit_processed_salt': "Limit salty processed foods",
+    'diet.strict_low_sugar': "Strict low-sugar diet",
+    'diet.portions': "Controlled portion sizes",
+    'diet.no_sweetened_drinks': "Avoid sweetened beverages completely",
+    'diet.limit_salt_bp': "Limit salt to reduce blood pressure strain",
+    'diet.moderate_protein_not_excessive': "Moderate protein intake (not excessive)",
+    'diet.fresh_foods': "Prefer fresh foods over canned foods",
+    'diet.salt_swelling': "Reduce salt to prevent swelling",
+    'diet.potassium_phosphorus_labs': "Potassium and phosphorus intake based on lab values",
+    'diet.protein_individualized': "Protein intake must be individualized (do NOT self-restrict)",
+    'diet.moderate_protein_08': "Moderate protein intake (~0.8 g/kg)",
+    'diet.limit_phosphorus': "Limit phosphorus intake",
+    'diet.tight_glycemic': "Maintain tight glycemic control",
+    'diet.renal_protective': "Adhere to a renal-protective diet (low phosphorus/potassium)",
+    'diet.restrict_sodium_potassium': "Restrict dietary sodium and potassium intake",
+    'diet.low_glycemic_foods': "Low-glycemic foods (vegetables, legumes)",
+    'diet.salt_2000': "Limit salt to < 2000 mg/day",
+    'diet.moderate_protein': "Moderate protein intake",
+    'diet.strict_sodium': "Strict sodium control",
+    'diet.reduce_sugary_foods': "Reduce sugary foods",
+    'diet.potassium_phosphorus_guided': "Potassium/phosphorus guided by labs",
+    'diet.low_glycemic_renal': "Low-glycemic, renal-protective diet",
+    'diet.limit_salt_sugar': "Limit salt and sugar",
+    'diet.moderate_protein_08_short': "Moderate protein (~0.8 g/kg)",
+    'diet.strict_low_glycemic': "Strict low-glycemic diet",
+    'diet.sodium_2000': "Limit sodium to < 2000 mg/day",
+    'diet.low_glycemic_diet': "Low-glycemic diet (vegetables, legumes)",
+    'diet.limit_sodium': "Limit sodium intake",
+    'diet.alert_weight': "⚠ Nutritional counseling recommended for weight management",
+    'diet.alert_potassium': "⚠ Limit high-potassium foods (bananas, potatoes, tomatoes)",
+
+    # Physical activity
+    'activity.thirty_minutes': "30 minutes of walking, cycling, or swimming most days",
+    'activity.no_extreme': "Stay active but avoid extreme exertion",
+    'activity.walk_after_meals': "Walk 10–15 minutes after meals",
+    'activity.weight_reduction': "Aim for weight reduction if overweight",
+    'activity.low_impact_only': "Low-impact exercise only",
+    'activity.no_skipped_meals': "Avoid skipping meals before activity",
+    'activity.gentle_daily': "Gentle daily activity (walking, stretching)",
+    'activity.avoid_dehydration': "Avoid dehydration",
+    'activity.light_flexibility': "Light walking and flexibility exercises",
+    'activity.avoid_strenuous_activity': "Avoid strenuous activity",
+    'activity.doctor_approved': "Only gentle movement as approved by doctor",
+    'activity.moderate_20_30': "Moderate activity 20-30 mins/day",
+    'activity.walking_after_meals': "Walking after meals recommended",
+    'activity.light_stretching_only': "Light walking and stretching only",
+    'activity.avoid_strenuous_exercise': "Avoid strenuous exercise",
+    'activity.monitor_fatigue': "Monitor for fatigue or swelling",
+    'activity.low_impact_aerobic': "Low-impact aerobic exercise",
+    'activity.daily_if_tolerated': "20-30 minutes daily if tolerated",
+    'activity.no_prolonged_fasting': "Avoid prolonged fasting before activity",
+    'activity.as_tolerated': "Light to moderate activity as tolerated",
+    'activity.personalized_plan': "Consult with healthcare provider for personalized plan",
+
+    # Clinical notes
+    'notes.swelling': "Sudden swelling of legs or face",
+    'notes.fatigue_weight': "Persistent fatigue or unexplained weight changes",
+    'notes.glucose_monitoring': "Regular glucose monitoring recommended",
+    'notes.diabetes_protects_kidney': "Proper diabetes control helps protect kidney function",
+    'notes.renal_monitoring': "Regular renal function monitoring",
+    'notes.adequate_fluids': "Drink adequate fluids unless restricted",
+    'notes.short_breath': "Shortness of breath",
+    'notes.weight_gain': "Rapid weight gain",
+    'notes.urine_output': "Reduced urine output",
+    'notes.coordinated_care': "This condition requires coordinated care between kidney and diabetes specialists",
+    'notes.follow_up': "Follow up with your healthcare provider",
+    'notes.alert_low_bp': "Low blood pressure detected - ensure adequate hydration and clinical review",
+}
+
+# Clinical notes heading variants: (title, icon, colour)
+NOTE_STYLES = {
+    'seek_care': ("When to Seek Care", "bi-info-circle", "text-info"),
+    'monitoring': ("Clinical Notes", "bi-clipboard-check", "text-warning"),
+    'important': ("Important Note", "bi-exclamation-triangle", "text-danger"),
+    'clinical': ("Clinical Notes", "bi-journal-medical", "text-info"),
+    'warning': ("Warning Signs", "bi-exclamation-triangle-fill", "text-danger"),
+    'critical': ("Critical Notice", "bi-hospital-fill", "text-danger"),
+}
+
+SUMMARY_RULES = [
+    (LOW, LOW, ANY, 'summary.stable'),
+    (MEDIUM, LOW, ANY, 'summary.early_diabetes'),
+    (HIGH, LOW, ANY, 'summary.diabetes_kidney_threat'),
+    (LOW, MEDIUM, ANY, 'summary.reduced_kidney'),
+    (LOW, HIGH, G5, 'summary.dialysis'),
+    (LOW, HIGH, ANY, 'summary.pre_dialysis'),
+    (HIGH, HIGH, ANY, 'summary.combined'),
+    (ANY, ANY, ANY, 'summary.mixed'),
+]
+
+DIET_RULES = [
+    # Preventive
+    (LOW, LOW, ANY, ['diet.balanced_meals', 'diet.less_salt_cooking', 'diet.drink_water']),
+    # Early diabetes management
+    (MEDIUM, LOW, ANY, ['diet.reduce_sugary', 'diet.whole_grains', 'diet.limit_processed_salt']),
+    # Strict diabetes control
+    (HIGH, LOW, ANY, ['diet.strict_low_sugar', 'diet.portions', 'diet.no_sweetened_drinks']),
+    # Kidney-friendly
+    (LOW, MEDIUM, ANY, ['diet.limit_salt_bp', 'diet.moderate_protein_not_excessive', 'diet.fresh_foods']),
+    # Dialysis-aware or pre-dialysis
+    (LOW, HIGH, G5, ['diet.salt_swelling', 'diet.potassium_phosphorus_labs', 'diet.protein_individualized']),
+    (LOW, HIGH, ANY, ['diet.limit_salt_bp', 'diet.moderate_protein_08', 'diet.limit_phosphorus']),
+    # Combined critical
+    (HIGH, HIGH, ANY, ['diet.tight_glycemic', 'diet.renal_protective', 'diet.restrict_sodium_potassium']),
+    # Both moderate: combined management
+    (MEDIUM, MEDIUM, ANY, ['diet.low_glycemic_foods', 'diet.salt_2000', 'diet.moderate_protein']),
+    # Moderate diabetes + high kidney: renal priority
+    (MEDIUM, HIGH, G5, ['diet.strict_sodium', 'diet.reduce_sugary_foods', 'diet.potassium_phosphorus_guided']),
+    (MEDIUM, HIGH, ANY, ['diet.low_glycemic_renal', 'diet.limit_salt_sugar', 'diet.moderate_protein_08_short']),
+    # High diabetes + moderate kidney: balance both
+    (HIGH, MEDIUM, ANY, ['diet.strict_low_glycemic', 'diet.sodium_2000', 'diet.moderate_protein']),
+    # Fallbacks (a risk level is missing)
+    (HIGH, ANY, ANY, ['diet.low_glycemic_diet']),
+    (ANY, MEDIUM, ANY, ['diet.limit_sodium']),
+    (ANY, HIGH, ANY, ['diet.limit_sodium']),
+    (ANY, ANY, ANY, []),
+]
+
+ACTIVITY_RULES = [
+    (LOW, LOW, ANY, ['activity.thirty_minutes', 'activity.no_extreme']),
+    (MEDIUM, LOW, ANY, ['activity.walk_after_meals', 'activity.weight_reduction']),
+    (HIGH, LOW, ANY, ['activity.low_impact_only', 'activity.no_skipped_meals']),
+    (LOW, MEDIUM, ANY, ['activity.gentle_daily', 'activity.avoid_dehydration']),
+    (LOW, HIGH, ANY, ['activity.light_flexibility', 'activity.avoid_strenuous_activity']),
+    (HIGH, HIGH, ANY, ['activity.doctor_approved']),
+    (MEDIUM, MEDIUM, ANY, ['activity.moderate_20_30', 'activity.walking_after_meals', 'activity.avoid_dehydration']),
+    (MEDIUM, HIGH, ANY, ['activity.light_stretching_only', 'activity.avoid_strenuous_exercise',
+                         'activity.monitor_fatigue']),
+    (HIGH, MEDIUM, ANY, ['activity.low_impact_aerobic', 'activity.daily_if_tolerated',
+                         'activity.no_prolonged_fasting']),
+    (ANY, ANY, ANY, ['activity.as_tolerated', 'activity.personalized_plan']),
+]
+
+# Outcome: (NOTE_STYLES key, items)
+NOTES_RULES = [
+    (LOW, LOW, ANY, ('seek_care', ['notes.swelling', 'notes.fatigue_weight'])),
+    (MEDIUM, LOW, ANY, ('monitoring', ['notes.glucose_monitoring'])),
+    (HIGH, LOW, ANY, ('important', ['notes.diabetes_protects_kidney'])),
+    (LOW, MEDIUM, ANY, ('clinical', ['notes.renal_monitoring', 'notes.adequate_fluids'])),
+    (LOW, HIGH, ANY, ('warning', ['notes.short_breath', 'notes.weight_gain', 'notes.urine_output'])),
+    (HIGH, HIGH, ANY, ('critical', ['notes.coordinated_care'])),
+    (ANY, ANY, ANY, ('clinical', ['notes.follow_up'])),
+]
+
+# Items added to a section when a value crosses a threshold:
+# (section, item code, clinical value, comparison, threshold)
+ALERTS = [
+    ('diet', 'diet.alert_weight', 'bmi', '>=', 30),
+    ('diet', 'diet.alert_potassium', 'potassium', '>', 5.0),
+    ('notes', 'notes.alert_low_bp', 'bp_sys', '<', 90),
+]
+COMPARISONS = {'>=': operator.ge, '>': operator.gt, '<': operator.lt}
+
+# Vitals/labs table: key -> (reference min, reference max, unit, label)
+METRICS = {
+    'Age': (None, None, 'years', 'Age'),
+    'BMI': (18.5, 24.9, 'kg/m²', 'BMI'),
+    'Glucose': (70, 100, 'mg/dL', 'Glucose (Fasting)'),
+    'BP_Systolic': (90, 120, 'mmHg', 'Systolic BP'),
+    'Creatinine': (0.6, 1.2, 'mg/dL', 'Creatinine'),
+    'Pottasium': (3.5, 5.2, 'mEq/L', 'Potassium'),
+    'Sodium': (135, 145, 'mEq/L', 'Sodium'),
+    'Hemoglobin': (13.5, 17.5, 'g/dL', 'Hemoglobin'),
+    'Urea': (7, 20, 'mg/dL', 'Blood Urea Nitrogen (BUN)'),
+    'Albumin': (0, 0, 'Level', 'Urine Albumin (Dipstick)'),
+    'eGFR': (90, None, 'mL/min/1.73m²', 'eGFR (Est.) <small class="text-muted">[Auto-calculated]</small>'),
+}
+
+
+# --- Compilation --------------------------------------------------------------
+
+def _first_match(rules, key):
+    for d_rule, k_rule, band_rule, outcome in rules:
+        if all(rule is ANY or rule == value for rule, value in zip((d_rule, k_rule, band_rule), key)):
+            return outcome
+    raise LookupError(f"No rule for {key}")
+
+
+def _compile(key):
+    """Item codes of every section for one (diabetes level, kidney level, eGFR band)."""
+    notes_style, notes = _first_match(NOTES_RULES, key)
+    return {
+        'summary': [_first_match(SUMMARY_RULES, key)],
+        'diet': list(_first_match(DIET_RULES, key)),
+        'activity': list(_first_match(ACTIVITY_RULES, key)),
+        'notes': list(notes),
+        'notes_style': notes_style,
+    }
+
+
+COMPILED = {key: _compile(key) for key in product(LEVELS, LEVELS, EGFR_BANDS)}
+
+_ALERT_CHECKS = [(value, COMPARISONS[comparison], threshold) for _, _, value, comparison, threshold in ALERTS]
+
+# Digest of every table that decides the stored structure (not the wording:
+# ITEMS and the markup are the renderer's). Stored data carries it, so
+# ``regenerate_recommendations --stale`` finds predictions built under
+# older rules.
+RULES_VERSION = hashlib.sha1(json.dumps(
+    [FORMAT, SUMMARY_RULES, DIET_RULES, ACTIVITY_RULES, NOTES_RULES, ALERTS, EGFR_FAILURE,
+     {key: limits[:2] for key, limits in METRICS.items()}],
+).encode()).hexdigest()[:12]
+
+
+# --- Section memo -------------------------------------------------------------
+
+# Sections by (diabetes level, kidney level, eGFR band, alert flags). Every
+# prediction with the same key gets the same sections; only the metrics
+# differ. The key space is len(LEVELS) ** 2 * len(EGFR_BANDS) *
+# 2 ** len(ALERTS) entries, so nothing is ever evicted, and the memo lives
+# and dies with the process, like the rule tables it is built from.
+_sections = {}
+
+
+def _build_sections(key):
+    compiled = COMPILED[key[:3]]
+    flags = key[3]
+    alerts = {
+        section: [code for (s, code, *_), flag in zip(ALERTS, flags) if flag and s == section]
+        for section in ('diet', 'notes')
+    }
+    return [
+        {'id': 'summary', 'items': compiled['summary']},
+        {'id': 'diet', 'items': compiled['diet'] + alerts['diet']},
+        {'id': 'activity', 'items': compiled['activity']},
+        {'id': 'notes', 'style': compiled['notes_style'], 'items': compiled['notes'] + alerts['notes']},
+    ]
+
+
+def sections(d_level, k_level, band, flags):
+    """Memoized sections of a rule key and alert flags (treat as read-only)."""
+    key = (d_level, k_level, band, flags)
+    result = _sections.get(key)
+    if result is None:
+        metrics.incr('recommendations.sections_miss')
+        result = _sections[key] = _build_sections(key)
+    else:
+        metrics.incr('recommendations.sections_hit')
+    return result
+
+
+def memo_stats():
+    """Hit rate of the section memo in this process, for the status view."""
+    counters = metrics.snapshot()['counters']
+    hits = counters.get('recommendations.sections_hit', 0)
+    misses = counters.get('recommendations.sections_miss', 0)
+    return {
+        'rules_version': RULES_VERSION,
+        'entries': len(_sections),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else None,
+    }
+
+
+# --- Evaluation ---------------------------------------------------------------
+
+def level(risk):
+    """Rule key of a stored risk value."""
+    return risk if risk in (LOW, MEDIUM, HIGH) else OTHER
+
+
+def egfr_band(egfr):
+    return G5 if egfr and egfr < EGFR_FAILURE else ABOVE_G5
+
+
+def metric_status(key, val):
+    """Status code of a value in the vitals/labs table."""
+    if key == 'eGFR':
+        if val < 60:
+            return 'egfr_low'
+        if val < 90:
+            return 'egfr_mild'
+        return 'normal'
+    if key == 'Albumin':
+        return 'albumin' if val > 0 else 'normal'
+    ref_min, ref_max = METRICS[key][:2]
+    if ref_max is not None and val > ref_max:
+        return 'high'
+    if ref_min is not None and val < ref_min:
+        return 'low'
+    return 'normal'
+
+
+def metric_values(values, egfr, features):
+    """(key, value) rows of the vitals/labs table, in display order."""
+    rows = [
+        ('Age', values['age']),
+        ('BMI', round(values['bmi'], 1)),
+        ('Glucose', round(values['glucose'], 0)),
+        ('BP_Systolic', round(values['bp_sys'], 0)),
+        ('Creatinine', round(values['creatinine'], 2)),
+        ('eGFR', egfr),
+    ]
+    for key in ('Pottasium', 'Sodium', 'Hemoglobin', 'Urea'):
+        value = features.get(key)
+        if value:
+            rows.append((key, float(value)))
+    albumin = features.get('Albumin')
+    if albumin is not None:
+        rows.append(('Albumin', int(float(albumin))))
+    return rows
+
+
+def clinical_values(prediction, features):
+    """Validated inputs and eGFR the rules and metrics are evaluated on."""
+    values = {
+        'age': validate_clamp(features.get('Age', prediction.patient.age or 50), *AGE_RANGE),
+        'bmi': validate_clamp(features.get('BMI', 0), 10, 60),
+        'glucose': validate_clamp(features.get('Glucose', 0), 0, 600),  # mg/dL
+        'bp_sys': validate_clamp(features.get('BP_Systolic', 120), 0, 250),
+        'creatinine': validate_clamp(features.get('Creatinine', 1.0), *CREATININE_RANGE),
+        'potassium': validate_clamp(features.get('Pottasium', 0), 0, 10),
+        'sodium': validate_clamp(features.get('Sodium', 0), 0, 200),
+    }
+    gender = prediction.patient.gender if hasattr(prediction.patient, 'gender') else 'Male'
+    return values, calculate_egfr(values['creatinine'], values['age'], gender)
+
+
+def build_recommendation(prediction, features, shap_summary=None):
     """
-    Generate clinically relevant, user-friendly recommendations.
+    Build the structured recommendation for a prediction.
+
+    The result is what ``Prediction.recommendation_data`` stores: item
+    codes and metric values only, no markup. recommendations.rendering
+    turns it into HTML.
+
+    The sections come from the memo (see ``sections``) and are shared by
+    every prediction with the same risk levels, eGFR band and alert flags;
+    callers must not modify them.
+
+    Returns:
+        tuple: (data, diabetes summary, kidney summary) where data is
+            ``{"v": FORMAT, "rules": RULES_VERSION,
+            "sections": [{"id", "items"[, "style"]}, ...],
+            "metrics": [[key, value, status code], ...]}``
     """
-    
-    # --- 1. DATA PREPARATION & VALIDATION ---
-    age = validate_clamp(features.get('Age', prediction.patient.age or 50), 18, 100)
-    bmi = validate_clamp(features.get('BMI', 0), 10, 60)
-    glucose = validate_clamp(features.get('Glucose', 0), 0, 600) # mg/dL
-    bp_sys = validate_clamp(features.get('BP_Systolic', 120), 0, 250)
-    
-    # Kidney specific
-    creatinine = validate_clamp(features.get('Creatinine', 1.0), 0, 20) # mg/dL
-    potassium = validate_clamp(features.get('Pottasium', 0), 0, 10)
-    sodium = validate_clamp(features.get('Sodium', 0), 0, 200)
-    
-    # Calculate eGFR
-    gender = prediction.patient.gender if hasattr(prediction.patient, 'gender') else 'Male'
-    egfr = calculate_egfr(creatinine, age, gender)
-    
-    # --- 2. RISK ANALYSIS ---
+    values, egfr = clinical_values(prediction, features)
     d_risk = prediction.diabetes_risk
     k_risk = prediction.kidney_risk
-    
-    # --- 3. GENERATE RECOMMENDATION TEXT ---
-    sections = []
-    
-    # Helper for risk badges
-    def get_badge(risk):
-        if risk == "High": return "bg-danger"
-        if risk == "Medium": return "bg-warning text-dark"
-        return "bg-success"
-        
-    d_badge = get_badge(d_risk)
-    k_badge = get_badge(k_risk)
-    
-    # SECTION 1: CONDITION SUMMARY (Contextual)
-    condition_text = ""
-    
-    if d_risk == "Low" and k_risk == "Low":
-        condition_text = "Your results show normal kidney function and low diabetes risk."
-    elif d_risk == "Medium" and k_risk == "Low":
-        condition_text = "Early changes suggest increased diabetes risk, while kidney function remains stable."
-    elif d_risk == "High" and k_risk == "Low":
-        condition_text = "High diabetes risk may affect long-term kidney health if unmanaged."
-    elif d_risk == "Low" and k_risk == "Medium":
-        condition_text = "Kidney function is reduced but not at dialysis stage."
-    elif d_risk == "Low" and k_risk == "High":
-        if egfr and egfr < 15:
-            condition_text = "Advanced kidney disease requires specialized dialysis-aware care."
-        else:
-            condition_text = "Advanced kidney disease requires specialized pre-dialysis care."
-    elif d_risk == "High" and k_risk == "High":
-        condition_text = "This combination requires close medical supervision from both kidney and diabetes specialists."
-    else:
-        # Mixed cases
-        condition_text = "Your results indicate multiple areas requiring clinical attention."
-    
-    summary_html = f"""
-    <div class="mb-4">
-        <h5 class="mb-2 border-bottom pb-2"><i class="bi bi-clipboard2-pulse me-2"></i>Condition Summary</h5>
-        <p class="mb-0">{condition_text}</p>
-    </div>
-    """
-    sections.append(summary_html)
-    
-    # SECTION 3: DAILY DIET GUIDANCE / LIFESTYLE
-    diet_items = []
-    
-    if d_risk == "Low" and k_risk == "Low":
-        # Case 1: Preventive
-        diet_items.append("Eat balanced meals with vegetables, fruits, whole grains")
-        diet_items.append("Use less salt during cooking")
-        diet_items.append("Drink water regularly unless advised otherwise")
-        
-    elif d_risk == "Medium" and k_risk == "Low":
-        # Case 2: Early diabetes management
-        diet_items.append("Reduce sugary drinks and desserts")
-        diet_items.append("Choose whole grains over white rice or bread")
-        diet_items.append("Limit salty processed foods")
-        
-    elif d_risk == "High" and k_risk == "Low":
-        # Case 3: Strict diabetes control
-        diet_items.append("Strict low-sugar diet")
-        diet_items.append("Controlled portion sizes")
-        diet_items.append("Avoid sweetened beverages completely")
-        
-    elif d_risk == "Low" and k_risk == "Medium":
-        # Case 4: Kidney-friendly
-        diet_items.append("Limit salt to reduce blood pressure strain")
-        diet_items.append("Moderate protein intake (not excessive)")
-        diet_items.append("Prefer fresh foods over canned foods")
-        
-    elif d_risk == "Low" and k_risk == "High":
-        # Case 5: Dialysis-aware or Pre-dialysis
-        if egfr and egfr < 15:
-            diet_items.append("Reduce salt to prevent swelling")
-            diet_items.append("Potassium and phosphorus intake based on lab values")
-            diet_items.append("Protein intake must be individualized (do NOT self-restrict)")
-        else:
-            diet_items.append("Limit salt to reduce blood pressure strain")
-            diet_items.append("Moderate protein intake (~0.8 g/kg)")
-            diet_items.append("Limit phosphorus intake")
-            
-    elif d_risk == "High" and k_risk == "High":
-        # Case 6: Combined critical
-        diet_items.append("Maintain tight glycemic control")
-        diet_items.append("Adhere to a renal-protective diet (low phosphorus/potassium)")
-        diet_items.append("Restrict dietary sodium and potassium intake")
-    
-    # Additional mixed scenarios
-    elif d_risk == "Medium" and k_risk == "Medium":
-        # Both moderate - combined management
-        diet_items.append("Low-glycemic foods (vegetables, legumes)")
-        diet_items.append("Limit salt to < 2000 mg/day")
-        diet_items.append("Moderate protein intake")
-        
-    elif d_risk == "Medium" and k_risk == "High":
-        # Moderate diabetes + High kidney - renal priority
-        if egfr and egfr < 15:
-            diet_items.append("Strict sodium control")
-            diet_items.append("Reduce sugary foods")
-            diet_items.append("Potassium/phosphorus guided by labs")
-        else:
-            diet_items.append("Low-glycemic, renal-protective diet")
-            diet_items.append("Limit salt and sugar")
-            diet_items.append("Moderate protein (~0.8 g/kg)")
-            
-    elif d_risk == "High" and k_risk == "Medium":
-        # High diabetes + Moderate kidney - balance both
-        diet_items.append("Strict low-glycemic diet")
-        diet_items.append("Limit sodium to < 2000 mg/day")
-        diet_items.append("Moderate protein intake")
-        
-    else:
-        # Catch-all fallback
-        if d_risk == "High":
-            diet_items.append("Low-glycemic diet (vegetables, legumes)")
-        if k_risk in ["Medium", "High"]:
-            diet_items.append("Limit sodium intake")
-            
-    # Add specific alerts
-    if bmi >= 30:
-        diet_items.append("⚠ Nutritional counseling recommended for weight management")
-    if potassium > 5.0:
-        diet_items.append("⚠ Limit high-potassium foods (bananas, potatoes, tomatoes)")
-    
-    diet_html = f"""
-    <div class="mb-4">
-        <h5 class="text-success mb-2 border-bottom pb-2"><i class="bi bi-egg-fried me-2"></i>Daily Diet Guidance</h5>
-        <ul class="mb-0">
-            {"".join([f'<li>{item}</li>' for item in diet_items])}
-        </ul>
-    </div>
-    """
-    sections.append(diet_html)
-    
-    # SECTION 4: PHYSICAL ACTIVITY
-    activity_items = []
-    
-    if d_risk == "Low" and k_risk == "Low":
-        activity_items.append("30 minutes of walking, cycling, or swimming most days")
-        activity_items.append("Stay active but avoid extreme exertion")
-    elif d_risk == "Medium" and k_risk == "Low":
-        activity_items.append("Walk 10–15 minutes after meals")
-        activity_items.append("Aim for weight reduction if overweight")
-    elif d_risk == "High" and k_risk == "Low":
-        activity_items.append("Low-impact exercise only")
-        activity_items.append("Avoid skipping meals before activity")
-    elif d_risk == "Low" and k_risk == "Medium":
-        activity_items.append("Gentle daily activity (walking, stretching)")
-        activity_items.append("Avoid dehydration")
-    elif d_risk == "Low" and k_risk == "High":
-        activity_items.append("Light walking and flexibility exercises")
-        activity_items.append("Avoid strenuous activity")
-    elif d_risk == "High" and k_risk == "High":
-        activity_items.append("Only gentle movement as approved by doctor")
-    
-    # Additional mixed scenarios
-    elif d_risk == "Medium" and k_risk == "Medium":
-        activity_items.append("Moderate activity 20-30 mins/day")
-        activity_items.append("Walking after meals recommended")
-        activity_items.append("Avoid dehydration")
-        
-    elif d_risk == "Medium" and k_risk == "High":
-        activity_items.append("Light walking and stretching only")
-        activity_items.append("Avoid strenuous exercise")
-        activity_items.append("Monitor for fatigue or swelling")
-        
-    elif d_risk == "High" and k_risk == "Medium":
-        activity_items.append("Low-impact aerobic exercise")
-        activity_items.append("20-30 minutes daily if tolerated")
-        activity_items.append("Avoid prolonged fasting before activity")
-        
-    else:
-        # Fallback for any remaining combinations
-        activity_items.append("Light to moderate activity as tolerated")
-        activity_items.append("Consult with healthcare provider for personalized plan")
-    
-    activity_html = f"""
-    <div class="mb-4">
-        <h5 class="text-primary mb-2 border-bottom pb-2"><i class="bi bi-activity me-2"></i>Physical Activity</h5>
-        <ul class="mb-0">
-            {"".join([f'<li>{item}</li>' for item in activity_items])}
-        </ul>
-    </div>
-    """
-    sections.append(activity_html)
-    
-    # SECTION 5: CLINICAL NOTES / WHEN TO SEEK CARE
-    notes_items = []
-    
-    if d_risk == "Low" and k_risk == "Low":
-        notes_items.append("Sudden swelling of legs or face")
-        notes_items.append("Persistent fatigue or unexplained weight changes")
-        notes_title = "When to Seek Care"
-        notes_icon = "bi-info-circle"
-        notes_color = "text-info"
-    elif d_risk == "Medium" and k_risk == "Low":
-        notes_items.append("Regular glucose monitoring recommended")
-        notes_title = "Clinical Notes"
-        notes_icon = "bi-clipboard-check"
-        notes_color = "text-warning"
-    elif d_risk == "High" and k_risk == "Low":
-        notes_items.append("Proper diabetes control helps protect kidney function")
-        notes_title = "Important Note"
-        notes_icon = "bi-exclamation-triangle"
-        notes_color = "text-danger"
-    elif d_risk == "Low" and k_risk == "Medium":
-        notes_items.append("Regular renal function monitoring")
-        notes_items.append("Drink adequate fluids unless restricted")
-        notes_title = "Clinical Notes"
-        notes_icon = "bi-journal-medical"
-        notes_color = "text-info"
-    elif d_risk == "Low" and k_risk == "High":
-        notes_items.append("Shortness of breath")
-        notes_items.append("Rapid weight gain")
-        notes_items.append("Reduced urine output")
-        notes_title = "Warning Signs"
-        notes_icon = "bi-exclamation-triangle-fill"
-        notes_color = "text-danger"
-    elif d_risk == "High" and k_risk == "High":
-        notes_items.append("This condition requires coordinated care between kidney and diabetes specialists")
-        notes_title = "Critical Notice"
-        notes_icon = "bi-hospital-fill"
-        notes_color = "text-danger"
-    else:
-        notes_items.append("Follow up with your healthcare provider")
-        notes_title = "Clinical Notes"
-        notes_icon = "bi-journal-medical"
-        notes_color = "text-info"
-    
-    # Add Low BP note if applicable
-    if bp_sys < 90:
-        notes_items.append("Low blood pressure detected - ensure adequate hydration and clinical review")
-    
-    notes_html = f"""
-    <div class="mb-4">
-        <h5 class="{notes_color} mb-2 border-bottom pb-2"><i class="{notes_icon} me-2"></i>{notes_title}</h5>
-        <ul class="mb-0">
-            {"".join([f'<li>{item}</li>' for item in notes_items])}
-        </ul>
-    </div>
-    """
-    sections.append(notes_html)
-    
-    # SECTION 6: METRICS TABLE (Keep existing)
-    REF_RANGES = {
-        'Age': (None, None, 'years', 'Age'),
-        'BMI': (18.5, 24.9, 'kg/m²', 'BMI'),
-        'Glucose': (70, 100, 'mg/dL', 'Glucose (Fasting)'),
-        'BP_Systolic': (90, 120, 'mmHg', 'Systolic BP'),
-        'Creatinine': (0.6, 1.2, 'mg/dL', 'Creatinine'),
-        'Pottasium': (3.5, 5.2, 'mEq/L', 'Potassium'),
-        'Sodium': (135, 145, 'mEq/L', 'Sodium'),
-        'Hemoglobin': (13.5, 17.5, 'g/dL', 'Hemoglobin'),
-        'Urea': (7, 20, 'mg/dL', 'Blood Urea Nitrogen (BUN)'),
-        'Albumin': (0, 0, 'Level', 'Urine Albumin (Dipstick)'),
-        'eGFR': (90, None, 'mL/min/1.73m²', 'eGFR (Est.) \u003csmall class="text-muted"\u003e[Auto-calculated]\u003c/small\u003e')
+    flags = tuple(compare(values[value], threshold) for value, compare, threshold in _ALERT_CHECKS)
+
+    data = {
+        'v': FORMAT,
+        'rules': RULES_VERSION,
+        'sections': sections(level(d_risk), level(k_risk), egfr_band(egfr), flags),
+        'metrics': [[key, val, metric_status(key, val)] for key, val in metric_values(values, egfr, features)],
     }
+    return data, f"Risk: {d_risk}.", f"Risk: {k_risk}."
 
-    metrics_rows = []
-    
-    def add_metric_row(key, val, label_override=None):
-        if key not in REF_RANGES: return ""
-        
-        ref_min, ref_max, unit, name = REF_RANGES[key]
-        if label_override: name = label_override
-        
-        status = '<span class="badge bg-success">Normal</span>'
-        
-        if key == 'eGFR':
-            if val < 60: 
-                status = '<span class="badge bg-danger">Low</span>'
-            elif val < 90:
-                status = '<span class="badge bg-warning text-dark">Mildly Reduced</span>'
-        elif key == 'Albumin':
-            if val > 0:
-                status = '<span class="badge bg-danger">High/Trace</span>'
-        else:
-            if ref_max is not None and val > ref_max:
-                status = '<span class="badge bg-danger">High</span>'
-            elif ref_min is not None and val < ref_min:
-                status = '<span class="badge bg-warning text-dark">Low</span>'
-        
-        range_str = "N/A"
-        if ref_min is not None and ref_max is not None:
-             range_str = f"{ref_min} - {ref_max}"
-        elif ref_min is not None:
-             range_str = f"> {ref_min}"
-        elif ref_max is not None:
-             range_str = f"< {ref_max}"
-             
-        return f"""
-        <tr>
-            <td><strong>{name}</strong></td>
-            <td>{val} <small class="text-muted">{unit}</small></td>
-            <td>{range_str}</td>
-            <td>{status}</td>
-        </tr>
-        """
-
-    metrics_rows.append(add_metric_row('Age', age))
-    metrics_rows.append(add_metric_row('BMI', round(bmi, 1)))
-    metrics_rows.append(add_metric_row('Glucose', round(glucose, 0)))
-    metrics_rows.append(add_metric_row('BP_Systolic', round(bp_sys, 0)))
-    metrics_rows.append(add_metric_row('Creatinine', round(creatinine, 2)))
-    metrics_rows.append(add_metric_row('eGFR', egfr))
-    
-    p_val = features.get('Pottasium')
-    if p_val: metrics_rows.append(add_metric_row('Pottasium', float(p_val)))
-    
-    s_val = features.get('Sodium')
-    if s_val: metrics_rows.append(add_metric_row('Sodium', float(s_val)))
-    
-    h_val = features.get('Hemoglobin')
-    if h_val: metrics_rows.append(add_metric_row('Hemoglobin', float(h_val)))
-    
-    u_val = features.get('Urea')
-    if u_val: metrics_rows.append(add_metric_row('Urea', float(u_val)))
-    
-    a_val = features.get('Albumin')
-    if a_val is not None: metrics_rows.append(add_metric_row('Albumin', int(float(a_val))))
-
-    metrics_html = f"""
-    <div class="mb-4">
-        <h5 class="mb-3 border-bottom pb-2 text-secondary">Complete Patient Vitals & Labs</h5>
-        <div class="table-responsive">
-            <table class="table table-hover mb-0 align-middle" style="font-size: 0.9em;">
-                <thead class="table-light">
-                    <tr>
-                        <th style="width: 30%">Metric</th>
-                        <th style="width: 25%">Value</th>
-                        <th style="width: 25%">Reference Range</th>
-                        <th style="width: 20%">Status</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {"".join(metrics_rows)}
-                </tbody>
-            </table>
-        </div>
-    </div>
+
+def generate_recommendation(prediction, features, shap_summary=None):
     """
-    sections.append(metrics_html)
-    
-    # Combine all
-    full_text = "\n".join(sections)
-    
-    # Generate simple interpretations for list view summaries
-    d_summary = f"Risk: {d_risk}."
-    k_summary = f"Risk: {k_risk}."
-    
-    return full_text, d_summary, k_summary
+    Generate the recommendation as HTML (see build_recommendation).
+
+    Returns:
+        tuple: (recommendation HTML, diabetes summary, kidney summary)
+    """
+    from .rendering import render_recommendation
+
+    data, d_summary, k_summary = build_recommendation(prediction, features)
+    return render_recommendation(data), d_summary, k_summary
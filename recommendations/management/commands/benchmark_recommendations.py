@@ -0,0 +1,96 @@
+"""
+Calls per second of the compiled recommendation engine against the
+original branch-by-branch one (recommendations.tests.reference), and the size
+of what each stores per prediction. Example:
+
+    python manage.py benchmark_recommendations --calls 50000
+
+The workload is random risk levels and form-like lab values (seeded), so
+every rule path, eGFR band and alert is exercised. The compiled engine
+builds the ``recommendation_data`` structure; rendering it is a display
+cost (fragment-cached, see recommendations.rendering) and is not timed.
+Its rendering is compared with the original HTML first; a mismatch aborts
+the benchmark.
+"""
+import json
+
+import random
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recommendations import engine, rendering
+from recommendations.tests import reference
+
+RISKS = ["Low", "Medium", "High", "Insufficient Data"]
+
+
+def cases(n, seed=0):
+    """``n`` (prediction, features) pairs with form-like values (ints, 1-2 decimals)."""
+    rng = random.Random(seed)
+    patients = [SimpleNamespace(age=45, gender="Female"), SimpleNamespace(age=70, gender="Male")]
+    workload = []
+    for _ in range(n):
+        features = {
+            'Age': float(rng.randint(20, 90)),
+            'BMI': round(rng.uniform(17, 42), 1),
+            'Glucose': float(rng.randint(70, 300)),
+            'BP_Systolic': float(rng.randint(80, 180)),
+            'Creatinine': round(rng.uniform(0.5, 12), 2),
+            'Pottasium': round(rng.uniform(3, 6.5), 1),
+            'Sodium': float(rng.randint(125, 150)),
+            'Hemoglobin': round(rng.uniform(8, 17), 1),
+            'Urea': float(rng.randint(7, 150)),
+            'Albumin': float(rng.randint(0, 5)),
+        }
+        prediction = SimpleNamespace(
+            diabetes_risk=rng.choice(RISKS), kidney_risk=rng.choice(RISKS), patient=rng.choice(patients)
+        )
+        workload.append((prediction, features))
+    return workload
+
+
+def calls_per_second(generate, workload):
+    started = time.perf_counter()
+    for prediction, features in workload:
+        generate(prediction, features)
+    return len(workload) / (time.perf_counter() - started)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the compiled recommendation engine against the original"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=20000, help="Calls per engine (default 20000)")
+        parser.add_argument("--repeat", type=int, default=3, help="Best of this many runs (default 3)")
+
+    def handle(self, *args, **options):
+        workload = cases(options["calls"])
+        html_bytes = data_bytes = 0
+        for prediction, features in workload:
+            data, _, _ = engine.build_recommendation(prediction, features)
+            html, _, _ = reference.generate_recommendation(prediction, features)
+            if rendering.normalize(rendering.render_recommendation(data)) != rendering.normalize(html):
+                raise CommandError(
+                    f"Outputs differ for {prediction.diabetes_risk}/{prediction.kidney_risk} {features}"
+                )
+            html_bytes += len(html.encode())
+            data_bytes += len(json.dumps(data).encode())
+
+        results = {}
+        for name, generate in (("original", reference.generate_recommendation),
+                               ("compiled", engine.build_recommendation)):
+            results[name] = max(calls_per_second(generate, workload) for _ in range(options["repeat"]))
+            self.stdout.write(f"   {name:<9} {results[name]:>10.0f} calls/s")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(workload)} cases, identical output; "
+            f"compiled engine {results['compiled'] / results['original']:.1f}x faster; "
+            f"stored {data_bytes / len(workload):.0f} bytes/prediction vs {html_bytes / len(workload):.0f} "
+            f"({html_bytes / data_bytes:.1f}x smaller)"
+        ))
+        stats = engine.memo_stats()
+        self.stdout.write(
+            f"   section memo: {stats['entries']} entries, hit rate {stats['hit_rate']:.4f}"
+        )
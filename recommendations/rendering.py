@@ -0,0 +1,162 @@
+"""
+HTML rendering of structured recommendations.
+
+``Prediction.recommendation_data`` holds what the engine decided -- section
+ids, item codes, metric values and status codes -- and this module turns it
+into the HTML the pages show. The markup lives in
+``recommendations/recommendation.html``, which Django's cached template
+loader compiles once per process (it is the default loader whenever
+``OPTIONS['loaders']`` is unset). The whole template body is one
+``{% cache %}`` fragment keyed by a digest of the data and of everything
+else that shapes the output: the item texts, note styles, metric table,
+status badges and the template source. Changing any of them changes every
+digest, so stale fragments are never served and stored predictions need no
+backfill when the wording or layout changes.
+"""
+import hashlib
+import json
+import re
+from functools import cached_property, lru_cache
+
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from .engine import ITEMS, METRICS, NOTE_STYLES
+
+TEMPLATE = "recommendations/recommendation.html"
+DEFAULT_CACHE_SECONDS = 60 * 60 * 24
+
+# Metric status code -> (badge class, label)
+STATUS_BADGES = {
+    'normal': ("bg-success", "Normal"),
+    'high': ("bg-danger", "High"),
+    'low': ("bg-warning text-dark", "Low"),
+    'egfr_low': ("bg-danger", "Low"),
+    'egfr_mild': ("bg-warning text-dark", "Mildly Reduced"),
+    'albumin': ("bg-danger", "High/Trace"),
+}
+
+
+def _range_str(ref_min, ref_max):
+    if ref_min is not None and ref_max is not None:
+        return f"{ref_min} - {ref_max}"
+    if ref_min is not None:
+        return f"> {ref_min}"
+    if ref_max is not None:
+        return f"< {ref_max}"
+    return "N/A"
+
+
+@lru_cache(maxsize=4)
+def render_version(source):
+    """Digest of the template source and the tables the template reads."""
+    payload = json.dumps([ITEMS, NOTE_STYLES, METRICS, STATUS_BADGES, source], sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def normalize(html):
+    """HTML with insignificant whitespace removed, for comparing renderings."""
+    return re.sub(r"\s+", " ", re.sub(r">\s+<", "><", html)).strip()
+
+
+def digest(data, version):
+    """Fragment cache key of ``data`` rendered by template ``version``."""
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(f"{version}:{payload}".encode()).hexdigest()
+
+
+class RecommendationView:
+    """
+    Template-facing view of recommendation data.
+
+    Everything is resolved on first access, i.e. only when the cached
+    fragment misses. Item codes and metric keys the tables no longer know
+    are left out rather than failing the page.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    @cached_property
+    def _sections(self):
+        return {section['id']: section for section in self.data.get('sections', [])}
+
+    def _items(self, section_id):
+        codes = self._sections.get(section_id, {}).get('items', [])
+        # The texts are authored in ITEMS, not user input; some contain "<"
+        return [mark_safe(ITEMS[code]) for code in codes if code in ITEMS]
+
+    @cached_property
+    def summary(self):
+        return self._items('summary')
+
+    @cached_property
+    def diet(self):
+        return self._items('diet')
+
+    @cached_property
+    def activity(self):
+        return self._items('activity')
+
+    @cached_property
+    def notes(self):
+        return self._items('notes')
+
+    @cached_property
+    def notes_heading(self):
+        style = self._sections.get('notes', {}).get('style')
+        title, icon, color = NOTE_STYLES.get(style, NOTE_STYLES['clinical'])
+        return {'title': title, 'icon': icon, 'color': color}
+
+    @cached_property
+    def metrics(self):
+        rows = []
+        for key, value, status in self.data.get('metrics', []):
+            if key not in METRICS:
+                continue
+            ref_min, ref_max, unit, label = METRICS[key]
+            badge_class, badge_label = STATUS_BADGES.get(status, STATUS_BADGES['normal'])
+            rows.append({
+                'label': mark_safe(label),
+                'value': str(value),
+                'unit': mark_safe(unit),
+                'range': mark_safe(_range_str(ref_min, ref_max)),
+                'badge_class': badge_class,
+                'badge_label': badge_label,
+            })
+        return rows
+
+
+def render_recommendation(data):
+    """
+    Render recommendation data to HTML.
+
+    Args:
+        data: a ``Prediction.recommendation_data`` structure (see
+            recommendations.engine.build_recommendation)
+
+    Returns:
+        SafeString: the recommendation HTML
+    """
+    template = get_template(TEMPLATE)
+    version = render_version(template.template.source)
+    return template.render({
+        'recommendation': RecommendationView(data),
+        'digest': digest(data, version),
+        'timeout': getattr(settings, 'RECOMMENDATION_CACHE_SECONDS', DEFAULT_CACHE_SECONDS),
+    })
+
+
+def recommendation_html(prediction):
+    """
+    The HTML to show for a prediction's recommendation.
+
+    A stored ``recommendation_text`` (doctor-approved or legacy HTML) wins
+    over ``recommendation_data``; a prediction with neither gives "".
+    """
+    if prediction.recommendation_text:
+        return mark_safe(prediction.recommendation_text)
+    if prediction.recommendation_data:
+        return render_recommendation(prediction.recommendation_data)
+    return ""
@@ -0,0 +1,15 @@
+from django import template
+
+from recommendations.rendering import recommendation_html
+
+register = template.Library()
+
+
+@register.simple_tag
+def recommendation(prediction):
+    """
+    Render a prediction's recommendation.
+
+    Usage: {% load recommendation_tags %}{% recommendation prediction %}
+    """
+    return recommendation_html(prediction)
@@ -0,0 +1,187 @@
+import json
+from itertools import product
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from recommendations import batch, clinical, engine, rendering
+
+from . import reference
+
+RISKS = ["Low", "Medium", "High", "Insufficient Data", "Error", None]
+
+# Creatinine (mg/dL) spanning every eGFR band for both sexes: >= 90,
+# mildly reduced, < 60 and kidney failure (< 15)
+CREATININE = [0.7, 1.3, 2.5, 6.0, 12.0]
+
+PATIENTS = [
+    SimpleNamespace(age=45, gender="Female"),
+    SimpleNamespace(age=70, gender="Male"),
+    SimpleNamespace(age=None, gender="f"),
+]
+
+FEATURE_SETS = [
+    # Every input, in range
+    {'Age': 52.0, 'BMI': 24.0, 'Glucose': 95.0, 'BP_Systolic': 118.0, 'Pottasium': 4.2,
+     'Sodium': 140.0, 'Hemoglobin': 14.0, 'Urea': 15.0, 'Albumin': 0.0},
+    # All alerts: obese, hyperkalaemic, hypotensive; out-of-range labs
+    {'Age': 67.0, 'BMI': 34.5, 'Glucose': 210.0, 'BP_Systolic': 85.0, 'Pottasium': 5.8,
+     'Sodium': 131.0, 'Hemoglobin': 10.2, 'Urea': 64.0, 'Albumin': 3.0},
+    # Diabetes inputs only, stored as strings like PredictionFeature values
+    {'Age': "38", 'BMI': "30", 'Glucose': "140", 'BP_Systolic': "72"},
+    # Kidney inputs only; zero-valued optional labs are left out of the table
+    {'Pottasium': 0.0, 'Sodium': 0, 'Hemoglobin': 12.5, 'Urea': 40.0, 'Albumin': "1"},
+    # Nothing but creatinine: defaults everywhere
+    {},
+]
+
+
+def prediction(diabetes_risk, kidney_risk, patient):
+    return SimpleNamespace(diabetes_risk=diabetes_risk, kidney_risk=kidney_risk, patient=patient)
+
+
+class CompiledEngineEquivalenceTests(SimpleTestCase):
+    """The compiled tables, stored as JSON and rendered, reproduce the original engine."""
+
+    def assertSameOutput(self, pred, features):
+        data, d_summary, k_summary = engine.build_recommendation(pred, features)
+        # What Prediction.recommendation_data gives back after a save
+        stored = json.loads(json.dumps(data))
+        html, d_expected, k_expected = reference.generate_recommendation(pred, features)
+        self.assertEqual(
+            rendering.normalize(rendering.render_recommendation(stored)), rendering.normalize(html)
+        )
+        self.assertEqual((d_summary, k_summary), (d_expected, k_expected))
+
+    def test_every_risk_combination_and_egfr_band(self):
+        for d_risk, k_risk, creatinine, patient in product(RISKS, RISKS, CREATININE, PATIENTS):
+            with self.subTest(d_risk=d_risk, k_risk=k_risk, creatinine=creatinine, patient=patient):
+                self.assertSameOutput(
+                    prediction(d_risk, k_risk, patient), {**FEATURE_SETS[0], 'Creatinine': creatinine}
+                )
+
+    def test_alerts_and_optional_metrics(self):
+        for d_risk, k_risk, features in product(RISKS, RISKS, FEATURE_SETS):
+            for creatinine in (1.0, 9.0):
+                with self.subTest(d_risk=d_risk, k_risk=k_risk, features=features, creatinine=creatinine):
+                    self.assertSameOutput(
+                        prediction(d_risk, k_risk, PATIENTS[0]), {**features, 'Creatinine': creatinine}
+                    )
+
+    def test_missing_creatinine_uses_default(self):
+        self.assertSameOutput(prediction("High", "High", PATIENTS[1]), {'Age': 60.0})
+
+    def test_every_key_is_compiled(self):
+        self.assertEqual(
+            len(engine.COMPILED), len(engine.LEVELS) ** 2 * len(engine.EGFR_BANDS)
+        )
+        for rules in (engine.DIET_RULES, engine.ACTIVITY_RULES):
+            for *_, codes in rules:
+                for code in codes:
+                    self.assertIn(code, engine.ITEMS)
+
+
+class SectionMemoTests(SimpleTestCase):
+    def test_predictions_with_the_same_flags_share_sections(self):
+        obese = {**FEATURE_SETS[0], 'BMI': 31.0, 'Creatinine': 1.0}
+        first, _, _ = engine.build_recommendation(prediction("High", "Low", PATIENTS[0]), obese)
+        second, _, _ = engine.build_recommendation(
+            prediction("High", "Low", PATIENTS[1]), {**obese, 'BMI': 38.0, 'Glucose': 180.0}
+        )
+        self.assertIs(first['sections'], second['sections'])
+        self.assertNotEqual(first['metrics'], second['metrics'])
+        self.assertEqual(first['rules'], engine.RULES_VERSION)
+
+        lean, _, _ = engine.build_recommendation(prediction("High", "Low", PATIENTS[0]), {**obese, 'BMI': 24.0})
+        self.assertIsNot(first['sections'], lean['sections'])
+
+    def test_stats_count_hits(self):
+        before = engine.memo_stats()
+        engine.build_recommendation(prediction("Low", "Low", PATIENTS[0]), {})
+        engine.build_recommendation(prediction("Low", "Low", PATIENTS[0]), {})
+        after = engine.memo_stats()
+        self.assertEqual(after['hits'] + after['misses'] - before['hits'] - before['misses'], 2)
+        self.assertGreaterEqual(after['hits'] - before['hits'], 1)
+
+
+class RecommendationRenderingTests(SimpleTestCase):
+    def setUp(self):
+        self.data, _, _ = engine.build_recommendation(
+            prediction("High", "Low", PATIENTS[0]), {**FEATURE_SETS[1], 'Creatinine': 1.0}
+        )
+
+    def test_digest_depends_on_data_and_template(self):
+        version = rendering.render_version("template")
+        changed = {**self.data, 'metrics': self.data['metrics'][:-1]}
+        self.assertNotEqual(rendering.digest(self.data, version), rendering.digest(changed, version))
+        self.assertNotEqual(
+            rendering.digest(self.data, version),
+            rendering.digest(self.data, rendering.render_version("edited template")),
+        )
+
+    def test_unknown_codes_are_left_out(self):
+        data = json.loads(json.dumps(self.data))
+        data['sections'][1]['items'].append('diet.retired_item')
+        data['metrics'].append(['Retired_Lab', 1.0, 'normal'])
+        html = rendering.render_recommendation(data)
+        self.assertEqual(rendering.normalize(html), rendering.normalize(rendering.render_recommendation(self.data)))
+
+    def test_stored_text_takes_precedence(self):
+        pred = SimpleNamespace(recommendation_text="<p>Approved</p>", recommendation_data=self.data)
+        self.assertEqual(rendering.recommendation_html(pred), "<p>Approved</p>")
+        pred.recommendation_text = None
+        self.assertIn(engine.ITEMS['diet.alert_weight'], rendering.recommendation_html(pred))
+        pred.recommendation_data = None
+        self.assertEqual(rendering.recommendation_html(pred), "")
+
+
+class ClinicalDerivationTests(SimpleTestCase):
+    """Scalar and array paths agree with each other and with the original eGFR."""
+
+    def test_egfr_matches_original_for_scalars_and_arrays(self):
+        import numpy as np
+
+        rng = np.random.default_rng(0)
+        creatinine = np.round(rng.uniform(0.05, 20, 5000), 2)
+        age = rng.integers(18, 101, 5000).astype(float)
+        genders = rng.choice(["Female", "Male", "f", "m"], 5000)
+        expected = [reference.calculate_egfr(*row) for row in zip(creatinine.tolist(), age.tolist(), genders)]
+
+        female = clinical.is_female(genders)
+        self.assertEqual(clinical.egfr(creatinine, age, female).tolist(), expected)
+        for row, value in zip(zip(creatinine.tolist(), age.tolist(), female.tolist()), expected[:500]):
+            self.assertEqual(clinical.egfr(*row), value)
+
+    def test_bands_at_their_cut_points(self):
+        import numpy as np
+
+        cases = [
+            (clinical.ckd_stage, [14.9, 15, 29.9, 30, 45, 60, 89.9, 90], ["G5", "G4", "G4", "G3b", "G3a", "G2", "G2", "G1"]),
+            (clinical.bmi_category, [18.4, 18.5, 25, 30], ["Underweight", "Normal", "Overweight", "Obese"]),
+            (clinical.bp_stage, [59, 60, 80, 90, 120], ["Low", "Normal", "Stage 1", "Stage 2", "Crisis"]),
+            (clinical.glucose_band, [69, 70, 100, 126], ["Low", "Normal", "Prediabetes", "Diabetes"]),
+        ]
+        for band, values, expected in cases:
+            with self.subTest(band=band.__name__):
+                self.assertEqual([band(value) for value in values], expected)
+                self.assertEqual(band(np.array(values + [np.nan])).tolist(), expected + [""])
+                self.assertEqual(band(None), "")
+
+    def test_stored_egfr_fields(self):
+        import numpy as np
+
+        creatinine = [1.1, None, 0.0, 35.0]
+        age = [40, 60, 70, 10]
+        gender = ["Female", "Male", "Male", "Female"]
+        egfr, stage = batch.egfr_fields(np.array(creatinine, dtype=float), age, gender)
+        for i, row in enumerate(zip(creatinine, age, gender)):
+            value, row_stage = batch.egfr_fields(*row)
+            with self.subTest(row=row):
+                self.assertEqual(row_stage, stage[i])
+                if value is None:
+                    self.assertTrue(np.isnan(egfr[i]))
+                else:
+                    self.assertEqual(value, egfr[i])
+        # Clamped as the engine clamps: creatinine 35 -> 20, age 10 -> 18
+        self.assertEqual(egfr[3], engine.calculate_egfr(20, 18, "Female"))
+        self.assertEqual(stage[1], "")
@@ -13,6 +13,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medpredict.settings')
 django.setup()
 
 from predictions.utils import load_models
+from predictions.preprocessing import KIDNEY_RENAME_MAP, SPECS
 from predictions.explainability import generate_patient_shap, generate_global_feature_importance
 
 def debug_kidney_pipeline():
@@ -47,14 +48,8 @@ def debug_kidney_pipeline():
 
     # 3. Simulate Prediction
     # Use mean values from dataset as a test case
-    rename_map = {
-        'Bp': 'Blood Pressure', 'Sg': 'Specific Gravity', 'Al': 'Albumin', 'Su': 'Sugar',
-        'Rbc': 'Red Blood Cell', 'Bu': 'Urea', 'Sc': 'Creatinine', 'Sod': 'Sodium',
-        'Pot': 'Pottasium', 'Hemo': 'Hemoglobin', 'Wbcc': 'White Blood Cell Count',
-        'Rbcc': 'Red Blood Cell Count', 'Htn': 'Hypertension', 'Class': 'Predicted Class'
-    }
-    df_renamed = df.rename(columns=rename_map)
-    required_cols = ['Creatinine', 'Pottasium', 'Hemoglobin', 'Sodium', 'Blood Pressure', 'Red Blood Cell', 'Urea', 'Albumin']
+    df_renamed = df.rename(columns=KIDNEY_RENAME_MAP)
+    required_cols = SPECS['kidney']['features']
     
     # Create a dummy input (just use the first row of clean data)
     try:
@@ -65,7 +60,7 @@ def debug_kidney_pipeline():
         
         kidney_df = pd.DataFrame([input_data])
         
-        # Scale
+        # Impute, clip and scale (same transform as views.py)
         print("DEBUG: Scaling input...")
         kidney_input_scaled = kidney_scaler.transform(kidney_df)
         print(f"DEBUG: Scaled Input: {kidney_input_scaled}")
@@ -1,7 +1,5 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import RobustScaler
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.svm import SVC
@@ -12,6 +10,11 @@ from imblearn.over_sampling import SMOTE
 import joblib
 import os
 
+from predictions.bundle import build_bundle
+from predictions.importance import build_global_importance, stratified_sample
+from predictions.datasets import load_split, load_table
+from predictions.preprocessing import Preprocessor
+
 # Define paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ML_PATH = os.path.join(BASE_DIR, "predictions/ml")
@@ -25,48 +28,39 @@ print("="*60)
 
 # Load dataset
 print(f"\n1. Loading dataset from: {CSV_PATH}")
-df = pd.read_csv(CSV_PATH)
-print(f"   Dataset shape: {df.shape}")
-print(f"   Columns: {df.columns.tolist()}")
-
-# Data Cleaning: Handling Invalid Zero Values (Imputation)
-print("\n2. Handling invalid zero values...")
-zero_impute_cols = ['Glucose', 'BloodPressure', 'SkinThickness', 'Insulin', 'BMI']
-
-for col in zero_impute_cols:
-    if col in df.columns:
-        median_val = df[df[col] != 0][col].median()
-        df[col] = df[col].replace(0, median_val)
-        print(f"   - Imputed {col} zeros with median: {median_val:.2f}")
-
 # Selecting features present in system (Age, BMI, BloodPressure, Glucose)
-print("\n3. Selecting required features: Age, BMI, BloodPressure, Glucose")
-df = df[['Age', 'BMI', 'BloodPressure', 'Glucose', 'Outcome']]
-X = df.drop("Outcome", axis=1)
-y = df["Outcome"]
-
-print(f"   Features shape: {X.shape}")
+# Split data (cached, fixed seed; rebuilt when the CSV or preprocessing changes)
+split = load_split('diabetes', test_size=0.2, random_state=15)
+X_train, X_test, y_train, y_test = split.frames()
+y = pd.concat([y_train, y_test])
+print(f"   Features: {split.features}")
 print(f"   Target distribution:\n{y.value_counts()}")
 
-# Split data
-print("\n4. Splitting data (80% train, 20% test)...")
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=15)
+print("\n2. Splitting data (80% train, 20% test)...")
 print(f"   Train size: {X_train.shape[0]}, Test size: {X_test.shape[0]}")
 
+# Data Cleaning: zero imputation and clipping (shared preprocessing pipeline)
+print("\n3. Imputing invalid zeros and clipping to plausible ranges...")
+scaler = Preprocessor.for_disease('diabetes').fit_impute(X_train)
+for col, median_val in zip(scaler.features, scaler.impute):
+    if col in scaler.zero_as_missing:
+        print(f"   - Imputed {col} zeros with median: {median_val:.2f}")
+X_train = pd.DataFrame(scaler.clean(X_train), columns=scaler.features)
+
 # SMOTE balancing
-print("\n5. Applying SMOTE for class balancing...")
+print("\n4. Applying SMOTE for class balancing...")
 sm = SMOTE(random_state=42)
 X_train, y_train = sm.fit_resample(X_train, y_train)
 print(f"   After SMOTE:\n{y_train.value_counts()}")
 
 # Scaling
-print("\n6. Scaling features with RobustScaler...")
-scaler = RobustScaler()
-X_train_scaled = scaler.fit_transform(X_train)
+print("\n5. Scaling features (robust median/IQR)...")
+scaler.fit_scale(X_train)
+X_train_scaled = scaler.transform(X_train)
 X_test_scaled = scaler.transform(X_test)
 
 # Model training
-print("\n7. Training multiple models...")
+print("\n6. Training multiple models...")
 models = {
     "Logistic Regression": LogisticRegression(random_state=42),
     "K-Nearest Neighbors": KNeighborsClassifier(n_neighbors=3),
@@ -93,13 +87,33 @@ for name, model in models.items():
         best_model = model
 
 # Save the best model
-print("\n8. Saving best model...")
+print("\n7. Saving best model...")
 if best_model is not None:
     joblib.dump(best_model, MODEL_PATH)
     joblib.dump(scaler, SCALER_PATH)
     print(f"   [OK] Best Model: {best_model_name} (Accuracy: {best_accuracy:.4f})")
     print(f"   [OK] Saved: {MODEL_PATH}")
     print(f"   [OK] Saved: {SCALER_PATH}")
+
+    # Global importance is stored with the model, keyed by its hash
+    build_global_importance(
+        'diabetes', best_model, X_train_scaled, y_train, split.features, model_path=MODEL_PATH
+    )
+
+    # Single-file, memory-mappable bundle served in preference to the pickles
+    build_bundle(
+        'diabetes', best_model, scaler, split.features,
+        background=stratified_sample(X_train_scaled, y_train, 50),
+        metrics={
+            'model': best_model_name,
+            'accuracy': float(best_accuracy),
+            'candidates': {k: float(v) for k, v in results.items()},
+            'train_rows': int(len(X_train_scaled)),
+            'test_rows': int(len(X_test_scaled)),
+        },
+        model_path=MODEL_PATH,
+        training_data_path=CSV_PATH,
+    )
 else:
     print("   ✗ Error: No model was trained successfully!")
 
@@ -1,7 +1,5 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import RobustScaler
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.svm import SVC
@@ -11,6 +9,11 @@ from sklearn.metrics import accuracy_score
 import joblib
 import os
 
+from predictions.bundle import build_bundle
+from predictions.importance import build_global_importance, stratified_sample
+from predictions.datasets import load_split, load_table
+from predictions.preprocessing import Preprocessor
+
 # Define paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ML_PATH = os.path.join(BASE_DIR, "predictions/ml")
@@ -24,80 +27,32 @@ print("="*60)
 
 # Load dataset
 print(f"\n1. Loading dataset from: {CSV_PATH}")
-df1 = pd.read_csv(CSV_PATH)
+df1 = load_table("kidney.csv")
 print(f"   Dataset shape: {df1.shape}")
-print(f"   Columns: {df1.columns.tolist()}")
-
-# Rename columns
-print("\n2. Renaming columns...")
-rename_map = {
-    'Bp': 'Blood Pressure',
-    'Sg': 'Specific Gravity',
-    'Al': 'Albumin',
-    'Su': 'Sugar',
-    'Rbc': 'Red Blood Cell',
-    'Bu': 'Urea',
-    'Sc': 'Creatinine',
-    'Sod': 'Sodium',
-    'Pot': 'Pottasium',  # Keep the typo as expected by the app
-    'Hemo': 'Hemoglobin',
-    'Wbcc': 'White Blood Cell Count',
-    'Rbcc': 'Red Blood Cell Count',
-    'Htn': 'Hypertension',
-    'Class': 'Predicted Class'
-}
-
-df1.rename(columns=rename_map, inplace=True)
-
-# Selecting features needed for training
-print("\n3. Selecting required features...")
-required_cols = ['Predicted Class', 'Creatinine', 'Pottasium', 'Hemoglobin', 
-                 'Sodium', 'Blood Pressure', 'Red Blood Cell', 'Urea', 'Albumin']
-df1 = df1[required_cols]
-print(f"   Selected features: {[c for c in required_cols if c != 'Predicted Class']}")
-
-# Data cleaning
-print("\n4. Cleaning data (removing outliers)...")
-initial_size = len(df1)
 
-# Remove impossible values
-df1 = df1[df1['Pottasium'] <= 7]
-df1 = df1[df1['Hemoglobin'] <= 20]
-df1 = df1[df1['Blood Pressure'] >= 50]
+# Rename columns, select features and drop impossible rows (shared preprocessing pipeline)
+print("\n2. Renaming columns, selecting features and removing outlier rows...")
+# (cached, fixed-seed split; rebuilt when the CSV or preprocessing changes)
+split = load_split('kidney', test_size=0.2, random_state=15)
+X_train, X_test, y_train, y_test = split.frames()
+y = pd.concat([y_train, y_test])
+print(f"   Selected features: {split.features}")
+print(f"   Removed {len(df1) - len(y)} outlier rows")
+print(f"   Final dataset size: {len(y)}")
 
-# Fix sodium scale (Already correct in CSV, usually 135-145)
-# df1['Sodium'] = df1['Sodium'] * 10 
+print(f"\n3. Target distribution:\n{y.value_counts()}")
 
-
-# Winsorize outliers
-df1['Creatinine'] = df1['Creatinine'].clip(0, 15)
-df1['Pottasium'] = df1['Pottasium'].clip(2, 7)
-df1['Hemoglobin'] = df1['Hemoglobin'].clip(4, 20)
-df1['Sodium'] = df1['Sodium'].clip(100, 180)
-df1['Blood Pressure'] = df1['Blood Pressure'].clip(60, 180)
-
-print(f"   Removed {initial_size - len(df1)} outlier rows")
-print(f"   Final dataset size: {len(df1)}")
-
-# Prepare features and target
-X = df1.drop("Predicted Class", axis=1)
-y = df1["Predicted Class"]
-
-print(f"\n5. Target distribution:\n{y.value_counts()}")
-
-# Split data
-print("\n6. Splitting data (80% train, 20% test)...")
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=15)
+print("\n4. Splitting data (80% train, 20% test)...")
 print(f"   Train size: {X_train.shape[0]}, Test size: {X_test.shape[0]}")
 
-# Scaling
-print("\n7. Scaling features with RobustScaler...")
-scaler = RobustScaler()
-X_train_scaled = scaler.fit_transform(X_train)
+# Winsorize outliers and scale
+print("\n5. Clipping to plausible ranges and scaling (robust median/IQR)...")
+scaler = Preprocessor.for_disease('kidney').fit(X_train)
+X_train_scaled = scaler.transform(X_train)
 X_test_scaled = scaler.transform(X_test)
 
 # Model training
-print("\n8. Training multiple models...")
+print("\n6. Training multiple models...")
 models = {
     "Logistic Regression": LogisticRegression(random_state=42),
     "K-Nearest Neighbors": KNeighborsClassifier(n_neighbors=3),
@@ -124,13 +79,33 @@ for name, model in models.items():
         best_model = model
 
 # Save the best model
-print("\n9. Saving best model...")
+print("\n7. Saving best model...")
 if best_model is not None:
     joblib.dump(best_model, MODEL_PATH)
     joblib.dump(scaler, SCALER_PATH)
     print(f"   [OK] Best Model: {best_model_name} (Accuracy: {best_accuracy:.4f})")
     print(f"   [OK] Saved: {MODEL_PATH}")
     print(f"   [OK] Saved: {SCALER_PATH}")
+
+    # Global importance is stored with the model, keyed by its hash
+    build_global_importance(
+        'kidney', best_model, X_train_scaled, y_train, split.features, model_path=MODEL_PATH
+    )
+
+    # Single-file, memory-mappable bundle served in preference to the pickles
+    build_bundle(
+        'kidney', best_model, scaler, split.features,
+        background=stratified_sample(X_train_scaled, y_train, 50),
+        metrics={
+            'model': best_model_name,
+            'accuracy': float(best_accuracy),
+            'candidates': {k: float(v) for k, v in results.items()},
+            'train_rows': int(len(X_train_scaled)),
+            'test_rows': int(len(X_test_scaled)),
+        },
+        model_path=MODEL_PATH,
+        training_data_path=CSV_PATH,
+    )
 else:
     print("   ✗ Error: No model was trained successfully!")
 